@@ -1,39 +1,261 @@
+import json
 import logging
-from flask import Flask, jsonify, request, make_response, Response
+import secrets
+import time
+from flask import Blueprint, Flask, current_app, g, jsonify, request, make_response, Response, session, stream_with_context
+from models.affirmation_store import CompactAffirmationStore, MappedAffirmationStore, SQLiteAffirmationStore, search_terms
 from models.api_model import AffirmationModel
-import random
 import os
 from dotenv import load_dotenv
-from utils.logger import configure_logger
+from utils.cache import TTLCache
+from utils.logger import AccessLogFilter, configure_logger
+from utils import encoding, metrics
 from werkzeug.exceptions import BadRequest, Unauthorized
 
+from db import db, init_db, sqlite_path
 from models.user_model import Users
+from utils.password_hashing import PBKDF2Hasher, PasswordHashingService, ScryptHasher
 
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = Flask(__name__)
+logger = logging.getLogger(__name__)
+configure_logger(logger)
 
-# Accessing environment variables
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DB_PATH')
+# One line per request, sampled and rate limited; 5xx responses are always logged
+access_logger = logging.getLogger('access')
+configure_logger(access_logger)
+access_logger.addFilter(AccessLogFilter(
+    sample_rate=float(os.getenv('ACCESS_LOG_SAMPLE_RATE', '1')),
+    rate_limit=float(os.getenv('ACCESS_LOG_RATE_LIMIT', '0')),
+))
 
-# Example of using the Flask environment configuration
-if __name__ == "__main__":
-    app.run(debug=True)
+routes = Blueprint('routes', __name__)
 
-# Initialize the API model
-affirmation_model = AffirmationModel()
 
-logger = logging.getLogger(__name__)
-configure_logger(logger)
+def create_app(config: dict = None) -> Flask:
+    """
+    Builds the Flask app, its affirmation model and its routes.
+
+    Settings are read from the environment (and .env); `config` overrides them.
+    Servers that fork workers from a preloaded app call `init_worker` in each worker.
+
+    Args:
+        config (dict): Flask config values that take precedence over the environment.
+
+    Returns:
+        Flask: The configured app.
+    """
+    app = Flask(__name__)
+
+    # Accessing environment variables
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['TOKEN_MAX_AGE'] = int(os.getenv('TOKEN_MAX_AGE', '3600'))
+    app.config['USER_RECORD_CACHE_TTL'] = float(os.getenv('USER_RECORD_CACHE_TTL', '5'))
+    app.config['USER_BATCH_SIZE'] = int(os.getenv('USER_BATCH_SIZE', '500'))
+    app.config['FETCH_MANY_MAX'] = int(os.getenv('FETCH_MANY_MAX', '100'))
+    app.config['DB_PATH'] = os.getenv('DB_PATH')
+    app.config['AFFIRMATION_STORE'] = os.getenv('AFFIRMATION_STORE', 'memory')
+    app.config['AFFIRMATION_MMAP_PATH'] = os.getenv('AFFIRMATION_MMAP_PATH')
+    app.config['AFFIRMATION_MMAP_DURABLE'] = os.getenv('AFFIRMATION_MMAP_DURABLE', '0') == '1'
+    app.config['JSON_ENCODER'] = os.getenv('JSON_ENCODER', 'auto')
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', '1'))
+    app.config.update(config or {})
+    if not app.config['SECRET_KEY']:
+        # Sessions and access tokens are signed with it; a random key only lasts as long as this process
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+        logger.warning("SECRET_KEY is not set; using a random key for development. Sessions and tokens "
+                       "will not survive a restart or work across workers that do not share the app")
+
+    # SQLAlchemy engine for DB_PATH, with pool sizing and SQLite pragmas from the DB_* / SQLITE_* settings
+    init_db(app)
+    with app.app_context():
+        db.create_all()
+
+    # Initialize the API model. AFFIRMATION_STORE=mmap shares one memory-mapped file between all workers;
+    # otherwise affirmations persist to the SQLite database when one is configured, or are kept in memory,
+    # packed into byte buffers with AFFIRMATION_STORE=compact
+    if app.config['AFFIRMATION_STORE'] == 'mmap':
+        if not app.config['AFFIRMATION_MMAP_PATH']:
+            raise ValueError("AFFIRMATION_STORE=mmap requires AFFIRMATION_MMAP_PATH")
+        affirmation_store = MappedAffirmationStore(app.config['AFFIRMATION_MMAP_PATH'],
+                                                   durable=app.config['AFFIRMATION_MMAP_DURABLE'])
+    elif app.config['DB_PATH']:
+        affirmation_store = SQLiteAffirmationStore(sqlite_path(app.config['DB_PATH']))
+    elif app.config['AFFIRMATION_STORE'] == 'compact':
+        affirmation_store = CompactAffirmationStore()
+    elif app.config['AFFIRMATION_STORE'] == 'memory':
+        affirmation_store = None
+    else:
+        raise ValueError(f"Unknown AFFIRMATION_STORE {app.config['AFFIRMATION_STORE']!r}; "
+                         "use 'memory', 'compact' or 'mmap'")
+    affirmation_model = AffirmationModel(store=affirmation_store,
+                                         fetch_workers=int(os.getenv('AFFIRMATION_FETCH_WORKERS', '8')))
+    app.extensions['affirmation_model'] = affirmation_model
+
+    # Keep a buffer of affirmations ready in the background (0 disables prefetching)
+    if int(os.getenv('AFFIRMATION_PREFETCH_SIZE', '0')) > 0:
+        affirmation_model.enable_prefetch(
+            buffer_size=int(os.getenv('AFFIRMATION_PREFETCH_SIZE')),
+            low_water=int(os.getenv('AFFIRMATION_PREFETCH_LOW_WATER', '8')),
+            workers=int(os.getenv('AFFIRMATION_PREFETCH_WORKERS', '2')),
+            backoff_max=float(os.getenv('AFFIRMATION_PREFETCH_BACKOFF_MAX', '30')),
+        )
+
+    # Share upstream requests between concurrent /fetch-affirmation calls (unset disables, 0 shares in-flight calls only)
+    if os.getenv('AFFIRMATION_COALESCE_WINDOW') is not None:
+        affirmation_model.enable_coalescing(window=float(os.getenv('AFFIRMATION_COALESCE_WINDOW')))
+
+    # Password hashing algorithm and cost; legacy and lower-cost hashes are upgraded on login
+    if os.getenv('PASSWORD_HASHER', 'scrypt') == 'pbkdf2_sha256':
+        password_hasher = PBKDF2Hasher(iterations=int(os.getenv('PBKDF2_ITERATIONS', '600000')))
+    else:
+        password_hasher = ScryptHasher(
+            n=int(os.getenv('SCRYPT_N', str(2 ** 14))),
+            r=int(os.getenv('SCRYPT_R', '8')),
+            p=int(os.getenv('SCRYPT_P', '1')),
+        )
+    Users.configure_password_hashing(PasswordHashingService(
+        password_hasher, workers=int(os.getenv('PASSWORD_HASH_WORKERS', '2'))))
+
+    # Token checks trust a cached user record for this long, so revocations reach other workers within it
+    Users.configure_record_cache(ttl=app.config['USER_RECORD_CACHE_TTL'])
 
-@app.before_request
-def log_request_info():
-    logger.info("Request: %s %s", request.method, request.url)
+    # Per-route latency, errors and in-flight requests, JSON serialization time and DB queries, served on /metrics
+    metrics.instrument_app(app)
+
+    # JSON bodies of at least COMPRESS_MIN_SIZE bytes are sent gzip or deflate encoded to clients that accept it
+    encoding.init_app(app)
+
+    # Serialized bodies of read-only routes, reused while the collection's version is unchanged
+    app.extensions['response_cache'] = TTLCache(maxsize=int(os.getenv('RESPONSE_CACHE_SIZE', '256')), ttl=300.0)
+
+    configure_logger(app.logger)
+    app.register_blueprint(routes)
+    return app
+
+
+def init_worker(app: Flask) -> None:
+    """
+    Sets up per-process state in a server worker forked from a process that already built the app.
+
+    Database connections, connection pools, locks and threads do not survive fork
+    safely, so the worker opens its own: the affirmation store reconnects, upstream
+    clients and the fetch pool start fresh, the prefetcher restarts its threads and
+    SQLAlchemy engines drop inherited pooled connections. (Logging and password
+    hashing reset themselves after fork.)
+
+    Args:
+        app (Flask): The app built by `create_app` before the fork.
+    """
+    app.extensions['affirmation_model'].after_fork()
+    if 'sqlalchemy' in app.extensions:
+        with app.app_context():
+            for engine in app.extensions['sqlalchemy'].engines.values():
+                engine.dispose(close=False)
+    logger.info("Worker %d initialized", os.getpid())
+
+
+def get_affirmation_model() -> AffirmationModel:
+    """
+    Returns the affirmation model of the app handling the current request.
+    """
+    return current_app.extensions['affirmation_model']
 
-@app.route('/health', methods=['GET'])
+
+def _conditional_json(build, user_id=None) -> Response:
+    """
+    Serves a read-only JSON body with a strong ETag derived from the collection's version.
+
+    A request whose If-None-Match holds the current ETag, of any encoding, gets a 304
+    without `build` being called. Otherwise the body serialized for the current version
+    is reused from the response cache, or built, serialized and cached; so are its
+    compressed encodings, which large bodies are sent in when the client accepts one.
+
+    Args:
+        build (callable): Returns the response body; only called when no current copy is cached.
+        user_id (int): Owner of the collection the body is built from.
+
+    Returns:
+        Response: 200 with the body or 304 without one, both carrying the ETag.
+    """
+    # Read before the body is built: a concurrent write can then only leave the ETag older
+    # than the body, which costs a 200 on the next poll but never serves stale data
+    etag = get_affirmation_model().get_affirmations_version(user_id=user_id)
+    matched = next((tag for tag in encoding.etag_variants(etag) if request.if_none_match.contains_weak(tag)), None)
+    if matched is not None:
+        response = Response(status=304)
+        response.set_etag(matched)
+        response.vary.add('Accept-Encoding')
+    else:
+        cache = current_app.extensions['response_cache']
+        key = (request.full_path, user_id)
+        cached = cache.get(key)
+        if cached is None or cached[0] != etag:
+            # The last item collects the body's compressed encodings as they are requested
+            cached = (etag, current_app.json.response(build()).get_data(), {})
+            cache.set(key, cached)
+        response = Response(cached[1], mimetype=current_app.json.mimetype)
+        response.set_etag(etag)
+        if current_app.config['COMPRESS_MIN_SIZE'] >= 0:
+            encoding.compress_response(response, current_app.config['COMPRESS_MIN_SIZE'],
+                                       current_app.config['COMPRESS_LEVEL'], encoded=cached[2])
+    # Clients may keep the body but must revalidate it, and it differs per caller
+    response.cache_control.no_cache = True
+    response.vary.add('Authorization')
+    response.vary.add('Cookie')
+    return response
+
+
+@routes.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@routes.after_app_request
+def log_request_info(response):
+    duration_ms = round((time.perf_counter() - g.request_start) * 1000, 2)
+    level = logging.WARNING if response.status_code >= 500 else logging.INFO
+    access_logger.log(level, "%s %s %s %.2fms", request.method, request.path, response.status_code, duration_ms,
+                      extra={'method': request.method, 'path': request.path,
+                             'status': response.status_code, 'duration_ms': duration_ms})
+    return response
+
+def current_user_id():
+    """
+    Returns the ID of the logged-in user, or None for anonymous callers.
+
+    A bearer token from `/api/login` is verified without a database query in the
+    common case; otherwise the token the session cookie carries since login goes
+    through the same check, so a password change ends both. Affirmation routes use
+    the ID to scope every call to the caller's own collection; anonymous callers
+    share a single collection.
+
+    Raises:
+        401 error if a bearer token or the session's token is invalid, expired or revoked.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        try:
+            return Users.verify_token(auth_header[len('Bearer '):])
+        except ValueError as e:
+            raise Unauthorized(str(e))
+    token = session.get('token')
+    if token is None:
+        return None
+    try:
+        return Users.verify_token(token)
+    except ValueError as e:
+        # End the session so the caller's next request is anonymous
+        session.pop('token', None)
+        raise Unauthorized(str(e))
+
+@routes.app_errorhandler(Unauthorized)
+def handle_unauthorized(e):
+    return jsonify({"error": e.description}), 401
+
+@routes.route('/health', methods=['GET'])
 def health_check():
     """
     Health check route to verify the app is running.
@@ -43,7 +265,17 @@ def health_check():
     """
     return jsonify({"status": "App is running"}), 200 
 
-@app.route('/api/create-user', methods=['POST'])
+@routes.route('/metrics', methods=['GET'])
+def metrics_endpoint() -> Response:
+    """
+    Route exposing request, model, upstream and database metrics.
+
+    Returns:
+        The metrics in the Prometheus text exposition format.
+    """
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@routes.route('/api/create-user', methods=['POST'])
 def create_user() -> Response:
     """
     Route to create a new user.
@@ -59,7 +291,7 @@ def create_user() -> Response:
         400 error if input validation fails.
         500 error if there is an issue adding the user to the database.
     """
-    app.logger.info('Creating new user')
+    current_app.logger.info('Creating new user')
     try:
         # Get the JSON data from the request
         data = request.get_json()
@@ -72,17 +304,65 @@ def create_user() -> Response:
             return make_response(jsonify({'error': 'Invalid input, both username and password are required'}), 400)
 
         # Call the User function to add the user to the database
-        app.logger.info('Adding user: %s', username)
+        current_app.logger.info('Adding user: %s', username)
         Users.create_user(username, password)
 
-        app.logger.info("User added: %s", username)
+        current_app.logger.info("User added: %s", username)
         return make_response(jsonify({'status': 'user added', 'username': username}), 201)
     except Exception as e:
-        app.logger.error("Failed to add user: %s", str(e))
+        current_app.logger.error("Failed to add user: %s", str(e))
         return make_response(jsonify({'error': str(e)}), 500)
     
 
-@app.route('/api/login', methods=['POST'])
+@routes.route('/api/create-users', methods=['POST'])
+def create_users() -> Response:
+    """
+    Route to create many users at once.
+
+    Expected Input:
+        A JSON list of objects with a username and a password, or the same objects
+        as newline-delimited JSON with Content-Type application/x-ndjson. NDJSON
+        bodies are parsed while users are inserted, one batch at a time.
+
+    Returns:
+        JSON response with the number of users created and a result per input row
+        ('created', 'duplicate' or 'invalid').
+
+    Raises:
+        400 error if the body is not a JSON list or NDJSON.
+        500 error if there is an issue adding the users to the database.
+    """
+    current_app.logger.info('Creating users in bulk')
+    if request.mimetype == 'application/x-ndjson':
+        users = _parse_ndjson(request.stream)
+    else:
+        users = request.get_json(silent=True)
+        if not isinstance(users, list):
+            return make_response(jsonify({'error': 'Expected a JSON list of users or an NDJSON body'}), 400)
+    try:
+        results = Users.create_users(users, batch_size=current_app.config['USER_BATCH_SIZE'])
+    except Exception as e:
+        current_app.logger.error("Failed to add users: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+    created = sum(result['status'] == 'created' for result in results)
+    current_app.logger.info("Users added: %d of %d", created, len(results))
+    return make_response(jsonify({'status': 'success', 'created': created, 'results': results}), 200)
+
+
+def _parse_ndjson(stream):
+    """
+    Yields one object per non-empty line of an NDJSON stream; unparseable lines yield None.
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+@routes.route('/api/login', methods=['POST'])
 def login():
     """
     Route to log in a user.
@@ -92,7 +372,8 @@ def login():
         - password (str): The user's password.
 
     Returns:
-        JSON response indicating the success of the login.
+        JSON response indicating the success of the login, with a signed access token
+        to send as `Authorization: Bearer <token>` on later requests.
 
     Raises:
         400 error if input validation fails.
@@ -101,31 +382,44 @@ def login():
     """
     data = request.get_json()
     if not data or 'username' not in data or 'password' not in data:
-        app.logger.error("Invalid request payload for login.")
+        current_app.logger.error("Invalid request payload for login.")
         raise BadRequest("Invalid request payload. 'username' and 'password' are required.")
 
     username = data['username']
     password = data['password']
 
     try:
-        # Validate user credentials
-        if not Users.check_password(username, password):
-            app.logger.warning("Login failed for username: %s", username)
+        # Validate user credentials and get the user ID in a single lookup
+        user_id = Users.authenticate(username, password)
+        if user_id is None:
+            current_app.logger.warning("Login failed for username: %s", username)
             raise Unauthorized("Invalid username or password.")
 
-        # Get user ID
-        user_id = Users.get_id_by_username(username)
+        # The session keeps the token, so affirmation routes are scoped to this user until it is revoked
+        token = Users.generate_token(username)
+        session['token'] = token
 
-        app.logger.info("User %s logged in successfully.", username)
-        return jsonify({"message": f"User {username} logged in successfully."}), 200
+        current_app.logger.info("User %s logged in successfully.", username)
+        return jsonify({"message": f"User {username} logged in successfully.", "token": token}), 200
 
     except Unauthorized as e:
         return jsonify({"error": str(e)}), 401
     except Exception as e:
-        app.logger.error("Error during login for username %s: %s", username, str(e))
+        current_app.logger.error("Error during login for username %s: %s", username, str(e))
         return jsonify({"error": "An unexpected error occurred."}), 500
 
-@app.route('/api/update-password', methods=['PUT'])
+@routes.route('/api/logout', methods=['POST'])
+def logout():
+    """
+    Route to log out the current user.
+
+    Returns:
+        JSON response confirming the logout.
+    """
+    session.pop('token', None)
+    return jsonify({"message": "Logged out."}), 200
+
+@routes.route('/api/update-password', methods=['PUT'])
 def update_password() -> Response:
     """
     Route to update a user's password.
@@ -142,7 +436,7 @@ def update_password() -> Response:
         404 error if the user does not exist.
         500 error if there is an issue updating the password in the database.
     """
-    app.logger.info('Updating user password')
+    current_app.logger.info('Updating user password')
     try:
         # Get the JSON data from the request
         data = request.get_json()
@@ -155,20 +449,20 @@ def update_password() -> Response:
             return make_response(jsonify({'error': 'Invalid input, both username and new_password are required'}), 400)
 
         # Call the User function to update the password
-        app.logger.info('Updating password for user: %s', username)
+        current_app.logger.info('Updating password for user: %s', username)
         Users.update_password(username, new_password)
 
-        app.logger.info("Password updated for user: %s", username)
+        current_app.logger.info("Password updated for user: %s", username)
         return make_response(jsonify({'status': 'password updated', 'username': username}), 200)
     except ValueError as e:
-        app.logger.error("Failed to update password: %s", str(e))
+        current_app.logger.error("Failed to update password: %s", str(e))
         return make_response(jsonify({'error': str(e)}), 404)
     except Exception as e:
-        app.logger.error("Failed to update password: %s", str(e))
+        current_app.logger.error("Failed to update password: %s", str(e))
         return make_response(jsonify({'error': str(e)}), 500)
 
 
-@app.route('/fetch-affirmation', methods=['GET'])
+@routes.route('/fetch-affirmation', methods=['GET'])
 def fetch_affirmation():
     """
     Fetches a new affirmation from the external API and stores it in memory.
@@ -182,30 +476,134 @@ def fetch_affirmation():
     Raises:
         500 error if the external API call fails or the affirmation cannot be stored.
     """
-    affirmation = affirmation_model.fetch_affirmation()
+    affirmation = get_affirmation_model().fetch_affirmation(user_id=current_user_id())
     if affirmation:
         return jsonify({"message": "Affirmation fetched and stored.", "affirmation": affirmation}), 201
     else:
         return jsonify({"error": "Failed to fetch affirmation."}), 500
 
-@app.route('/view-affirmations', methods=['GET'])
+def parse_fetch_count(value) -> int:
+    """
+    Validates the `n` query parameter of `/fetch-affirmations`.
+
+    Args:
+        value (str): The raw parameter, or None for the default of 10.
+
+    Returns:
+        int: The number of affirmations to fetch.
+
+    Raises:
+        ValueError: If the value is not an integer between 1 and FETCH_MANY_MAX.
+    """
+    maximum = current_app.config['FETCH_MANY_MAX']
+    try:
+        n = int(value if value is not None else 10)
+    except ValueError:
+        n = 0
+    if not 1 <= n <= maximum:
+        raise ValueError(f"n must be an integer between 1 and {maximum}")
+    return n
+
+@routes.route('/fetch-affirmations', methods=['GET'])
+def fetch_affirmations():
+    """
+    Fetches several affirmations from the external API concurrently and stores them.
+
+    Query Parameters:
+        - n (int): The number of affirmations to fetch, between 1 and FETCH_MANY_MAX (default 10).
+
+    Returns:
+        JSON response with the distinct affirmations fetched and an error per failed fetch.
+
+    Raises:
+        400 error if `n` is not a valid number.
+        500 error if every fetch failed.
+    """
+    try:
+        n = parse_fetch_count(request.args.get('n'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = get_affirmation_model().fetch_many(n, user_id=current_user_id())
+    if result['affirmations']:
+        return jsonify({"message": "Affirmations fetched and stored.", **result}), 201
+    return jsonify({"error": "Failed to fetch affirmations.", "errors": result['errors']}), 500
+
+@routes.route('/view-affirmations', methods=['GET'])
 def view_affirmations():
     """
-    Returns all stored affirmations.
+    Returns stored affirmations, either all at once, one page at a time, or streamed.
 
-    Expected JSON Input:
-        None
+    Query Parameters:
+        - limit (int, optional): Page size (1-1000). Enables cursor pagination.
+        - after (int, optional): Cursor from the previous page's `next_cursor`.
+        - stream (str, optional): "ndjson" for one JSON string per line, or "json" for
+          the regular body sent in chunks.
 
     Returns:
-        JSON response containing a list of stored affirmations.
+        JSON response containing a list of stored affirmations, plus `next_cursor`
+        when paginating, or a streamed response when `stream` is set. Non-streamed
+        responses carry an ETag and are answered with 304 if it matches If-None-Match.
 
     Raises:
-        None
+        400 error if the pagination or stream parameters are invalid, e.g. a negative `after`.
     """
-    affirmations = affirmation_model.get_all_affirmations()
-    return jsonify({"message": "Here are all your affirmations!", "affirmations": affirmations}), 200
+    stream = request.args.get('stream')
+    if stream is not None:
+        if stream not in ('ndjson', 'json'):
+            return make_response(jsonify({'error': "stream must be 'ndjson' or 'json'"}), 400)
+        return Response(stream_with_context(_stream_affirmations(stream, current_user_id())),
+                        mimetype='application/x-ndjson' if stream == 'ndjson' else 'application/json')
+
+    if 'limit' in request.args or 'after' in request.args:
+        try:
+            limit = int(request.args.get('limit', 50))
+            after = int(request.args['after']) if 'after' in request.args else None
+        except ValueError:
+            return make_response(jsonify({'error': 'limit and after must be integers'}), 400)
+        if not 1 <= limit <= 1000:
+            return make_response(jsonify({'error': 'limit must be between 1 and 1000'}), 400)
+        if after is not None and after < 0:
+            return make_response(jsonify({'error': 'after must not be negative'}), 400)
+        user_id = current_user_id()
+
+        def build_page():
+            affirmations, next_cursor = get_affirmation_model().get_affirmations_page(after, limit, user_id=user_id)
+            return {"message": "Here are your affirmations!", "affirmations": affirmations,
+                    "next_cursor": next_cursor}
+        return _conditional_json(build_page, user_id)
+
+    user_id = current_user_id()
+
+    def build_all():
+        affirmations = get_affirmation_model().get_all_affirmations(user_id=user_id)
+        return {"message": "Here are all your affirmations!", "affirmations": affirmations}
+    return _conditional_json(build_all, user_id)
+
+def _stream_affirmations(stream_format: str, user_id=None):
+    """
+    Serializes stored affirmations page by page so only one page is in memory at a time.
+
+    Args:
+        stream_format (str): "ndjson" or "json".
+        user_id (int): Owner of the collection to stream, the shared collection if None.
 
-@app.route('/clear-affirmations', methods=['DELETE'])
+    Returns:
+        A generator of response body chunks.
+    """
+    if stream_format == 'ndjson':
+        for affirmations in get_affirmation_model().iter_affirmation_pages(user_id=user_id):
+            yield "".join(json.dumps(affirmation) + "\n" for affirmation in affirmations)
+        return
+
+    yield '{"message": "Here are all your affirmations!", "affirmations": ['
+    separator = ""
+    for affirmations in get_affirmation_model().iter_affirmation_pages(user_id=user_id):
+        yield separator + ", ".join(json.dumps(affirmation) for affirmation in affirmations)
+        separator = ", "
+    yield "]}"
+
+@routes.route('/clear-affirmations', methods=['DELETE'])
 def clear_affirmations():
     """
     Clears all stored affirmations.
@@ -219,10 +617,10 @@ def clear_affirmations():
     Raises:
         None
     """
-    affirmation_model.clear_affirmations()
+    get_affirmation_model().clear_affirmations(user_id=current_user_id())
     return jsonify({"message": "All affirmations cleared."}), 200
 
-@app.route('/affirmation-count', methods=['GET'])
+@routes.route('/affirmation-count', methods=['GET'])
 def affirmation_count():
     """
     Returns the number of affirmations stored in memory.
@@ -231,15 +629,53 @@ def affirmation_count():
         None
 
     Returns:
-        JSON response with the count of stored affirmations.
+        JSON response with the count of stored affirmations, or 304 if the caller's
+        If-None-Match holds the current ETag.
 
     Raises:
         None
     """
-    count = affirmation_model.get_affirmation_count()
-    return jsonify({"count": count}), 200
+    user_id = current_user_id()
+    return _conditional_json(lambda: {"count": get_affirmation_model().get_affirmation_count(user_id=user_id)},
+                             user_id)
+
+@routes.route('/search-affirmations', methods=['GET'])
+def search_affirmations():
+    """
+    Searches the stored affirmations, best match first, one page at a time.
+
+    Query Parameters:
+        - q (str): Words that must all appear in a match; `word*` matches any word starting with `word`.
+        - limit (int, optional): Page size (1-100, default 20).
+        - after (int, optional): Cursor from the previous page's `next_cursor`.
 
-@app.route('/random-affirmation', methods=['GET'])
+    Returns:
+        JSON response with the matching affirmations and `next_cursor`, or 304 if the
+        caller's If-None-Match holds the current ETag.
+
+    Raises:
+        400 error if the query has no words or the pagination parameters are invalid.
+    """
+    query = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', 20))
+        after = int(request.args['after']) if 'after' in request.args else None
+    except ValueError:
+        return make_response(jsonify({'error': 'limit and after must be integers'}), 400)
+    if not 1 <= limit <= 100:
+        return make_response(jsonify({'error': 'limit must be between 1 and 100'}), 400)
+    if after is not None and after < 0:
+        return make_response(jsonify({'error': 'after must not be negative'}), 400)
+    if not search_terms(query):
+        return make_response(jsonify({'error': 'q must contain at least one word'}), 400)
+    user_id = current_user_id()
+
+    def build_results():
+        affirmations, next_cursor = get_affirmation_model().search_affirmations(query, after, limit, user_id=user_id)
+        return {"query": query, "affirmations": affirmations, "next_cursor": next_cursor}
+    return _conditional_json(build_results, user_id)
+
+@routes.route('/random-affirmation', methods=['GET'])
 def random_affirmation():
     """
     Returns a random affirmation from the stored affirmations.
@@ -254,12 +690,16 @@ def random_affirmation():
     Raises:
         404 error if no affirmations are available.
     """
-    affirmations = affirmation_model.get_all_affirmations()
-    if affirmations:
-        random_affirmation = random.choice(affirmations)
+    random_affirmation = get_affirmation_model().get_random_affirmation(user_id=current_user_id())
+    if random_affirmation:
         return jsonify({"affirmation": random_affirmation}), 200
     else:
         return jsonify({"message": "No affirmations available."}), 404
 
+# Module-level app for `flask run`, asgi.py and gunicorn (see gunicorn.conf.py)
+app = create_app()
+affirmation_model = app.extensions['affirmation_model']
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    # Development server only; production runs under gunicorn
+    app.run(host="0.0.0.0", port=5001, debug=os.getenv('FLASK_DEBUG', '0') == '1')
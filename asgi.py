@@ -0,0 +1,202 @@
+"""
+ASGI entry point: serves the upstream-bound routes natively on asyncio and the rest through the Flask app.
+
+    uvicorn asgi:application --port 5001
+
+`/fetch-affirmation` and `/fetch-affirmations` await the external API on the
+event loop, so thousands of them can wait at once without a thread each. Every
+other route runs the regular Flask app on a bounded thread pool
+(ASGI_WSGI_THREADS), so the sync app and its routes behave exactly as under a
+WSGI server.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import Unauthorized
+
+from app import access_logger, affirmation_model, app, current_user_id, parse_fetch_count
+from utils import metrics
+from utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+_wsgi_pool = ThreadPoolExecutor(max_workers=int(os.getenv('ASGI_WSGI_THREADS', '32')), thread_name_prefix="wsgi")
+
+
+def _headers(scope) -> dict:
+    return {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+
+
+def _resolve_user_id(scope):
+    with app.test_request_context(scope['path'], headers=_headers(scope)):
+        return current_user_id()
+
+
+async def _user_id(scope):
+    """
+    Resolves the caller the same way the Flask routes do (bearer token, then session cookie).
+
+    Tokens are checked against the cached user record, but a record that is not cached
+    is loaded with a blocking query, so the lookup runs off the event loop.
+    """
+    return await asyncio.to_thread(_resolve_user_id, scope)
+
+
+async def _fetch_affirmation(scope, query):
+    affirmation = await affirmation_model.fetch_affirmation_async(user_id=await _user_id(scope))
+    if affirmation:
+        return 201, {"message": "Affirmation fetched and stored.", "affirmation": affirmation}
+    return 500, {"error": "Failed to fetch affirmation."}
+
+
+async def _fetch_affirmations(scope, query):
+    try:
+        with app.app_context():
+            n = parse_fetch_count(query.get('n', [None])[0])
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    result = await affirmation_model.fetch_many_async(n, user_id=await _user_id(scope))
+    if result['affirmations']:
+        return 201, {"message": "Affirmations fetched and stored.", **result}
+    return 500, {"error": "Failed to fetch affirmations.", "errors": result['errors']}
+
+
+ASYNC_ROUTES = {
+    ('GET', '/fetch-affirmation'): _fetch_affirmation,
+    ('GET', '/fetch-affirmations'): _fetch_affirmations,
+}
+
+
+async def _send_json(send, status: int, body: dict) -> None:
+    payload = json.dumps(body).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def _serve_async(handler, scope, send) -> None:
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        try:
+            status, body = await handler(scope, parse_qs(scope.get('query_string', b'').decode('latin-1')))
+        except Unauthorized as e:
+            status, body = 401, {"error": e.description}
+        except Exception:
+            logger.exception("Unhandled error in %s", scope['path'])
+            status, body = 500, {"error": "Internal server error"}
+        await _send_json(send, status, body)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        metrics.REQUEST_LATENCY.labels(scope['path'], scope['method']).observe(elapsed)
+        if status >= 500:
+            metrics.REQUEST_ERRORS.labels(scope['path'], scope['method']).inc()
+        access_logger.log(logging.WARNING if status >= 500 else logging.INFO, "%s %s %s %.2fms",
+                          scope['method'], scope['path'], status, elapsed * 1000,
+                          extra={'method': scope['method'], 'path': scope['path'], 'status': status,
+                                 'duration_ms': round(elapsed * 1000, 2)})
+
+
+def _environ(scope, body: bytes) -> dict:
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _start_wsgi(environ: dict):
+    # Runs the Flask app up to its first body chunk, so status and headers are known
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    result = app(environ, start_response)
+    iterator = iter(result)
+    first = next(iterator, None)
+    return response, result, iterator, first
+
+
+async def _serve_wsgi(scope, receive, send) -> None:
+    body = []
+    while True:
+        message = await receive()
+        body.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+
+    loop = asyncio.get_running_loop()
+    response, result, iterator, chunk = await loop.run_in_executor(
+        _wsgi_pool, _start_wsgi, _environ(scope, b''.join(body)))
+    try:
+        await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+        # Streamed responses are relayed chunk by chunk rather than buffered
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await loop.run_in_executor(_wsgi_pool, next, iterator, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(_wsgi_pool, result.close)
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await affirmation_model.async_client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send) -> None:
+    """
+    The ASGI application.
+    """
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+    if handler is not None:
+        return await _serve_async(handler, scope, send)
+    return await _serve_wsgi(scope, receive, send)
@@ -0,0 +1,156 @@
+"""
+Concurrent /fetch-affirmation capacity of the sync (thread per request) and async (ASGI) modes.
+
+    python -m benchmarks.bench_async_capacity --concurrency 100 500 2000 --latency-ms 200
+
+For each concurrency level, that many requests are started at once and held open
+by the fake upstream's latency. "sync" serves each through the Flask app on its
+own thread, as a threaded WSGI server does; "async" serves them through
+asgi.application as tasks on one event loop. Reported are wall time, requests
+served, peak thread count and peak RSS growth. The fake upstream runs in a
+separate process so its threads are not counted.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class PeakMonitor:
+    """
+    Samples thread count and RSS in the background while a run is in progress.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.base_rss = rss_kb()
+        self.peak_threads = threading.active_count()
+        self.peak_rss = self.base_rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_rss = max(self.peak_rss, rss_kb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_sync(concurrency: int) -> int:
+    from app import app
+
+    client = app.test_client()
+    statuses = []
+    start_gate = threading.Barrier(concurrency)
+
+    def request():
+        start_gate.wait()
+        statuses.append(client.get('/fetch-affirmation').status_code)
+
+    threads = [threading.Thread(target=request) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(status == 201 for status in statuses)
+
+
+def run_async(concurrency: int) -> int:
+    from asgi import application
+
+    async def request():
+        scope = {"type": "http", "method": "GET", "path": "/fetch-affirmation", "query_string": b"",
+                 "headers": [], "http_version": "1.1", "scheme": "http", "root_path": ""}
+        statuses = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        await application(scope, receive, send)
+        return statuses[0]
+
+    async def main():
+        return await asyncio.gather(*(request() for _ in range(concurrency)))
+
+    return sum(status == 201 for status in asyncio.run(main()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    args = parser.parse_args()
+
+    port = free_port()
+    upstream = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_upstream", "--port", str(port),
+                                 "--latency-ms", str(args.latency_ms), "--distinct", "100000"],
+                                stdout=subprocess.DEVNULL)
+    os.environ["AFFIRMATIONS_URL"] = f"http://127.0.0.1:{port}/"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        from app import affirmation_model
+        from utils.async_http_client import AsyncUpstreamClient
+        from utils.http_client import UpstreamClient
+
+        for concurrency in args.concurrency:
+            # Let every request have its own upstream connection in both modes
+            affirmation_model.client = UpstreamClient(pool_size=concurrency)
+            affirmation_model.async_client = AsyncUpstreamClient(pool_size=concurrency)
+            for mode in args.modes:
+                run = run_sync if mode == "sync" else run_async
+                with PeakMonitor() as monitor:
+                    start = time.perf_counter()
+                    try:
+                        served, error = run(concurrency), None
+                    except RuntimeError as e:  # e.g. "can't start new thread"
+                        served, error = 0, str(e)
+                    elapsed = time.perf_counter() - start
+                print(json.dumps({"mode": mode, "concurrency": concurrency, "served": served, "error": error,
+                                  "wall_s": round(elapsed, 2), "peak_threads": monitor.peak_threads,
+                                  "peak_rss_growth_mb": round((monitor.peak_rss - monitor.base_rss) / 1024, 1)}),
+                      flush=True)
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Rows per second when provisioning users one at a time vs. in bulk.
+
+    python -m benchmarks.bench_bulk_users --users 2000 --workers 0 4
+
+"per_user" calls Users.create_user for each row (one hash, one transaction,
+one duplicate check by IntegrityError). "bulk" calls Users.create_users, which
+hashes on a pool of `--workers` processes and inserts in `--batch-size` batches.
+A cheap scrypt cost is used by default so database overhead stays visible; pass
+--scrypt-n 16384 to measure with the production cost.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+from models.user_model import Users, db
+from utils.password_hashing import PasswordHashingService, ScryptHasher
+from utils.sql_utils import count_queries
+
+
+def per_user(rows: list, batch_size: int) -> None:
+    for row in rows:
+        Users.create_user(row["username"], row["password"])
+
+
+def bulk(rows: list, batch_size: int) -> None:
+    Users.create_users(rows, batch_size=batch_size)
+
+
+def measure(name: str, create, users: int, workers: int, batch_size: int, scrypt_n: int) -> dict:
+    Users.configure_password_hashing(PasswordHashingService(ScryptHasher(n=scrypt_n), workers=workers))
+    db.drop_all()
+    db.create_all()
+    rows = [{"username": f"user{i}", "password": f"password{i}"} for i in range(users)]
+    with count_queries() as counter:
+        start = time.perf_counter()
+        create(rows, batch_size)
+        elapsed = time.perf_counter() - start
+    assert Users.query.count() == users
+    return {"path": name, "users": users, "workers": workers, "batch_size": batch_size,
+            "queries": counter.count, "rows_per_s": round(users / elapsed, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1])
+    parser.add_argument("--scrypt-n", type=int, default=2 ** 10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            for workers in args.workers:
+                print(json.dumps(measure("per_user", per_user, args.users, workers, args.batch_size, args.scrypt_n)))
+                print(json.dumps(measure("bulk", bulk, args.users, workers, args.batch_size, args.scrypt_n)))
+        Users._hashing.shutdown()
+
+
+if __name__ == "__main__":
+    main()
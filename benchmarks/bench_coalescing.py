@@ -0,0 +1,58 @@
+"""
+Upstream requests and latency for a burst of concurrent fetches, with and without coalescing.
+
+    python -m benchmarks.bench_coalescing --callers 64 --latency-ms 100 --windows 0 0.05
+
+Uses the local fake upstream, so it runs offline.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_upstream import FakeUpstream
+from models import api_model
+from models.api_model import AffirmationModel
+from utils.http_client import UpstreamClient
+
+
+def measure(upstream: FakeUpstream, callers: int, bursts: int, window) -> dict:
+    model = AffirmationModel(client=UpstreamClient(pool_size=callers))
+    if window is not None:
+        model.enable_coalescing(window=window)
+    before = upstream.requests
+    latencies = []
+
+    def fetch(_):
+        start = time.perf_counter()
+        model.fetch_affirmation()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        for _ in range(bursts):
+            latencies.extend(pool.map(fetch, range(callers)))
+    latencies.sort()
+    return {"coalesce_window": window, "fetches": len(latencies), "upstream_requests": upstream.requests - before,
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1), "max_ms": round(latencies[-1] * 1000, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=64)
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0.0, 0.05])
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(latency=args.latency_ms / 1000).start()
+    api_model.AFFIRMATIONS_URL = upstream.url
+    try:
+        print(json.dumps(measure(upstream, args.callers, args.bursts, None)))
+        for window in args.windows:
+            print(json.dumps(measure(upstream, args.callers, args.bursts, window)))
+    finally:
+        upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Bytes sent and CPU time per poll of /view-affirmations and /affirmation-count,
+with and without ETag revalidation and the serialized-body cache.
+
+    python -m benchmarks.bench_conditional_get --count 10000 --polls 500 --store sqlite
+
+Modes:
+    uncached      every poll builds and serializes the body (response cache disabled)
+    cached        every poll gets a 200 whose body comes from the response cache
+    not_modified  every poll sends If-None-Match with the current ETag and gets a 304
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from app import create_app
+from models.affirmation_store import SQLiteAffirmationStore
+from utils.cache import TTLCache
+
+ROUTES = ("/view-affirmations", "/view-affirmations?limit=100", "/affirmation-count")
+
+
+def response_bytes(response) -> int:
+    headers = "".join(f"{name}: {value}\r\n" for name, value in response.headers.items())
+    return len(f"HTTP/1.1 {response.status}\r\n{headers}\r\n".encode()) + len(response.data)
+
+
+def measure(app, route: str, mode: str, polls: int) -> dict:
+    if mode == "uncached":
+        app.extensions['response_cache'] = TTLCache(maxsize=0)
+    else:
+        app.extensions['response_cache'] = TTLCache(maxsize=256, ttl=300.0)
+    client = app.test_client()
+    first = client.get(route)
+    headers = {"If-None-Match": first.headers["ETag"]} if mode == "not_modified" else {}
+
+    sent = 0
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(polls):
+        response = client.get(route, headers=headers)
+        sent += response_bytes(response)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    return {"route": route, "mode": mode, "status": response.status_code, "polls": polls,
+            "bytes_per_poll": sent // polls, "cpu_us_per_poll": round(cpu / polls * 1e6, 1),
+            "wall_us_per_poll": round(wall / polls * 1e6, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000, help="Affirmations in the store")
+    parser.add_argument("--polls", type=int, default=500)
+    parser.add_argument("--store", choices=("memory", "sqlite"), default="memory")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {"SECRET_KEY": "bench"}
+        if args.store == "sqlite":
+            config["DB_PATH"] = os.path.join(tmp, "affirmations.db")
+        app = create_app(config)
+        store = app.extensions['affirmation_model'].store
+        store.add_many(f"You are doing great, reminder number {i}." for i in range(args.count))
+        store.flush()
+
+        for route in ROUTES:
+            for mode in ("uncached", "cached", "not_modified"):
+                print(json.dumps(measure(app, route, mode, args.polls)))
+        if isinstance(store, SQLiteAffirmationStore):
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
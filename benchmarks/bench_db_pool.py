@@ -0,0 +1,96 @@
+"""
+Concurrent create-user and login throughput on a SQLite file, with the bare engine
+and with the tuned engine from db.init_db (WAL, pragmas, sized pool).
+
+    python -m benchmarks.bench_db_pool --ops 2000 --threads 16
+
+Hashing uses a trivial scrypt cost inline and the user record cache is disabled, so
+every operation is dominated by its database round trips. "errors" counts
+operations that failed, e.g. with "database is locked".
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from db import db, init_db, pool_stats
+from models.user_model import Users
+from utils.cache import TTLCache
+from utils.password_hashing import PasswordHashingService, ScryptHasher
+
+
+def make_app(mode: str, path: str, threads: int) -> Flask:
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark-secret-key'
+    if mode == "baseline":
+        # What app.py did before: default engine options, default journal and pool
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+        db.init_app(app)
+    else:
+        app.config.update(DB_PATH=path, DB_POOL_SIZE=threads, DB_MAX_OVERFLOW=0)
+        init_db(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def measure(mode: str, path: str, ops: int, threads: int, write_ratio: float) -> dict:
+    app = make_app(mode, path, threads)
+    prefix = uuid.uuid4().hex[:6]
+    existing = [f"{prefix}-seed-{i}" for i in range(threads)]
+    with app.app_context():
+        for username in existing:
+            Users.create_user(username, "password123")
+
+    def operation(i):
+        rng = random.Random(i)
+        start = time.perf_counter()
+        try:
+            with app.app_context():
+                if rng.random() < write_ratio:
+                    Users.create_user(f"{prefix}-user-{i}", "password123")
+                else:
+                    assert Users.authenticate(rng.choice(existing), "password123") is not None
+                db.session.remove()
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, type(e).__name__
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(operation, range(ops)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    with app.app_context():
+        stats = pool_stats()[None]
+        journal = db.session.execute(db.text("PRAGMA journal_mode")).scalar()
+        db.engine.dispose()
+    return {"mode": mode, "journal_mode": journal, "threads": threads, "ops": ops, "write_ratio": write_ratio,
+            "ops_per_s": round(ops / elapsed, 1), "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+            "errors": sum(error is not None for _, error in results), "pool": stats}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--write-ratio", type=float, default=0.3, help="Fraction of operations creating a user")
+    args = parser.parse_args()
+
+    Users.configure_password_hashing(PasswordHashingService(ScryptHasher(n=2 ** 4)))
+    Users._record_cache = TTLCache(maxsize=0)
+    for mode in ("baseline", "tuned"):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            print(json.dumps(measure(mode, path, args.ops, args.threads, args.write_ratio)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
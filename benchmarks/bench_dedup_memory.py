@@ -0,0 +1,55 @@
+"""
+Memory held by stored affirmations under a skewed, repetitive fetch workload.
+
+Fetches are drawn from a small corpus with a Zipf-like distribution, the way the
+upstream API repeats its affirmations. Every fetch produces a fresh string object, as
+decoding a JSON response would. Compares appending to a plain list with the
+deduplicating InMemoryAffirmationStore:
+
+    python -m benchmarks.bench_dedup_memory --fetches 1000000 --corpus 200
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from models.affirmation_store import InMemoryAffirmationStore
+
+
+def workload(fetches: int, corpus_size: int, skew: float, seed: int):
+    corpus = [f"You are doing great, affirmation number {i}." for i in range(corpus_size)]
+    weights = [1 / (rank + 1) ** skew for rank in range(corpus_size)]
+    rng = random.Random(seed)
+    for text in rng.choices(corpus, weights=weights, k=fetches):
+        yield text.encode().decode()
+
+
+def measure(name: str, add, factory, args) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    target = factory()
+    for text in workload(args.fetches, args.corpus, args.skew, args.seed):
+        add(target, text)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stored = len(target) if isinstance(target, list) else target.count()
+    return {"store": name, "fetches": args.fetches, "stored": stored,
+            "bytes": current, "seconds": round(elapsed, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetches", type=int, default=1000000)
+    parser.add_argument("--corpus", type=int, default=200)
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(measure("list", list.append, list, args)))
+    print(json.dumps(measure("dedup", InMemoryAffirmationStore.add, InMemoryAffirmationStore, args)))
+
+
+if __name__ == "__main__":
+    main()
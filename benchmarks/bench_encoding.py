@@ -0,0 +1,100 @@
+"""
+CPU time to serialize and compress /view-affirmations bodies, and the bytes they
+take on the wire, for lists of 10k and 100k affirmations.
+
+    python -m benchmarks.bench_encoding --counts 10000 100000
+
+"serialize" rows time the JSON provider with each encoder. "compress" rows time
+each content coding and level on the serialized body. "route" rows time full
+requests through the app: "cold" rebuilds the body after a write, and "warm" is
+served from the response cache, compressed body included.
+"""
+import argparse
+import json
+import random
+import time
+
+from flask import Flask
+
+from app import create_app
+from utils.encoding import CODINGS, JSONProvider, compress, orjson
+
+
+OPENINGS = ("You are", "Today you are", "I am", "We are", "Always be")
+COMMON = ("strong", "calm", "brave", "kind", "worthy", "enough", "capable", "loved")
+SYLLABLES = ("ba", "cor", "den", "fi", "gra", "hum", "lo", "mer", "nat", "pre", "qui", "ros", "sel", "ti", "ven")
+
+
+def corpus(count: int, vocabulary: int = 20000, seed: int = 7):
+    # Word-like vocabulary, so the text compresses roughly like prose rather than like one repeated sentence
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(SYLLABLES, k=rng.randint(1, 4))) for _ in range(vocabulary)]
+    for _ in range(count):
+        yield f"{rng.choice(OPENINGS)} {rng.choice(COMMON)}, {' '.join(rng.choices(words, k=4))}."
+
+
+def best_ms(call, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2)
+
+
+def serialize_rows(count: int, repeats: int):
+    body = {"message": "Here are all your affirmations!", "affirmations": list(corpus(count))}
+    encoders = ("stdlib", "orjson") if orjson is not None else ("stdlib",)
+    for encoder in encoders:
+        app = Flask(__name__)
+        app.config['JSON_ENCODER'] = encoder
+        provider = JSONProvider(app)
+        yield {"count": count, "step": "serialize", "encoder": encoder,
+               "ms": best_ms(lambda: provider.dump_bytes(body), repeats),
+               "bytes": len(provider.dump_bytes(body))}
+
+
+def compress_rows(count: int, repeats: int):
+    body = json.dumps({"message": "Here are all your affirmations!", "affirmations": list(corpus(count))},
+                      separators=(",", ":")).encode()
+    yield {"count": count, "step": "compress", "coding": "identity", "ms": 0.0, "bytes": len(body)}
+    for coding in CODINGS:
+        for level in (1, 6, 9):
+            yield {"count": count, "step": "compress", "coding": coding, "level": level,
+                   "ms": best_ms(lambda: compress(body, coding, level), repeats),
+                   "bytes": len(compress(body, coding, level))}
+
+
+def route_rows(count: int, repeats: int):
+    app = create_app({'SECRET_KEY': 'benchmark-secret-key'})
+    model = app.extensions['affirmation_model']
+    model.store.add_many(corpus(count))
+    client = app.test_client()
+    writes = iter(range(10 ** 9))
+    for accept in ("identity", "gzip"):
+        headers = {'Accept-Encoding': accept}
+
+        def cold():
+            model.store.add(f"Written between requests {next(writes)}")
+            client.get('/view-affirmations', headers=headers)
+        response = client.get('/view-affirmations', headers=headers)
+        yield {"count": count, "step": "route", "accept": accept,
+               "cold_ms": best_ms(cold, repeats),
+               "warm_ms": best_ms(lambda: client.get('/view-affirmations', headers=headers), repeats),
+               "bytes": len(response.data)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    for count in args.counts:
+        for rows in (serialize_rows, compress_rows, route_rows):
+            for row in rows(count, args.repeats):
+                print(json.dumps(row), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Wall time of fetching n affirmations with a fetch_affirmation loop vs. fetch_many.
+
+    python -m benchmarks.bench_fetch_many --n 10 50 100 --workers 8 --latency-ms 50
+
+Uses the local fake upstream, so it runs offline.
+"""
+import argparse
+import json
+import time
+
+from benchmarks.fake_upstream import FakeUpstream
+from models import api_model
+from models.api_model import AffirmationModel
+from utils.http_client import UpstreamClient
+
+
+def measure(mode: str, n: int, workers: int) -> dict:
+    model = AffirmationModel(client=UpstreamClient(pool_size=workers), fetch_workers=workers)
+    start = time.perf_counter()
+    if mode == "loop":
+        for _ in range(n):
+            model.fetch_affirmation()
+    else:
+        model.fetch_many(n)
+    elapsed = time.perf_counter() - start
+    return {"mode": mode, "n": n, "workers": workers, "stored": model.get_affirmation_count(),
+            "wall_ms": round(elapsed * 1000, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(latency=args.latency_ms / 1000, distinct=100000).start()
+    api_model.AFFIRMATIONS_URL = upstream.url
+    try:
+        for n in args.n:
+            print(json.dumps(measure("loop", n, args.workers)))
+            print(json.dumps(measure("fetch_many", n, args.workers)))
+    finally:
+        upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
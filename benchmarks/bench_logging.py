@@ -0,0 +1,125 @@
+"""
+Logging overhead per request, synchronous handlers vs. the queued pipeline.
+
+    python -m benchmarks.bench_logging --requests 5000 --threads 8
+
+Each request logs an access line and two handler lines, like the app's routes.
+"sync" writes them inline with a StreamHandler, as before; "queued" hands them
+to the background writer; "queued_sampled" also keeps only --sample-rate of the
+access lines. "none" is the same app with logging disabled, and the overhead
+column is each mode's extra time per request over it.
+
+--write-latency-ms makes every write to the log sink block for that long, like
+stderr piped to a slow log collector; 0 writes straight to a local file.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from utils import logger as log_utils
+from utils.logger import TEXT_FORMAT, AccessLogFilter
+
+
+class SlowStream:
+    """
+    File wrapper whose writes block, standing in for a congested log pipe.
+    """
+
+    def __init__(self, stream, latency: float):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text: str) -> None:
+        time.sleep(self.latency)
+        self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def build_app(handler_logger: logging.Logger, access_logger: logging.Logger) -> Flask:
+    app = Flask(__name__)
+
+    @app.route('/health')
+    def health():
+        handler_logger.info("Checking health")
+        handler_logger.info("Health check passed")
+        return {"status": "App is running"}
+
+    @app.after_request
+    def log_request(response):
+        access_logger.info("GET /health %s", response.status_code, extra={'status': response.status_code})
+        return response
+
+    return app
+
+
+def setup(mode: str, log_file, sample_rate: float):
+    handler_logger = logging.getLogger(f"bench.{mode}.handler")
+    access_logger = logging.getLogger(f"bench.{mode}.access")
+    for logger in (handler_logger, access_logger):
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        if mode == "none":
+            logger.disabled = True
+        elif mode == "sync":
+            handler = logging.StreamHandler(log_file)
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            logger.addHandler(handler)
+        else:
+            logger.addHandler(log_utils._queue_handler)
+    if mode == "queued_sampled":
+        access_logger.addFilter(AccessLogFilter(sample_rate=sample_rate))
+    return build_app(handler_logger, access_logger)
+
+
+def measure(mode: str, requests: int, threads: int, log_file, sample_rate: float) -> dict:
+    app = setup(mode, log_file, sample_rate)
+
+    def worker(count):
+        client = app.test_client()
+        for _ in range(count):
+            client.get('/health')
+
+    per_thread = requests // threads
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, [per_thread] * threads))
+    elapsed = time.perf_counter() - start
+    # Queued records still being written are not on the request path
+    log_utils.stop_logging()
+    log_utils.start_logging(stream=log_file)
+    total = per_thread * threads
+    return {"mode": mode, "requests": total, "threads": threads, "us_per_request": round(elapsed / total * 1e6, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--write-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.path.join(tmp, "bench.log"), "w") as log_file:
+        if args.write_latency_ms:
+            log_file = SlowStream(log_file, args.write_latency_ms / 1000)
+        log_utils.start_logging(stream=log_file)
+        results = [measure(mode, args.requests, args.threads, log_file, args.sample_rate)
+                   for mode in ("none", "sync", "queued", "queued_sampled")]
+        log_utils.stop_logging()
+    baseline = results[0]["us_per_request"]
+    for result in results:
+        result["overhead_us"] = round(result["us_per_request"] - baseline, 1)
+        result["write_latency_ms"] = args.write_latency_ms
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+DB queries and time per login, before and after credential caching.
+
+    python -m benchmarks.bench_login_queries --logins 5000
+
+"legacy" replays the old /api/login path (check_password, then get_id_by_username,
+each with its own query), "cold" is Users.authenticate with an empty cache and
+"cached" is Users.authenticate with the record already cached.
+"""
+import argparse
+import hashlib
+import json
+import time
+
+from flask import Flask
+
+from models.user_model import Users, db
+from utils.sql_utils import count_queries
+
+
+def legacy_login(username: str, password: str) -> int:
+    user = Users.query.filter_by(username=username).first()
+    if hashlib.sha256((password + user.salt).encode()).hexdigest() != user.password:
+        return None
+    return Users.query.filter_by(username=username).first().id
+
+
+def cold_login(username: str, password: str) -> int:
+    Users._record_cache.invalidate(username)
+    return Users.authenticate(username, password)
+
+
+def cached_login(username: str, password: str) -> int:
+    return Users.authenticate(username, password)
+
+
+def measure(name: str, login, logins: int) -> dict:
+    with count_queries() as counter:
+        start = time.perf_counter()
+        for _ in range(logins):
+            login("benchuser", "password123")
+        elapsed = time.perf_counter() - start
+    return {"path": name, "logins": logins, "queries_per_login": counter.count / logins,
+            "us_per_login": round(elapsed / logins * 1e6, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=5000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        Users.create_user("benchuser", "password123")
+        for name, login in (("legacy", legacy_login), ("cold", cold_login), ("cached", cached_login)):
+            print(json.dumps(measure(name, login, args.logins)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Cost of the metrics layer: one histogram observation, and a full request with and without instrumentation.
+
+    python -m benchmarks.bench_metrics --observations 1000000 --requests 5000
+"""
+import argparse
+import json
+import time
+
+from flask import Flask, jsonify
+
+from utils import metrics
+from utils.metrics import Histogram
+
+
+def build_app(instrumented: bool) -> Flask:
+    app = Flask(__name__)
+    if instrumented:
+        metrics.instrument_app(app)
+
+    @app.route('/health')
+    def health():
+        return jsonify({"status": "App is running"})
+
+    return app
+
+
+def measure_requests(instrumented: bool, requests: int) -> dict:
+    client = build_app(instrumented).test_client()
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/health')
+    elapsed = time.perf_counter() - start
+    return {"instrumented": instrumented, "requests": requests, "us_per_request": round(elapsed / requests * 1e6, 1)}
+
+
+def measure_observe(observations: int) -> dict:
+    child = Histogram("bench_seconds", "Benchmark.", ("route",)).labels("/health")
+    start = time.perf_counter()
+    for i in range(observations):
+        child.observe((i % 1000) / 1000)
+    elapsed = time.perf_counter() - start
+    return {"observations": observations, "ns_per_observe": round(elapsed / observations * 1e9, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--observations", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(json.dumps(measure_observe(args.observations)))
+    print(json.dumps(measure_requests(False, args.requests)))
+    print(json.dumps(measure_requests(True, args.requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Login throughput for several password hashing costs and hashing pool sizes.
+
+    python -m benchmarks.bench_password_hashing --logins 200 --threads 8
+
+Each configuration creates a user with that cost, then `--threads` request
+threads log in concurrently. "workers=0" hashes inline on the request threads;
+otherwise hashing runs on a process pool of that size.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from models.user_model import Users, db
+from utils.password_hashing import PBKDF2Hasher, PasswordHashingService, ScryptHasher
+
+HASHERS = {
+    "scrypt_n2^12": lambda: ScryptHasher(n=2 ** 12),
+    "scrypt_n2^14": lambda: ScryptHasher(n=2 ** 14),
+    "pbkdf2_100k": lambda: PBKDF2Hasher(iterations=100000),
+    "pbkdf2_600k": lambda: PBKDF2Hasher(iterations=600000),
+}
+
+
+def measure(app: Flask, name: str, workers: int, logins: int, threads: int) -> dict:
+    service = PasswordHashingService(HASHERS[name](), workers=workers)
+    Users.configure_password_hashing(service)
+    username = f"bench_{name}_{workers}"
+    with app.app_context():
+        Users.create_user(username, "password123")
+        Users.authenticate(username, "password123")  # warm the record cache and the pool
+
+    def login(_):
+        with app.app_context():
+            return Users.authenticate(username, "password123")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    service.shutdown()
+    assert all(results)
+    return {"hasher": name, "workers": workers, "threads": threads, "logins": logins,
+            "logins_per_s": round(logins / elapsed, 1), "ms_per_login": round(elapsed / logins * 1e3, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, os.cpu_count() or 1])
+    parser.add_argument("--hashers", nargs="+", choices=sorted(HASHERS), default=sorted(HASHERS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app.config['SECRET_KEY'] = 'benchmark-secret-key'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+        for name in args.hashers:
+            for workers in args.workers:
+                print(json.dumps(measure(app, name, workers, args.logins, args.threads)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
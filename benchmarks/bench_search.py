@@ -0,0 +1,89 @@
+"""
+Latency of full-text search in the in-memory and SQLite stores, by how many
+affirmations the query matches.
+
+    python -m benchmarks.bench_search --count 1000000 --store memory
+
+The corpus is synthetic: every affirmation combines a few common words with words
+from a vocabulary of --vocabulary words whose frequencies follow a Zipf
+distribution, so some queries hit a handful of rows and others hit most of them.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+
+from models.affirmation_store import InMemoryAffirmationStore, SQLiteAffirmationStore
+
+OPENINGS = ("You are", "Today you are", "I am", "We are", "Always be")
+COMMON = ("strong", "calm", "brave", "kind", "worthy", "enough", "capable", "loved")
+
+
+def corpus(count: int, vocabulary: int, seed: int = 7):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(vocabulary)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+    for i in range(count):
+        rare = rng.choices(words, cum_weights=cum_weights, k=2)
+        yield f"{rng.choice(OPENINGS)} {rng.choice(COMMON)} and {rare[0]} {rare[1]}, note {i}."
+
+
+def queries(count: int, vocabulary: int) -> dict:
+    return {
+        "rare_word": f"w{vocabulary // 10}",
+        "mid_word": f"w{vocabulary // 100}",
+        "mid_and_common": f"brave w{vocabulary // 100}",
+        "rare_prefix": f"w{vocabulary // 10 + 1}*",
+        "exact_id": f"note {count // 2}",
+        "common_word": "brave",
+        "common_pair": "you brave",
+    }
+
+
+def measure(store, name: str, query: str, repeats: int, page_size: int) -> dict:
+    store.search(query, limit=page_size)
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results, next_cursor = store.search(query, limit=page_size)
+        latencies.append(time.perf_counter() - start)
+    second_start = time.perf_counter()
+    if next_cursor is not None:
+        store.search(query, after=next_cursor, limit=page_size)
+    second_page = time.perf_counter() - second_start
+    latencies.sort()
+    return {"query": name, "q": query, "results": len(results), "more": next_cursor is not None,
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+            "second_page_ms": round(second_page * 1000, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000000, help="Affirmations in the store")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--store", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.store == "sqlite":
+            store = SQLiteAffirmationStore(os.path.join(tmp, "search.db"), batch_size=10000)
+        else:
+            store = InMemoryAffirmationStore()
+        start = time.perf_counter()
+        store.add_many(corpus(args.count, args.vocabulary))
+        store.flush()
+        print(json.dumps({"store": args.store, "count": store.count(),
+                          "load_s": round(time.perf_counter() - start, 1)}), flush=True)
+        for name, query in queries(args.count, args.vocabulary).items():
+            print(json.dumps(measure(store, name, query, args.repeats, args.page_size)), flush=True)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-call latency of the reads behind /affirmation-count and /view-affirmations, and
+of single appends, for the stores that several workers can share: the SQLite store
+and the memory-mapped store.
+
+    python -m benchmarks.bench_shared_store --count 100000
+
+"visible_us" is the time from a forked process finishing a write to the parent's
+count, polled in a busy loop, including it. On one CPU it is bounded below by a
+scheduler switch.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from models.affirmation_store import MappedAffirmationStore, SQLiteAffirmationStore
+
+
+def per_call_us(call, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        call()
+    return round((time.perf_counter() - start) / repeats * 1e6, 2)
+
+
+def visibility_us(store) -> float:
+    # perf_counter is CLOCK_MONOTONIC on Linux, so both processes read the same clock
+    before = store.count()
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            store.after_fork()
+            time.sleep(0.05)
+            store.add("written by another worker")
+            store.flush()
+            os.write(write_end, repr(time.perf_counter()).encode())
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    while store.count() == before:
+        pass
+    seen = time.perf_counter()
+    written = float(os.read(read_end, 64))
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    return round(max(seen - written, 0.0) * 1e6, 1)
+
+
+def measure(name: str, store, count: int, repeats: int) -> dict:
+    start = time.perf_counter()
+    store.add_many(f"You are doing great, reminder number {i}." for i in range(count))
+    store.flush()
+    load = time.perf_counter() - start
+
+    result = {"store": name, "count": store.count(), "load_s": round(load, 2),
+              "count_us": per_call_us(store.count, repeats),
+              "version_us": per_call_us(store.version, repeats),
+              "page_50_us": per_call_us(lambda: store.page(after=count // 2, limit=50), repeats),
+              "sample_1_us": per_call_us(lambda: store.sample(1), repeats)}
+    adds = iter(range(repeats))
+
+    def add_one():
+        store.add(f"new affirmation {next(adds)}")
+        store.flush()
+    result["add_us"] = per_call_us(add_one, repeats)
+
+    result["visible_us"] = visibility_us(store)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000, help="Affirmations in the store")
+    parser.add_argument("--repeats", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {
+            "sqlite": SQLiteAffirmationStore(os.path.join(tmp, "affirmations.db"), batch_size=1),
+            "mmap": MappedAffirmationStore(os.path.join(tmp, "affirmations.log")),
+        }
+        for name, store in stores.items():
+            print(json.dumps(measure(name, store, args.count, args.repeats)), flush=True)
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
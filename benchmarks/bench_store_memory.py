@@ -0,0 +1,88 @@
+"""
+Resident memory of a million-scale affirmation collection held as a plain list of
+strings, in InMemoryAffirmationStore and in CompactAffirmationStore.
+
+    python -m benchmarks.bench_store_memory --counts 1000000 10000000
+
+Affirmations are distinct sentences over a 1000-word vocabulary. Each (store, count)
+pair is loaded in a fresh child process and reported as the growth of its resident
+set size, so freed temporaries and allocator overhead are counted the way the kernel
+sees them. Both stores include their dedup and search indexes, which the bare list
+lacks. Reads are timed on the loaded collection: a page deep in the collection, and
+a sample.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from models.affirmation_store import CompactAffirmationStore, InMemoryAffirmationStore
+
+STORES = {
+    "list": list,
+    "memory": InMemoryAffirmationStore,
+    "compact": CompactAffirmationStore,
+}
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def corpus(count: int, vocabulary: int = 1000):
+    # Distinct sentences over a fixed vocabulary, as natural-language affirmations are
+    words = [f"word{i}" for i in range(vocabulary)]
+    for i in range(count):
+        first, second, third = i % vocabulary, i // vocabulary % vocabulary, i // vocabulary ** 2 % vocabulary
+        yield f"You are {words[first]} and {words[second]}, today and every day {words[third]}."
+
+
+def measure(name: str, count: int, results) -> None:
+    before = rss_bytes()
+    start = time.perf_counter()
+    target = STORES[name]()
+    if isinstance(target, list):
+        target.extend(corpus(count))
+    else:
+        target.add_many(corpus(count))
+    load = time.perf_counter() - start
+    grown = rss_bytes() - before
+
+    start = time.perf_counter()
+    for _ in range(100):
+        if isinstance(target, list):
+            target[count // 2:count // 2 + 50]
+        else:
+            target.page(after=count // 2, limit=50)
+    page = (time.perf_counter() - start) / 100
+    start = time.perf_counter()
+    for _ in range(100):
+        if isinstance(target, list):
+            [target[i] for i in range(0, count, count // 10)]
+        else:
+            target.sample(10)
+    sample = (time.perf_counter() - start) / 100
+    results.put({"store": name, "count": count, "rss_mb": round(grown / 2 ** 20, 1),
+                 "bytes_per_item": round(grown / count, 1), "load_s": round(load, 1),
+                 "page_50_us": round(page * 1e6, 1), "sample_10_us": round(sample * 1e6, 1)})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--stores", nargs="+", choices=tuple(STORES), default=list(STORES))
+    args = parser.parse_args()
+
+    results = multiprocessing.Queue()
+    for count in args.counts:
+        for name in args.stores:
+            child = multiprocessing.Process(target=measure, args=(name, count, results))
+            child.start()
+            print(json.dumps(results.get()), flush=True)
+            child.join()
+
+
+if __name__ == "__main__":
+    main()
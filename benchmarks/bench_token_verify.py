@@ -0,0 +1,52 @@
+"""
+Per-request cost of authenticating with a signed token vs. re-checking the password.
+
+    python -m benchmarks.bench_token_verify --requests 5000
+
+"password" invalidates the cached record first, so every request pays the
+database query and hash an authenticated route would need without tokens.
+"""
+import argparse
+import json
+import time
+
+from flask import Flask
+
+from models.user_model import Users, db
+from utils.sql_utils import count_queries
+
+
+def password_check() -> None:
+    Users._record_cache.invalidate("benchuser")
+    Users.check_password("benchuser", "password123")
+
+
+def measure(name: str, authenticate, requests: int) -> dict:
+    with count_queries() as counter:
+        start = time.perf_counter()
+        for _ in range(requests):
+            authenticate()
+        elapsed = time.perf_counter() - start
+    return {"auth": name, "requests": requests, "queries_per_request": counter.count / requests,
+            "us_per_request": round(elapsed / requests * 1e6, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SECRET_KEY'] = 'benchmark-secret-key'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        Users.create_user("benchuser", "password123")
+        token = Users.generate_token("benchuser")
+        print(json.dumps(measure("password", password_check, args.requests)))
+        print(json.dumps(measure("token", lambda: Users.verify_token(token), args.requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Peak RSS of /view-affirmations for a large SQLite store.
+
+Each mode runs in a fresh subprocess so `ru_maxrss` reflects only that mode:
+
+    python -m benchmarks.bench_view_affirmations --count 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    "full": "/view-affirmations",
+    "paged": "/view-affirmations?limit=1000",
+    "ndjson": "/view-affirmations?stream=ndjson",
+    "json": "/view-affirmations?stream=json",
+}
+
+
+def populate(path: str, count: int) -> None:
+    from models.affirmation_store import SQLiteAffirmationStore
+
+    store = SQLiteAffirmationStore(path, batch_size=50000)
+    store.add_many(f"You are doing great, reminder number {i}." for i in range(count))
+    store.close()
+
+
+def run_mode(mode: str) -> dict:
+    from app import app
+
+    client = app.test_client()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    body_bytes = 0
+    pages = 0
+    url = MODES[mode]
+    while url:
+        response = client.get(url, buffered=False)
+        last_chunks = []
+        for chunk in response.iter_encoded():
+            body_bytes += len(chunk)
+            if mode == "paged":
+                last_chunks.append(chunk)
+        pages += 1
+        url = None
+        if mode == "paged":
+            cursor = json.loads(b"".join(last_chunks))["next_cursor"]
+            if cursor is not None:
+                url = f"{MODES['paged']}&after={cursor}"
+        response.close()
+    return {
+        "mode": mode,
+        "requests": pages,
+        "seconds": round(time.perf_counter() - start, 3),
+        "baseline_rss_kb": baseline,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "body_bytes": body_bytes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(MODES))
+    parser.add_argument("--run-mode", choices=sorted(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "affirmations.db")
+        populate(path, args.count)
+        env = dict(os.environ, DB_PATH=path)
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_view_affirmations", "--run-mode", mode],
+                env=env, check=True, capture_output=True, text=True).stdout
+            print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Local stand-in for affirmations.dev with configurable latency and failure rate.
+
+    python -m benchmarks.fake_upstream --port 8081 --latency-ms 50 --jitter-ms 20 --failure-rate 0.05
+
+Point the app at it with AFFIRMATIONS_URL=http://127.0.0.1:8081/. Every GET
+answers {"affirmation": ...} after the configured delay, drawn from a pool of
+--distinct phrases, or a 503 with probability --failure-rate.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Accept bursts of thousands of connections without refusing any
+    request_queue_size = 4096
+
+
+class FakeUpstream:
+    """
+    Threaded HTTP server answering like affirmations.dev, for offline benchmarks.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, distinct: int = 1000):
+        """
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind, 0 for any free port.
+            latency (float): Seconds every response is delayed by.
+            jitter (float): Extra delay in seconds, drawn uniformly from [0, jitter].
+            failure_rate (float): Fraction of requests answered with a 503.
+            distinct (int): Number of distinct affirmations served.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.affirmations = [f"You are doing great, reminder #{i}." for i in range(distinct)]
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                time.sleep(upstream.latency + random.uniform(0, upstream.jitter))
+                failed = random.random() < upstream.failure_rate
+                with upstream._lock:
+                    upstream.requests += 1
+                    upstream.failures += failed
+                if failed:
+                    status, body = 503, b'{"error": "unavailable"}'
+                else:
+                    status, body = 200, json.dumps({"affirmation": random.choice(upstream.affirmations)}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeUpstream":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--distinct", type=int, default=1000)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000,
+                            args.failure_rate, args.distinct)
+    print(f"Serving fake affirmations on {upstream.url}", flush=True)
+    try:
+        upstream._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
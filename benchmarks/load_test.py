@@ -0,0 +1,277 @@
+"""
+Load generator that drives every route of the app and reports throughput and latency percentiles.
+
+    python -m benchmarks.load_test --duration 30 --concurrency 16 --output results/baseline.json
+    python -m benchmarks.load_test --duration 30 --concurrency 16 --compare results/baseline.json
+
+By default it runs entirely offline: it starts benchmarks.fake_upstream with
+--upstream-latency-ms / --upstream-failure-rate, points the app at it through
+AFFIRMATIONS_URL and serves the app in-process on a temporary SQLite database.
+Pass --target to load an app that is already running (e.g. under gunicorn,
+started with AFFIRMATIONS_URL pointing at `python -m benchmarks.fake_upstream`).
+
+Each worker thread creates its own user and logs in, then picks routes at random
+according to --mix (route=weight pairs). Results are printed and, with --output,
+saved as JSON; --compare prints the change against a previously saved run.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks.fake_upstream import FakeUpstream
+
+
+DEFAULT_MIX = ("fetch-affirmation=28,fetch-affirmations=2,view-affirmations=15,search-affirmations=5,affirmation-count=15,random-affirmation=15,"
+               "health=5,login=5,metrics=2,update-password=2,create-user=2,create-users=1,"
+               "clear-affirmations=1,logout=1")
+
+
+class Worker:
+    """
+    One simulated client with its own user, session and access token.
+    """
+
+    password = "password123"
+
+    def __init__(self, base_url: str, name: str):
+        self.base_url = base_url.rstrip("/")
+        self.username = name
+        self.session = requests.Session()
+        self._created = 0
+        self._refresh_token = False
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def setup(self) -> None:
+        self.session.post(self.url("/api/create-user"), json={"username": self.username, "password": self.password})
+        self.login()
+
+    def login(self) -> requests.Response:
+        response = self.session.post(self.url("/api/login"),
+                                     json={"username": self.username, "password": self.password})
+        if response.ok:
+            self.session.headers["Authorization"] = f"Bearer {response.json()['token']}"
+        return response
+
+    def _new_username(self) -> str:
+        self._created += 1
+        return f"{self.username}-new{self._created}"
+
+    def update_password(self) -> requests.Response:
+        response = self.session.put(self.url("/api/update-password"),
+                                    json={"username": self.username, "new_password": self.password})
+        # Changing the password revokes the token; get a fresh one outside the timed request
+        self._refresh_token = True
+        return response
+
+    ROUTES = {
+        "health": lambda w: w.session.get(w.url("/health")),
+        "metrics": lambda w: w.session.get(w.url("/metrics")),
+        "create-user": lambda w: w.session.post(
+            w.url("/api/create-user"), json={"username": w._new_username(), "password": w.password}),
+        "create-users": lambda w: w.session.post(
+            w.url("/api/create-users"),
+            json=[{"username": w._new_username(), "password": w.password} for _ in range(10)]),
+        "login": lambda w: w.login(),
+        "logout": lambda w: w.session.post(w.url("/api/logout")),
+        "update-password": lambda w: w.update_password(),
+        "fetch-affirmation": lambda w: w.session.get(w.url("/fetch-affirmation")),
+        "fetch-affirmations": lambda w: w.session.get(w.url("/fetch-affirmations"), params={"n": 10}),
+        "view-affirmations": lambda w: w.session.get(w.url("/view-affirmations"), params={"limit": 50}),
+        # Every fake upstream affirmation matches, so this is the costly common-word case
+        "search-affirmations": lambda w: w.session.get(
+            w.url("/search-affirmations"), params={"q": "doing great", "limit": 20}),
+        "clear-affirmations": lambda w: w.session.delete(w.url("/clear-affirmations")),
+        "affirmation-count": lambda w: w.session.get(w.url("/affirmation-count")),
+        "random-affirmation": lambda w: w.session.get(w.url("/random-affirmation")),
+    }
+
+    def run(self, route: str) -> tuple:
+        """
+        Issues one request and returns (route, latency in seconds, status or None on connection errors).
+        """
+        self._refresh_token = False
+        start = time.perf_counter()
+        try:
+            status = self.ROUTES[route](self).status_code
+        except requests.RequestException:
+            status = None
+        latency = time.perf_counter() - start
+        if self._refresh_token:
+            self.login()
+        return route, latency, status
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        route, _, weight = item.partition("=")
+        route = route.strip()
+        if route not in Worker.ROUTES:
+            raise SystemExit(f"Unknown route in --mix: {route} (known: {', '.join(sorted(Worker.ROUTES))})")
+        weights[route] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    by_route = {}
+    for route, latency, status in samples:
+        by_route.setdefault(route, []).append((latency, status))
+
+    summary = {}
+    for route, entries in [("all", [(latency, status) for _, latency, status in samples])] + sorted(by_route.items()):
+        latencies = sorted(latency for latency, _ in entries)
+        statuses = [status for _, status in entries]
+        summary[route] = {
+            "requests": len(entries),
+            "throughput_rps": round(len(entries) / elapsed, 1),
+            "errors": sum(status is None or status >= 500 for status in statuses),
+            "non_2xx": sum(status is None or not 200 <= status < 300 for status in statuses),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+        }
+    return summary
+
+
+def run_load(base_url: str, weights: dict, concurrency: int, duration: float, warmup: float) -> tuple:
+    routes, cum_weights = list(weights), []
+    total = 0.0
+    for route in routes:
+        total += weights[route]
+        cum_weights.append(total)
+
+    run_id = uuid.uuid4().hex[:8]
+    workers = [Worker(base_url, f"load-{run_id}-{i}") for i in range(concurrency)]
+    for worker in workers:
+        worker.setup()
+
+    samples, lock = [], threading.Lock()
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def loop(worker: Worker, seed: int) -> None:
+        rng = random.Random(seed)
+        local = []
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            sample = worker.run(rng.choices(routes, cum_weights=cum_weights)[0])
+            if now >= start_at:
+                local.append(sample)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=loop, args=(worker, i)) for i, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, duration
+
+
+def start_local_app(upstream_url: str, tmp: str) -> tuple:
+    """
+    Serves app.py in-process on a temporary database, calling the given upstream.
+    """
+    os.environ["AFFIRMATIONS_URL"] = upstream_url
+    os.environ["DB_PATH"] = os.path.join(tmp, "load_test.db")
+    os.environ.setdefault("SECRET_KEY", "load-test-secret-key")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    from werkzeug.serving import make_server
+
+    import app as app_module
+
+    flask_app = app_module.app
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-app", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def print_summary(summary: dict, baseline: dict = None) -> None:
+    columns = ("requests", "throughput_rps", "errors", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{'route':<20}" + "".join(f"{column:>16}" for column in columns))
+    for route, stats in summary.items():
+        row = f"{route:<20}"
+        for column in columns:
+            cell = f"{stats[column]:g}"
+            previous = (baseline or {}).get(route, {}).get(column)
+            if previous:
+                cell += f" ({(stats[column] - previous) / previous * 100:+.0f}%)"
+            row += f"{cell:>16}"
+        print(row)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="Base URL of a running app; starts one in-process if omitted")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of load before measuring")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--upstream-failure-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    upstream = server = None
+    with tempfile.TemporaryDirectory() as tmp:
+        base_url = args.target
+        if base_url is None:
+            upstream = FakeUpstream(latency=args.upstream_latency_ms / 1000, jitter=args.upstream_jitter_ms / 1000,
+                                    failure_rate=args.upstream_failure_rate).start()
+            server, base_url = start_local_app(upstream.url, tmp)
+        try:
+            samples, elapsed = run_load(base_url, weights, args.concurrency, args.duration, args.warmup)
+        finally:
+            if server is not None:
+                server.shutdown()
+            if upstream is not None:
+                upstream.stop()
+
+    result = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "upstream": {"requests": upstream.requests, "failures": upstream.failures} if upstream else None,
+        "results": summarize(samples, elapsed),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_summary(result["results"], baseline)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,221 @@
+import logging
+import os
+import threading
+import time
+
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from utils.logger import configure_logger
+from utils.metrics import DB_POOL_CHECKOUTS, DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+db = SQLAlchemy()
+
+# Engine settings read from app.config, then the environment, then these defaults
+DB_SETTINGS = {
+    'DB_POOL_SIZE': 8,                       # connections kept open per worker process
+    'DB_MAX_OVERFLOW': 8,                    # extra connections opened under bursts, closed when returned
+    'DB_POOL_TIMEOUT': 10.0,                 # seconds a request waits for a free connection
+    'DB_POOL_RECYCLE': 3600,                 # seconds before a pooled connection is replaced
+    'DB_POOL_PRE_PING': True,                # test connections on checkout
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,          # how long a writer waits for the write lock
+    'SQLITE_SYNCHRONOUS': 'NORMAL',          # with WAL, fsync on checkpoints only; durable across app crashes
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,   # bytes of the file read through mmap
+    'SQLITE_CACHE_SIZE_KB': 16 * 1024,       # page cache per connection
+}
+
+
+def _setting(app: Flask, key: str):
+    default = DB_SETTINGS[key]
+    value = app.config.get(key, os.getenv(key))
+    if value is None or value == '':
+        return default
+    if isinstance(default, bool):
+        return value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'yes')
+    return type(default)(value)
+
+
+def database_uri(db_path: str) -> str:
+    """
+    Builds the SQLAlchemy URI for DB_PATH.
+
+    Args:
+        db_path (str): A SQLite file path, or a full SQLAlchemy URI. Relative paths are
+            resolved against the working directory, like the affirmation store does.
+
+    Returns:
+        str: The URI; an in-memory SQLite database if `db_path` is empty.
+    """
+    if not db_path:
+        return 'sqlite:///:memory:'
+    if '://' in db_path:
+        return db_path
+    return f"sqlite:///{os.path.abspath(db_path)}"
+
+
+def sqlite_path(db_path: str) -> str:
+    """
+    Returns the SQLite file DB_PATH refers to, for code that opens it with sqlite3 directly.
+
+    Args:
+        db_path (str): A SQLite file path, or a full SQLAlchemy URI.
+
+    Returns:
+        str: The database file path, or ":memory:".
+
+    Raises:
+        ValueError: If DB_PATH is a URI for a database other than SQLite.
+    """
+    url = make_url(database_uri(db_path))
+    if url.get_backend_name() != 'sqlite':
+        raise ValueError(f"DB_PATH must be a SQLite database, not {url.get_backend_name()!r}")
+    return url.database or ':memory:'
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how often connections are checked out and how long callers wait.
+
+    Waits include opening a new connection when the pool has room for one, and the
+    pre-ping if enabled. Counts are kept on the pool for `pool_stats` and in the
+    process-wide metrics.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_WAIT.observe(waited)
+        return connection
+
+
+def engine_options(app: Flask, uri: str) -> dict:
+    """
+    Returns the `SQLALCHEMY_ENGINE_OPTIONS` for a database URI.
+
+    Pool sizing only applies to databases served through a queue pool; an in-memory
+    SQLite database keeps Flask-SQLAlchemy's single shared connection.
+
+    Args:
+        app (Flask): The app whose config holds the DB_* settings.
+        uri (str): The database URI.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': _setting(app, 'DB_POOL_SIZE'),
+        'max_overflow': _setting(app, 'DB_MAX_OVERFLOW'),
+        'pool_timeout': _setting(app, 'DB_POOL_TIMEOUT'),
+        'pool_recycle': _setting(app, 'DB_POOL_RECYCLE'),
+        'pool_pre_ping': _setting(app, 'DB_POOL_PRE_PING'),
+    }
+
+
+def sqlite_pragmas(app: Flask, in_memory: bool = False) -> list:
+    """
+    Returns the PRAGMA statements run on every new SQLite connection.
+
+    WAL lets readers proceed while one writer commits, and `synchronous=NORMAL` drops the
+    fsync per commit, which WAL makes safe against application crashes. In-memory
+    databases have no journal file, so they skip WAL and mmap.
+    """
+    pragmas = [
+        f"PRAGMA busy_timeout = {_setting(app, 'SQLITE_BUSY_TIMEOUT_MS')}",
+        f"PRAGMA synchronous = {_setting(app, 'SQLITE_SYNCHRONOUS')}",
+        f"PRAGMA cache_size = -{_setting(app, 'SQLITE_CACHE_SIZE_KB')}",
+    ]
+    if not in_memory:
+        pragmas = ["PRAGMA journal_mode = WAL",
+                   f"PRAGMA mmap_size = {_setting(app, 'SQLITE_MMAP_SIZE')}"] + pragmas
+    return pragmas
+
+
+def _listen_for_pragmas(engine: Engine, pragmas: list) -> None:
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def init_db(app: Flask) -> None:
+    """
+    Configures the SQLAlchemy engine and binds `db` to the app.
+
+    SQLALCHEMY_DATABASE_URI defaults to the URI for DB_PATH. Pool sizing and
+    pre-ping come from the DB_POOL_* settings and SQLite connections get the
+    SQLITE_* pragmas; explicit SQLALCHEMY_ENGINE_OPTIONS take precedence. See
+    DB_SETTINGS for the defaults.
+
+    Args:
+        app (Flask): The app to bind.
+    """
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or database_uri(app.config.get('DB_PATH'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    options = engine_options(app, uri)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    db.init_app(app)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                database = engine.url.database
+                _listen_for_pragmas(engine, sqlite_pragmas(app, in_memory=database in (None, '', ':memory:')))
+    logger.info("Database engine configured for %s", make_url(uri).render_as_string(hide_password=True))
+
+
+def pool_stats() -> dict:
+    """
+    Returns connection pool statistics for each engine of the current app.
 
-db = SQLAlchemy()
\ No newline at end of file
+    Returns:
+        dict: Per bind key (None for the default engine): pool size, connections checked
+            in, checked out and in overflow, plus checkouts, timeouts and wait times when
+            the pool is instrumented.
+    """
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        entry = {'pool': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(),
+                         overflow=pool.overflow())
+        if isinstance(pool, InstrumentedQueuePool):
+            entry.update(checkouts=pool.checkouts, timeouts=pool.timeouts,
+                         mean_wait_ms=round(pool.wait_seconds / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+                         max_wait_ms=round(pool.max_wait_seconds * 1000, 3))
+        stats[key] = entry
+    return stats
@@ -0,0 +1,66 @@
+"""
+Gunicorn settings for serving the app in production.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each setting can be overridden through the environment variable named next to it.
+Worker processes default to 2 x cores + 1, each with GUNICORN_THREADS threads, so
+throughput scales with the cores available to the container. With preload (the
+default) the app is built once in the master and forked into the workers; every
+worker then opens its own database connections, upstream pools and background
+threads in `post_fork`.
+
+`kill -HUP <master>` starts new workers and lets the old ones finish their requests
+for up to graceful_timeout seconds. Code changes need a restart (or `kill -USR2`)
+while preload is on, since workers are forked from the already loaded app.
+"""
+import os
+
+
+def _cores() -> int:
+    # Cores this process may run on, which respects container CPU sets
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('GUNICORN_WORKERS') or 2 * _cores() + 1)
+# Upstream calls block on the network, so each worker serves several requests at once on threads
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Pending connections the kernel queues while every worker thread is busy
+backlog = int(os.getenv('GUNICORN_BACKLOG', '2048'))
+# Seconds an idle keep-alive connection stays open, so clients skip a TCP handshake per request
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+# Recycle workers now and then, staggered so they do not all restart at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '1000'))
+
+# Worker heartbeats on tmpfs rather than a possibly slow container filesystem
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = None  # the app writes its own sampled access log
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def when_ready(server):
+    # The preloaded app in the master never serves requests; stop its prefetch threads before forking
+    if server.cfg.preload_app:
+        from app import affirmation_model
+        if affirmation_model.prefetcher is not None:
+            affirmation_model.prefetcher.stop()
+
+
+def post_fork(server, worker):
+    # Without preload each worker imports the app itself, after this hook, and has nothing inherited
+    if server.cfg.preload_app:
+        from app import app, init_worker
+        init_worker(app)
@@ -0,0 +1,1626 @@
+import bisect
+import fcntl
+import heapq
+import logging
+import math
+import mmap
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import uuid
+import zlib
+from array import array
+from collections.abc import Sequence
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+# Connections opened before a fork, kept referenced so they are never closed in the child
+_inherited_connections = []
+
+# Words are runs of letters and digits, matched case-insensitively, as FTS5's unicode61 tokenizer does
+_WORD = re.compile(r"[^\W_]+")
+_QUERY_TERM = re.compile(r"([^\W_]+)(\*?)")
+
+# BM25 parameters, the same as FTS5's bm25()
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+# Layout of MappedAffirmationStore's files. The data file starts with a one-page header:
+# magic, layout version, dirty flag, commit sequence, then the committed fields
+_MAPPED_MAGIC = b"AFFLOG01"
+_MAPPED_LAYOUT = 1
+_MAPPED_HEADER = struct.Struct("<8sII")
+_MAPPED_DIRTY_AT = 12
+_MAPPED_SEQUENCE_AT = 16
+_MAPPED_FIELDS_AT = 24
+# first live record, records appended, end of the last record, version, hash slots, hash slots used
+_MAPPED_FIELDS = struct.Struct("<QQQQQQ")
+_MAPPED_DATA_START = 4096
+_MAPPED_HASH_MIN = 1024
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+# Every record is its UTF-8 length and a CRC32 over length and text, followed by the text
+_MAPPED_RECORD = struct.Struct("<II")
+# One .idx entry per record: its offset in the data file and its hit count
+_MAPPED_ENTRY = struct.Struct("<QI4x")
+
+
+def search_terms(query: str) -> List[Tuple[str, bool]]:
+    """
+    Splits a search query into its terms.
+
+    Every word of the query must appear in a match. A word ending in `*` matches any
+    word starting with it; all other punctuation is ignored.
+
+    Args:
+        query (str): The query as entered by the caller.
+
+    Returns:
+        list: (word, is_prefix) pairs, lowercased, in query order.
+    """
+    return [(word, star == "*") for word, star in _QUERY_TERM.findall(query.lower())]
+
+
+def _index_words(segment, position: int, affirmation: str) -> None:
+    """
+    Adds an affirmation at `position` to a segment's inverted index.
+    """
+    words = _WORD.findall(affirmation.lower())
+    segment.lengths.append(min(len(words), 0xFFFF))
+    segment.total_length += len(words)
+    for word in words:
+        postings = segment.postings.get(word)
+        if postings is None:
+            segment.postings[word] = segment.new_postings(position)
+            segment.vocabulary = None
+        else:
+            postings.append(position)
+
+
+def _rank(segment, terms: List[Tuple[str, bool]], after: Optional[int], limit: int,
+          lock: threading.Lock) -> Tuple[List[str], Optional[int]]:
+    """
+    Ranks the affirmations of an indexed segment against parsed query terms with BM25.
+
+    `lock` guards the segment's vocabulary, which prefix terms build on demand.
+    """
+    # Writers may append while we read; only consider affirmations that were complete at this point
+    total = len(segment.lengths)
+    if not total:
+        return [], None
+
+    term_postings = [_term_postings(segment, word, is_prefix, lock) for word, is_prefix in terms]
+    term_postings.sort(key=lambda lists: sum(len(postings) for postings in lists))
+    average_length = segment.total_length / total or 1.0
+
+    def term_score(frequency, matches, position):
+        idf = math.log(1 + (total - matches + 0.5) / (matches + 0.5))
+        norm = 1 - _BM25_B + _BM25_B * segment.lengths[position] / average_length
+        return idf * frequency * (_BM25_K1 + 1) / (frequency + _BM25_K1 * norm)
+
+    rarest, others = term_postings[0], term_postings[1:]
+    frequencies = {}
+    for postings in rarest:
+        for position in postings:
+            if position < total:
+                frequencies[position] = frequencies.get(position, 0) + 1
+    matches = len(frequencies)
+    scores = {position: term_score(frequency, matches, position) for position, frequency in frequencies.items()}
+
+    for lists in others:
+        frequencies = {}
+        for position in scores:
+            frequency = 0
+            for postings in lists:
+                start = bisect.bisect_left(postings, position)
+                frequency += bisect.bisect_right(postings, position, start) - start
+            if frequency:
+                frequencies[position] = frequency
+        # Documents matching this word, estimated from occurrences since only candidates were counted
+        matches = min(total, sum(len(postings) for postings in lists))
+        scores = {position: scores[position] + term_score(frequency, matches, position)
+                  for position, frequency in frequencies.items()}
+
+    start = 0 if after is None else after + 1
+    ranked = heapq.nsmallest(start + limit + 1, scores.items(), key=lambda item: (-item[1], item[0]))
+    affirmations = [segment.affirmations[position] for position, _ in ranked[start:start + limit]]
+    return affirmations, (start + limit - 1 if len(ranked) > start + limit else None)
+
+
+def _term_postings(segment, word: str, is_prefix: bool, lock: threading.Lock) -> list:
+    """
+    Returns the posting lists of a query word, one per indexed word it matches.
+    """
+    if not is_prefix:
+        postings = segment.postings.get(word)
+        return [postings] if postings is not None else []
+    vocabulary = segment.vocabulary
+    if vocabulary is None:
+        with lock:
+            if segment.vocabulary is None:
+                segment.vocabulary = sorted(segment.postings)
+            vocabulary = segment.vocabulary
+    lists = []
+    for i in range(bisect.bisect_left(vocabulary, word), len(vocabulary)):
+        if not vocabulary[i].startswith(word):
+            break
+        lists.append(segment.postings[vocabulary[i]])
+    return lists
+
+
+class _Segment:
+    """
+    One generation of the in-memory store, replaced wholesale by `clear`.
+
+    `postings` maps every word to the positions of the affirmations containing it, in
+    ascending order and once per occurrence. `vocabulary` is the sorted list of words
+    used for prefix queries, rebuilt on demand after new words arrive.
+    """
+
+    __slots__ = ("affirmations", "hits", "postings", "lengths", "total_length", "vocabulary")
+
+    def __init__(self):
+        self.affirmations = []
+        self.hits = {}
+        self.postings = {}
+        self.lengths = []
+        self.total_length = 0
+        self.vocabulary = []
+
+    def new_postings(self, position: int) -> list:
+        return [position]
+
+
+class _Arena(Sequence):
+    """
+    UTF-8 texts packed back to back into byte chunks, addressed through offset tables.
+
+    Chunks are allocated at full size and filled in place, never resized, so readers can
+    hold memoryviews into them while a writer appends. A text lives in one chunk; one
+    longer than CHUNK_SIZE gets a chunk of its own. Indexing decodes a text straight from
+    a memoryview, so the only object created per read is the returned `str`.
+    """
+
+    CHUNK_SIZE = 1 << 20
+
+    __slots__ = ("_chunks", "_fill", "_starts", "_sizes")
+
+    def __init__(self):
+        # A writable memoryview over each chunk, which keeps the chunk alive
+        self._chunks = []
+        self._fill = 0
+        # Chunk number in the high 32 bits, offset within the chunk in the low 32
+        self._starts = array("Q")
+        self._sizes = array("I")
+
+    def __len__(self) -> int:
+        # Sizes are appended last, so a text is only counted once it is complete
+        return len(self._sizes)
+
+    def append(self, data: bytes) -> None:
+        size = len(data)
+        if not self._chunks or self._fill + size > len(self._chunks[-1]):
+            self._chunks.append(memoryview(bytearray(max(self.CHUNK_SIZE, size))))
+            self._fill = 0
+        self._chunks[-1][self._fill:self._fill + size] = data
+        self._starts.append((len(self._chunks) - 1) << 32 | self._fill)
+        self._sizes.append(size)
+        self._fill += size
+
+    def view(self, index: int) -> memoryview:
+        """
+        Returns the UTF-8 bytes of one text without copying them.
+        """
+        start = self._starts[index]
+        offset = start & 0xFFFFFFFF
+        return self._chunks[start >> 32][offset:offset + self._sizes[index]]
+
+    def views(self, start: int, stop: int) -> Iterator[memoryview]:
+        """
+        Yields the UTF-8 bytes of the texts in `[start, stop)` without copying them.
+        """
+        chunks, starts, sizes = self._chunks, self._starts, self._sizes
+        for index in range(start, min(stop, len(sizes))):
+            location = starts[index]
+            offset = location & 0xFFFFFFFF
+            yield chunks[location >> 32][offset:offset + sizes[index]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return [str(view, "utf-8") for view in self.views(start, stop)]
+            return [str(self.view(i), "utf-8") for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("affirmation index out of range")
+        return str(self.view(index), "utf-8")
+
+    def nbytes(self) -> int:
+        return (sum(len(chunk) for chunk in self._chunks) + self._starts.itemsize * len(self._starts)
+                + self._sizes.itemsize * len(self._sizes))
+
+
+class _CompactSegment:
+    """
+    One generation of the compact store.
+
+    `slots` is an open-addressing hash table over the arena: each slot holds the index
+    of a stored text plus one, or 0 if empty, and duplicates are found by comparing the
+    candidate's bytes in place. Hit counts, document lengths and posting lists are
+    typed arrays rather than lists of ints.
+    """
+
+    __slots__ = ("affirmations", "hit_counts", "slots", "postings", "lengths", "total_length", "vocabulary")
+
+    def __init__(self):
+        self.affirmations = _Arena()
+        self.hit_counts = array("I")
+        self.slots = array("I", bytes(4 * 16))
+        self.postings = {}
+        # Word counts only weigh the BM25 length norm, so clamping them to 16 bits is harmless
+        self.lengths = array("H")
+        self.total_length = 0
+        self.vocabulary = []
+
+    def new_postings(self, position: int) -> array:
+        return array("I", (position,))
+
+
+class InMemoryAffirmationStore:
+    """
+    Keeps affirmations in a Python list owned by the current process.
+
+    Each distinct affirmation is stored once. A dict of hit counts doubles as the
+    dedup index, so a repeat is detected with one hash lookup and only bumps its count.
+
+    Every stored affirmation is also added to an inverted index of its words, which
+    `search` ranks with BM25, so a query only visits the affirmations containing its
+    words.
+
+    Writers serialize on a lock, readers take none. Within a segment the list is only
+    ever appended to, and `clear` swaps in a new segment instead of emptying the old
+    one, so a reader that grabs the current segment and copies the prefix it sees gets
+    a snapshot that no later write can change.
+
+    `version()` increases whenever the stored list changes. Versions are only comparable
+    between stores with the same `version_scope`, which is unique to this store and
+    process, since another process keeps its own copy.
+    """
+
+    # Segment type created on every clear
+    SEGMENT = _Segment
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._segment = self.SEGMENT()
+        self._version = 0
+        self.version_scope = uuid.uuid4().hex[:12]
+
+    def scoped(self, user_id: int) -> "InMemoryAffirmationStore":
+        """
+        Returns a new, empty store for one user's collection.
+
+        Args:
+            user_id (int): The `Users.id` owning the collection.
+        """
+        return InMemoryAffirmationStore()
+
+    def add(self, affirmation: str) -> None:
+        """
+        Stores a single affirmation, or counts another hit if it is already stored.
+
+        Args:
+            affirmation (str): The affirmation to store.
+        """
+        with self._lock:
+            self._add_locked(affirmation)
+
+    def add_many(self, affirmations: Iterable[str]) -> None:
+        """
+        Stores several affirmations at once.
+
+        Args:
+            affirmations (iterable): The affirmations to store, in order.
+        """
+        with self._lock:
+            for affirmation in affirmations:
+                self._add_locked(affirmation)
+
+    def _add_locked(self, affirmation: str) -> None:
+        segment = self._segment
+        if affirmation in segment.hits:
+            segment.hits[affirmation] += 1
+        else:
+            segment.hits[affirmation] = 1
+            segment.affirmations.append(affirmation)
+            _index_words(segment, len(segment.affirmations) - 1, affirmation)
+            self._version += 1
+
+    def version(self) -> int:
+        """
+        Returns a number that increases whenever an affirmation is added or the store is cleared.
+
+        Repeats only count hits and leave the version unchanged.
+        """
+        return self._version
+
+    def hits(self, affirmation: str) -> int:
+        """
+        Returns how many times an affirmation has been stored since the last clear.
+
+        Args:
+            affirmation (str): The affirmation to look up.
+
+        Returns:
+            int: The hit count, or 0 if the affirmation is not stored.
+        """
+        return self._segment.hits.get(affirmation, 0)
+
+    def get_all(self) -> List[str]:
+        """
+        Returns a snapshot of all stored affirmations in insertion order.
+        """
+        return list(self._segment.affirmations)
+
+    def count(self) -> int:
+        """
+        Returns the number of stored affirmations.
+        """
+        return len(self._segment.affirmations)
+
+    def page(self, after: Optional[int] = None, limit: int = 50) -> Tuple[List[str], Optional[int]]:
+        """
+        Returns the affirmations stored after a cursor.
+
+        Args:
+            after (int): Cursor returned by the previous page, or `None` for the first page.
+            limit (int): Maximum number of affirmations to return.
+
+        Returns:
+            tuple: The affirmations and the cursor for the next page, which is `None` on the last page.
+        """
+        affirmations = self._segment.affirmations
+        start = 0 if after is None else after + 1
+        end = start + limit
+        return affirmations[start:end], (end - 1 if len(affirmations) > end else None)
+
+    def search(self, query: str, after: Optional[int] = None, limit: int = 20) -> Tuple[List[str], Optional[int]]:
+        """
+        Returns the affirmations containing every word of a query, best match first.
+
+        Matches are ranked by BM25, ties in insertion order. Candidates come from the
+        posting list of the rarest word; the other words are counted in each candidate by
+        binary search of their own posting lists, so the cost follows the number of
+        affirmations matching the rarest word rather than the size of the store.
+
+        Args:
+            query (str): Words to look for; see `search_terms`.
+            after (int): Cursor returned by the previous page, or `None` for the first page.
+            limit (int): Maximum number of affirmations to return.
+
+        Returns:
+            tuple: The affirmations and the cursor for the next page, which is `None` on the last page.
+
+        Raises:
+            ValueError: If the query contains no words.
+        """
+        terms = search_terms(query)
+        if not terms:
+            raise ValueError("The search query must contain at least one word")
+        return _rank(self._segment, terms, after, limit, self._lock)
+
+    def sample(self, k: int = 1) -> List[str]:
+        """
+        Picks up to `k` distinct stored affirmations at random.
+
+        Args:
+            k (int): Number of affirmations to pick.
+
+        Returns:
+            list: `min(k, count)` affirmations drawn without replacement.
+        """
+        affirmations = self._segment.affirmations
+        return random.sample(affirmations, min(k, len(affirmations)))
+
+    def clear(self) -> None:
+        """
+        Removes all stored affirmations.
+        """
+        with self._lock:
+            self._segment = self.SEGMENT()
+            self._version += 1
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def after_fork(self) -> None:
+        """
+        Replaces the lock, which a thread of the parent process may have held at fork time,
+        and starts a new version scope since the copies in parent and child now diverge.
+        """
+        self._lock = threading.Lock()
+        self.version_scope = uuid.uuid4().hex[:12]
+
+
+class CompactAffirmationStore(InMemoryAffirmationStore):
+    """
+    An in-memory store that keeps affirmations as packed UTF-8 rather than `str` objects.
+
+    Texts are appended to a chunked byte arena with `array` offset tables, and the dedup
+    index, hit counts and search postings are typed arrays as well. A stored affirmation
+    then costs its encoded length plus a few dozen bytes, instead of a `str` object, a list
+    slot and a dict entry each, which is what dominates a worker's memory at millions of
+    entries. Reads decode on demand, so pages and samples cost a `str` per returned
+    affirmation, and `views` hands out the raw bytes of a page without copying.
+
+    Behaves exactly like InMemoryAffirmationStore otherwise, including the locking and
+    snapshot rules and the search index.
+    """
+
+    SEGMENT = _CompactSegment
+
+    def scoped(self, user_id: int) -> "CompactAffirmationStore":
+        """
+        Returns a new, empty compact store for one user's collection.
+
+        Args:
+            user_id (int): The `Users.id` owning the collection.
+        """
+        return CompactAffirmationStore()
+
+    @staticmethod
+    def _find(segment: _CompactSegment, data: bytes) -> Tuple[int, int]:
+        """
+        Returns the slot holding `data`, or the empty slot where it belongs, and the
+        index of the stored text (-1 if not stored).
+        """
+        slots = segment.slots
+        arena = segment.affirmations
+        mask = len(slots) - 1
+        slot = hash(data) & mask
+        while True:
+            entry = slots[slot]
+            if not entry:
+                return slot, -1
+            if arena.view(entry - 1) == data:
+                return slot, entry - 1
+            slot = (slot + 1) & mask
+
+    @staticmethod
+    def _grow_locked(segment: _CompactSegment) -> None:
+        # Double the table once it is two thirds full; the old table stays valid for readers until swapped
+        slots = array("I", bytes(8 * len(segment.slots)))
+        mask = len(slots) - 1
+        for index in range(len(segment.affirmations)):
+            slot = hash(segment.affirmations.view(index).tobytes()) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = index + 1
+        segment.slots = slots
+
+    def _add_locked(self, affirmation: str) -> None:
+        segment = self._segment
+        data = affirmation.encode()
+        slot, index = self._find(segment, data)
+        if index >= 0:
+            segment.hit_counts[index] += 1
+            return
+        position = len(segment.affirmations)
+        segment.hit_counts.append(1)
+        segment.affirmations.append(data)
+        segment.slots[slot] = position + 1
+        _index_words(segment, position, affirmation)
+        self._version += 1
+        if 3 * (position + 1) > 2 * len(segment.slots):
+            self._grow_locked(segment)
+
+    def hits(self, affirmation: str) -> int:
+        """
+        Returns how many times an affirmation has been stored since the last clear.
+
+        Args:
+            affirmation (str): The affirmation to look up.
+
+        Returns:
+            int: The hit count, or 0 if the affirmation is not stored.
+        """
+        segment = self._segment
+        _, index = self._find(segment, affirmation.encode())
+        return segment.hit_counts[index] if index >= 0 else 0
+
+    def views(self, after: Optional[int] = None, limit: int = 50) -> Tuple[List[memoryview], Optional[int]]:
+        """
+        Returns a page like `page`, as memoryviews of the stored UTF-8 bytes.
+
+        The views point into the store's buffers and stay valid after a `clear`.
+
+        Args:
+            after (int): Cursor returned by the previous page, or `None` for the first page.
+            limit (int): Maximum number of affirmations to return.
+
+        Returns:
+            tuple: The views and the cursor for the next page, which is `None` on the last page.
+        """
+        arena = self._segment.affirmations
+        start = 0 if after is None else after + 1
+        end = start + limit
+        return list(arena.views(start, end)), (end - 1 if len(arena) > end else None)
+
+    def nbytes(self) -> int:
+        """
+        Returns the bytes held by the arena, offset tables, dedup table and hit counts,
+        leaving out the search index.
+        """
+        segment = self._segment
+        return (segment.affirmations.nbytes() + segment.slots.itemsize * len(segment.slots)
+                + segment.hit_counts.itemsize * len(segment.hit_counts))
+
+
+class _MappedRecords(Sequence):
+    """
+    The live records of a mapped store from `first` on, read from the shared mapping.
+    """
+
+    __slots__ = ("_store", "_first")
+
+    def __init__(self, store: "MappedAffirmationStore", first: int):
+        self._store = store
+        self._first = first
+
+    def __len__(self) -> int:
+        first, count = self._store._snapshot()[:2]
+        return count - self._first if first == self._first else 0
+
+    def __getitem__(self, index: int) -> str:
+        return self._store._read(self._first + index)
+
+
+class _MappedSearchIndex:
+    """
+    A worker's own inverted index over a mapped store, caught up with the shared file
+    before every search and started over when the store is cleared.
+    """
+
+    __slots__ = ("affirmations", "first", "postings", "lengths", "total_length", "vocabulary")
+
+    def __init__(self, store: "MappedAffirmationStore", first: int):
+        self.affirmations = _MappedRecords(store, first)
+        self.first = first
+        self.postings = {}
+        self.lengths = array("H")
+        self.total_length = 0
+        self.vocabulary = []
+
+    def new_postings(self, position: int) -> array:
+        return array("I", (position,))
+
+
+class MappedAffirmationStore:
+    """
+    Stores affirmations in an append-only file that every worker on the host maps read-only.
+
+    The data file holds a one-page header followed by records, each a length, a CRC32 and
+    the UTF-8 text. `<path>.idx` holds one fixed-size entry per record with its offset
+    and hit count, so any position is one lookup, and `<path>.hash` is an open-addressing
+    table of CRC32s over the records that finds duplicates. Readers go through read-only
+    mappings of the three files and take no lock, so counting and paging cost no system
+    call and no worker keeps a copy of the data.
+
+    Writers append with `pwrite` while holding an exclusive `flock` on the data file, then
+    publish the batch by rewriting the header's committed fields (first live record,
+    record count, end offset, version) between two bumps of a sequence number. A reader
+    retries while the sequence is odd or changed under it, so it always sees one committed
+    state, and never reads past that state's end. `clear` only moves the first live record
+    to the end; the space is not reused.
+
+    A writer marks the header dirty until its batch is published. The next writer to take
+    the lock after a crash, or any process opening the file, checks the records at the tail
+    against their CRCs and drops any that are torn, so a half-written append never shows.
+    With `durable`, data and index are fsynced before the header and the header after,
+    which also covers power loss; otherwise a committed batch survives process crashes.
+
+    Search uses a per-process index built from the mapping on first use and caught up
+    incrementally, since ranking needs postings that are not kept in the shared files.
+    """
+
+    # Versions come from the shared file, so they are comparable across processes
+    version_scope = "file"
+
+    # Each scoped store holds three descriptors and mappings, and reopening one is cheap,
+    # so AffirmationModel keeps only this many users' stores open
+    scoped_limit = 128
+
+    def __init__(self, path: str, durable: bool = False):
+        """
+        Opens (and if needed creates) the store's files.
+
+        Args:
+            path (str): Path of the data file; the index and hash table are kept next to it.
+            durable (bool): Whether to fsync every batch before it is published.
+        """
+        self.path = path
+        self.durable = durable
+        self._lock = threading.Lock()
+        self._search_lock = threading.Lock()
+        self._search = None
+        self._open()
+        logger.info("Mapped affirmation store opened at %s", path)
+
+    def _open(self) -> None:
+        self._fds = {name: os.open(self.path + suffix, os.O_RDWR | os.O_CREAT, 0o644)
+                     for name, suffix in (("data", ""), ("index", ".idx"), ("hash", ".hash"))}
+        self._maps = {}
+        with self._locked():
+            header = os.pread(self._fds["data"], _MAPPED_DATA_START, 0)
+            if not header.strip(b"\0"):
+                self._initialize_locked()
+            elif header[:len(_MAPPED_MAGIC)] != _MAPPED_MAGIC:
+                raise ValueError(f"{self.path} is not an affirmation store")
+            else:
+                self._recover_locked()
+
+    def _initialize_locked(self) -> None:
+        os.ftruncate(self._fds["hash"], _MAPPED_HASH_MIN * _U32.size)
+        os.ftruncate(self._fds["data"], _MAPPED_DATA_START)
+        os.pwrite(self._fds["data"], _MAPPED_HEADER.pack(_MAPPED_MAGIC, _MAPPED_LAYOUT, 0)
+                  + _U64.pack(0) + _MAPPED_FIELDS.pack(0, 0, _MAPPED_DATA_START, 0, _MAPPED_HASH_MIN, 0), 0)
+
+    def after_fork(self) -> None:
+        """
+        Reopens the files in a forked worker.
+
+        `flock` locks belong to the open file, which parent and child would otherwise
+        share, so their appends would not exclude each other.
+        """
+        self._lock = threading.Lock()
+        self._search_lock = threading.Lock()
+        for fd in self._fds.values():
+            os.close(fd)
+        self._open()
+
+    def scoped(self, user_id: int) -> "MappedAffirmationStore":
+        """
+        Returns the store for one user's collection, in files next to this store's.
+
+        Args:
+            user_id (int): The `Users.id` owning the collection.
+        """
+        return MappedAffirmationStore(f"{self.path}.user{user_id}", self.durable)
+
+    @contextmanager
+    def _locked(self, exclusive: bool = True):
+        """
+        Holds this process's lock and the file lock shared by all processes.
+        """
+        with self._lock:
+            fcntl.flock(self._fds["data"], fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fds["data"], fcntl.LOCK_UN)
+
+    def _map(self, name: str, end: int) -> mmap.mmap:
+        """
+        Returns a read-only mapping of one of the files covering at least `end` bytes.
+
+        Files only ever grow, so a mapping stays valid; it is replaced by a larger one when
+        the file has grown past it. Threads still reading the old one keep it alive.
+        """
+        mapped = self._maps.get(name)
+        if mapped is None or len(mapped) < end:
+            # An index that nothing was appended to yet is empty, and empty files cannot be mapped
+            if os.fstat(self._fds[name]).st_size == 0:
+                return b""
+            mapped = self._maps[name] = mmap.mmap(self._fds[name], 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def _snapshot(self) -> Tuple[int, int, int, int, int, int]:
+        """
+        Returns the last published header fields: first live record, record count, end
+        offset, version, hash slots and hash slots used.
+
+        A writer publishes between two system calls, so retries are rare. If the sequence
+        stays odd, the writer died while publishing; the fields are then read under the
+        file lock, which waits for any live writer.
+        """
+        data = self._map("data", _MAPPED_DATA_START)
+        for _ in range(1000):
+            sequence = _U64.unpack_from(data, _MAPPED_SEQUENCE_AT)[0]
+            if sequence & 1:
+                continue
+            fields = _MAPPED_FIELDS.unpack_from(data, _MAPPED_FIELDS_AT)
+            if _U64.unpack_from(data, _MAPPED_SEQUENCE_AT)[0] == sequence:
+                return fields
+        with self._locked(exclusive=False):
+            return self._fields_locked()
+
+    def _fields_locked(self) -> Tuple[int, int, int, int, int, int]:
+        # With the file lock held no writer is publishing, so the fields are read directly
+        return _MAPPED_FIELDS.unpack(os.pread(self._fds["data"], _MAPPED_FIELDS.size, _MAPPED_FIELDS_AT))
+
+    def _publish_locked(self, fields: list) -> None:
+        fd = self._fds["data"]
+        if self.durable:
+            os.fsync(self._fds["index"])
+            os.fsync(self._fds["hash"])
+            os.fsync(fd)
+        sequence = _U64.unpack(os.pread(fd, _U64.size, _MAPPED_SEQUENCE_AT))[0]
+        # Left odd by a writer that died while publishing
+        sequence += sequence & 1
+        os.pwrite(fd, _U64.pack(sequence + 1), _MAPPED_SEQUENCE_AT)
+        os.pwrite(fd, _MAPPED_FIELDS.pack(*fields), _MAPPED_FIELDS_AT)
+        os.pwrite(fd, _U64.pack(sequence + 2), _MAPPED_SEQUENCE_AT)
+        os.pwrite(fd, _U32.pack(0), _MAPPED_DIRTY_AT)
+        if self.durable:
+            os.fsync(fd)
+
+    def _entry(self, index: int) -> Tuple[int, int]:
+        return _MAPPED_ENTRY.unpack_from(self._map("index", (index + 1) * _MAPPED_ENTRY.size),
+                                         index * _MAPPED_ENTRY.size)
+
+    def _record(self, offset: int, end: int) -> Optional[Tuple[int, int]]:
+        """
+        Returns the (size, crc) of the record at `offset`, or None if it does not fit before `end`.
+        """
+        if not _MAPPED_DATA_START <= offset <= end - _MAPPED_RECORD.size:
+            return None
+        size, crc = _MAPPED_RECORD.unpack_from(self._map("data", end), offset)
+        if offset + _MAPPED_RECORD.size + size > end:
+            return None
+        return size, crc
+
+    def _read(self, index: int) -> str:
+        return self._read_range(index, index + 1, self._snapshot()[2])[0]
+
+    def _read_range(self, start: int, stop: int, end: int) -> List[str]:
+        """
+        Decodes the published records `[start, stop)`, given the published end offset.
+        """
+        if start >= stop:
+            return []
+        entries = self._map("index", stop * _MAPPED_ENTRY.size)
+        data = self._map("data", end)
+        affirmations = []
+        for index in range(start, stop):
+            offset = _U64.unpack_from(entries, index * _MAPPED_ENTRY.size)[0] + _MAPPED_RECORD.size
+            size = _U32.unpack_from(data, offset - _MAPPED_RECORD.size)[0]
+            affirmations.append(data[offset:offset + size].decode())
+        return affirmations
+
+    @staticmethod
+    def _checksum(data: bytes) -> int:
+        return zlib.crc32(data, zlib.crc32(_U32.pack(len(data))))
+
+    def _recover_locked(self) -> None:
+        """
+        Drops torn records from the tail, left behind by a writer that died or a machine
+        that lost power before its appends reached the disk, and rebuilds a missing hash table.
+        """
+        fd = self._fds["data"]
+        fields = list(self._fields_locked())
+        first, count, end = fields[0], fields[1], fields[2]
+        size = os.fstat(fd).st_size
+        valid = count
+        while valid > 0:
+            offset = _U64.unpack(os.pread(self._fds["index"], _U64.size, (valid - 1) * _MAPPED_ENTRY.size)
+                                 .ljust(_U64.size, b"\0"))[0]
+            record = self._record(offset, min(end, size))
+            if record is not None and self._checksum(os.pread(fd, record[0], offset + _MAPPED_RECORD.size)) == record[1]:
+                valid_end = offset + _MAPPED_RECORD.size + record[0]
+                break
+            valid -= 1
+        else:
+            valid_end = _MAPPED_DATA_START
+
+        dirty = _U32.unpack(os.pread(fd, _U32.size, _MAPPED_DIRTY_AT))[0]
+        sequence = _U64.unpack(os.pread(fd, _U64.size, _MAPPED_SEQUENCE_AT))[0]
+        hash_missing = os.fstat(self._fds["hash"]).st_size < fields[4] * _U32.size
+        if valid == count and not dirty and not sequence & 1 and not hash_missing:
+            return
+        if valid < count:
+            logger.warning("Dropped %d torn affirmation records from %s", count - valid, self.path)
+        # Hash slots of records that were never published point past the count and are skipped
+        fields[:4] = [min(first, valid), valid, valid_end, fields[3] + 1]
+        if hash_missing:
+            logger.warning("Rebuilding the hash table of %s", self.path)
+            self._rebuild_hash_locked(fields)
+        self._publish_locked(fields)
+
+    def _find_locked(self, fields: list, data: bytes, crc: int) -> Tuple[int, int]:
+        """
+        Returns the hash slot holding `data`, or the free slot where it belongs, and the
+        index of its live record (-1 if not stored).
+        """
+        first, count, end, _, capacity, _ = fields
+        slots = self._map("hash", capacity * _U32.size)
+        mask = capacity - 1
+        slot = crc & mask
+        while True:
+            entry = _U32.unpack_from(slots, slot * _U32.size)[0]
+            if not entry:
+                return slot, -1
+            index = entry - 1
+            if first <= index < count:
+                offset = self._entry(index)[0]
+                record = self._record(offset, end)
+                if record == (len(data), crc):
+                    start = offset + _MAPPED_RECORD.size
+                    if self._map("data", end)[start:start + len(data)] == data:
+                        return slot, index
+            slot = (slot + 1) & mask
+
+    def _reserve(self, name: str, end: int) -> None:
+        # Grow files geometrically, so readers seldom have to map them again
+        size = os.fstat(self._fds[name]).st_size
+        if end > size:
+            os.ftruncate(self._fds[name], max(end, 2 * size))
+
+    def _rebuild_hash_locked(self, fields: list) -> None:
+        first, count, end = fields[0], fields[1], fields[2]
+        capacity = _MAPPED_HASH_MIN
+        while capacity < 3 * (count - first + 1):
+            capacity *= 2
+        slots = array("I", bytes(_U32.size * capacity))
+        mask = capacity - 1
+        for index in range(first, count):
+            slot = self._record(self._entry(index)[0], end)[1] & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = index + 1
+        self._reserve("hash", capacity * _U32.size)
+        os.pwrite(self._fds["hash"], slots.tobytes(), 0)
+        fields[4], fields[5] = capacity, count - first
+
+    def add(self, affirmation: str) -> None:
+        """
+        Stores a single affirmation, or counts another hit if it is already stored.
+
+        Args:
+            affirmation (str): The affirmation to store.
+        """
+        self.add_many([affirmation])
+
+    def add_many(self, affirmations: Iterable[str]) -> None:
+        """
+        Appends several affirmations and publishes them to every process at once.
+
+        Args:
+            affirmations (iterable): The affirmations to store, in order.
+        """
+        encoded = [affirmation.encode() for affirmation in affirmations]
+        if not encoded:
+            return
+        with self._locked():
+            if _U32.unpack(os.pread(self._fds["data"], _U32.size, _MAPPED_DIRTY_AT))[0]:
+                self._recover_locked()
+            fields = list(self._fields_locked())
+            os.pwrite(self._fds["data"], _U32.pack(1), _MAPPED_DIRTY_AT)
+            for data in encoded:
+                self._append_locked(fields, data)
+            self._publish_locked(fields)
+
+    def _append_locked(self, fields: list, data: bytes) -> None:
+        crc = self._checksum(data)
+        slot, index = self._find_locked(fields, data, crc)
+        if index >= 0:
+            hits = self._entry(index)[1]
+            os.pwrite(self._fds["index"], _U32.pack(hits + 1), index * _MAPPED_ENTRY.size + _U64.size)
+            return
+        count, end = fields[1], fields[2]
+        record_end = end + _MAPPED_RECORD.size + len(data)
+        self._reserve("data", record_end)
+        os.pwrite(self._fds["data"], _MAPPED_RECORD.pack(len(data), crc) + data, end)
+        self._reserve("index", (count + 1) * _MAPPED_ENTRY.size)
+        os.pwrite(self._fds["index"], _MAPPED_ENTRY.pack(end, 1), count * _MAPPED_ENTRY.size)
+        os.pwrite(self._fds["hash"], _U32.pack(count + 1), slot * _U32.size)
+        fields[1], fields[2], fields[3], fields[5] = count + 1, record_end, fields[3] + 1, fields[5] + 1
+        if 3 * (fields[5] + 1) > 2 * fields[4]:
+            self._rebuild_hash_locked(fields)
+
+    def version(self) -> int:
+        """
+        Returns a number that increases whenever an affirmation is added or the store is cleared.
+        """
+        return self._snapshot()[3]
+
+    def hits(self, affirmation: str) -> int:
+        """
+        Returns how many times an affirmation has been stored since the last clear.
+
+        Args:
+            affirmation (str): The affirmation to look up.
+
+        Returns:
+            int: The hit count, or 0 if the affirmation is not stored.
+        """
+        data = affirmation.encode()
+        with self._locked(exclusive=False):
+            _, index = self._find_locked(list(self._fields_locked()), data, self._checksum(data))
+            return self._entry(index)[1] if index >= 0 else 0
+
+    def get_all(self) -> List[str]:
+        """
+        Returns all live affirmations in insertion order.
+        """
+        first, count, end = self._snapshot()[:3]
+        return self._read_range(first, count, end)
+
+    def count(self) -> int:
+        """
+        Returns the number of live affirmations from the shared header.
+        """
+        first, count = self._snapshot()[:2]
+        return count - first
+
+    def page(self, after: Optional[int] = None, limit: int = 50) -> Tuple[List[str], Optional[int]]:
+        """
+        Returns the live affirmations stored after a cursor.
+
+        Args:
+            after (int): Cursor returned by the previous page, or `None` for the first page.
+            limit (int): Maximum number of affirmations to return.
+
+        Returns:
+            tuple: The affirmations and the cursor for the next page, which is `None` on the last page.
+        """
+        first, count, published_end = self._snapshot()[:3]
+        start = 0 if after is None else after + 1
+        end = start + limit
+        affirmations = self._read_range(first + start, first + min(end, count - first), published_end)
+        return affirmations, (end - 1 if count - first > end else None)
+
+    def sample(self, k: int = 1) -> List[str]:
+        """
+        Picks up to `k` distinct live affirmations at random.
+
+        Args:
+            k (int): Number of affirmations to pick.
+
+        Returns:
+            list: `min(k, count)` affirmations drawn without replacement.
+        """
+        first, count, end = self._snapshot()[:3]
+        return [self._read_range(index, index + 1, end)[0]
+                for index in random.sample(range(first, count), min(k, count - first))]
+
+    def search(self, query: str, after: Optional[int] = None, limit: int = 20) -> Tuple[List[str], Optional[int]]:
+        """
+        Returns the live affirmations containing every word of a query, best match first.
+
+        Ranks like InMemoryAffirmationStore.search, over this process's index of the file.
+
+        Args:
+            query (str): Words to look for; see `search_terms`.
+            after (int): Cursor returned by the previous page, or `None` for the first page.
+            limit (int): Maximum number of affirmations to return.
+
+        Returns:
+            tuple: The affirmations and the cursor for the next page, which is `None` on the last page.
+
+        Raises:
+            ValueError: If the query contains no words.
+        """
+        terms = search_terms(query)
+        if not terms:
+            raise ValueError("The search query must contain at least one word")
+        first, count, end = self._snapshot()[:3]
+        with self._search_lock:
+            index = self._search
+            if index is None or index.first != first:
+                index = _MappedSearchIndex(self, first)
+            indexed = len(index.lengths)
+            for position, affirmation in enumerate(self._read_range(first + indexed, count, end), indexed):
+                _index_words(index, position, affirmation)
+            self._search = index
+        return _rank(index, terms, after, limit, self._search_lock)
+
+    def clear(self) -> None:
+        """
+        Removes all stored affirmations for every process.
+        """
+        with self._locked():
+            fields = list(self._fields_locked())
+            fields[0], fields[3] = fields[1], fields[3] + 1
+            self._publish_locked(fields)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        """
+        Unmaps and closes the store's files. Closing twice does nothing.
+        """
+        maps, fds = self._maps, self._fds
+        self._maps, self._fds = {}, {}
+        for mapped in maps.values():
+            mapped.close()
+        for fd in fds.values():
+            os.close(fd)
+
+    def __del__(self):
+        # Scoped stores evicted by AffirmationModel are closed once no request uses them
+        if getattr(self, "_fds", None):
+            self.close()
+
+
+class SQLiteAffirmationStore:
+    """
+    Stores affirmations in the `affirmations` table of a SQLite database.
+
+    Writes are buffered and flushed in one transaction once `batch_size` affirmations
+    are pending, after `flush_interval` seconds, or before any read. The live row count
+    is kept in `affirmation_counts` by triggers, so counting never scans the table, and
+    clearing only sets the `deleted` flag. The UNIQUE constraint on the text is the dedup
+    index: storing a live affirmation again only increments its `hits` column.
+
+    Every live row also holds a dense `position` in `[0, live_count)`, assigned from the
+    counter when the row is stored. Since clearing always removes every live row, the
+    positions never have gaps, and a random affirmation is one lookup in the partial
+    position index.
+
+    The same triggers bump a per-collection `version` whenever a row becomes live or is
+    cleared. It lives in the database, so every process sharing the file sees one version.
+
+    Live rows are also indexed in an FTS5 table over the text (`affirmations_fts`), kept
+    in step by triggers as rows become live or are cleared, which `search` ranks with bm25.
+    """
+
+    # Versions come from the shared database, so they are comparable across processes
+    version_scope = "db"
+
+    TABLES = """
+        CREATE TABLE IF NOT EXISTS affirmations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            affirmation TEXT NOT NULL UNIQUE,
+            deleted BOOLEAN DEFAULT FALSE,
+            position INTEGER,
+            hits INTEGER NOT NULL DEFAULT 1
+        );
+
+        CREATE TABLE IF NOT EXISTS user_affirmations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            affirmation TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            deleted BOOLEAN DEFAULT FALSE,
+            position INTEGER,
+            hits INTEGER NOT NULL DEFAULT 1,
+            UNIQUE (user_id, affirmation)
+        );
+
+        CREATE TABLE IF NOT EXISTS affirmation_counts (
+            owner INTEGER PRIMARY KEY,
+            live_count INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+    """
+
+    # Columns added since the original create_affirmation_table.sql, with their type and
+    # the statement that backfills them for rows that already exist
+    MIGRATIONS = {
+        "position": ("INTEGER", """
+            WITH ranked AS (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY id) - 1 AS position
+                FROM affirmations WHERE deleted = 0
+            )
+            UPDATE affirmations SET position = (SELECT position FROM ranked WHERE ranked.id = affirmations.id)
+            WHERE deleted = 0
+        """),
+        "hits": ("INTEGER NOT NULL DEFAULT 1", None),
+    }
+
+    # Full-text indexes of the live rows, with the statement that fills each one when it
+    # is first created for a database that already holds affirmations. Prefix indexes
+    # on 2 and 3 characters keep short `word*` queries from scanning the whole vocabulary.
+    SEARCH_INDEXES = {
+        "affirmations_fts": ("""
+            CREATE VIRTUAL TABLE affirmations_fts USING fts5(
+                affirmation, content='affirmations', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 0', prefix='2 3')
+        """, """
+            INSERT INTO affirmations_fts (rowid, affirmation)
+            SELECT id, affirmation FROM affirmations WHERE deleted = 0
+        """),
+        "user_affirmations_fts": ("""
+            CREATE VIRTUAL TABLE user_affirmations_fts USING fts5(
+                affirmation, user_id UNINDEXED, content='user_affirmations', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 0', prefix='2 3')
+        """, """
+            INSERT INTO user_affirmations_fts (rowid, affirmation, user_id)
+            SELECT id, affirmation, user_id FROM user_affirmations WHERE deleted = 0
+        """),
+    }
+
+    SCHEMA = """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_affirmations_position ON affirmations(position) WHERE deleted = 0;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_user_affirmations_position
+            ON user_affirmations(user_id, position) WHERE deleted = 0;
+
+        INSERT OR IGNORE INTO affirmation_counts (owner, live_count)
+            SELECT 0, COUNT(*) FROM affirmations WHERE deleted = 0;
+
+        CREATE TRIGGER IF NOT EXISTS affirmations_counts_insert
+        AFTER INSERT ON affirmations WHEN NEW.deleted = 0
+        BEGIN
+            UPDATE affirmation_counts SET live_count = live_count + 1, version = version + 1 WHERE owner = 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS affirmations_counts_update
+        AFTER UPDATE OF deleted ON affirmations WHEN OLD.deleted <> NEW.deleted
+        BEGIN
+            UPDATE affirmation_counts
+            SET live_count = live_count + CASE WHEN NEW.deleted THEN -1 ELSE 1 END, version = version + 1
+            WHERE owner = 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS user_affirmations_counts_insert
+        AFTER INSERT ON user_affirmations WHEN NEW.deleted = 0
+        BEGIN
+            INSERT OR IGNORE INTO affirmation_counts (owner, live_count) VALUES (NEW.user_id, 0);
+            UPDATE affirmation_counts SET live_count = live_count + 1, version = version + 1
+            WHERE owner = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS user_affirmations_counts_update
+        AFTER UPDATE OF deleted ON user_affirmations WHEN OLD.deleted <> NEW.deleted
+        BEGIN
+            UPDATE affirmation_counts
+            SET live_count = live_count + CASE WHEN NEW.deleted THEN -1 ELSE 1 END, version = version + 1
+            WHERE owner = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS affirmations_fts_insert
+        AFTER INSERT ON affirmations WHEN NEW.deleted = 0
+        BEGIN
+            INSERT INTO affirmations_fts (rowid, affirmation) VALUES (NEW.id, NEW.affirmation);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS affirmations_fts_update
+        AFTER UPDATE OF deleted ON affirmations WHEN OLD.deleted <> NEW.deleted
+        BEGIN
+            INSERT INTO affirmations_fts (affirmations_fts, rowid, affirmation)
+            SELECT 'delete', OLD.id, OLD.affirmation WHERE NEW.deleted;
+            INSERT INTO affirmations_fts (rowid, affirmation) SELECT NEW.id, NEW.affirmation WHERE NOT NEW.deleted;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS affirmations_fts_delete
+        AFTER DELETE ON affirmations WHEN OLD.deleted = 0
+        BEGIN
+            INSERT INTO affirmations_fts (affirmations_fts, rowid, affirmation) VALUES ('delete', OLD.id, OLD.affirmation);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS user_affirmations_fts_insert
+        AFTER INSERT ON user_affirmations WHEN NEW.deleted = 0
+        BEGIN
+            INSERT INTO user_affirmations_fts (rowid, affirmation, user_id)
+            VALUES (NEW.id, NEW.affirmation, NEW.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS user_affirmations_fts_update
+        AFTER UPDATE OF deleted ON user_affirmations WHEN OLD.deleted <> NEW.deleted
+        BEGIN
+            INSERT INTO user_affirmations_fts (user_affirmations_fts, rowid, affirmation, user_id)
+            SELECT 'delete', OLD.id, OLD.affirmation, OLD.user_id WHERE NEW.deleted;
+            INSERT INTO user_affirmations_fts (rowid, affirmation, user_id)
+            SELECT NEW.id, NEW.affirmation, NEW.user_id WHERE NOT NEW.deleted;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS user_affirmations_fts_delete
+        AFTER DELETE ON user_affirmations WHEN OLD.deleted = 0
+        BEGIN
+            INSERT INTO user_affirmations_fts (user_affirmations_fts, rowid, affirmation, user_id)
+            VALUES ('delete', OLD.id, OLD.affirmation, OLD.user_id);
+        END;
+    """
+
+    # Table holding this store's rows, and the condition selecting them
+    TABLE = "affirmations"
+    SCOPE = ""
+
+    # A live duplicate only gets another hit; a cleared affirmation stored again is
+    # revived at the next position with its hits reset
+    INSERT_SQL = """
+        INSERT INTO affirmations (affirmation, deleted, position, hits)
+        VALUES (:affirmation, 0, (SELECT live_count FROM affirmation_counts WHERE owner = 0), 1)
+        ON CONFLICT (affirmation) DO UPDATE SET
+            hits = CASE WHEN deleted THEN 1 ELSE hits + 1 END,
+            position = CASE WHEN deleted
+                THEN (SELECT live_count FROM affirmation_counts WHERE owner = 0) ELSE position END,
+            deleted = 0
+    """
+
+    def __init__(self, path: str = ":memory:", batch_size: int = 64, flush_interval: float = 0.5):
+        """
+        Opens (and if needed creates) the affirmation tables.
+
+        Args:
+            path (str): Path to the SQLite database file, or ":memory:" for a private in-memory database.
+            batch_size (int): Number of pending affirmations that triggers a flush.
+            flush_interval (float): Maximum number of seconds a pending affirmation waits before being written.
+        """
+        self.path = path
+        self.owner = 0
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._pending = []
+        self._timer = None
+        self._scoped = []
+
+        self._conn = self._connect()
+        logger.info("Affirmation store opened at %s", path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if self.path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.TABLES)
+        self._migrate()
+        self._create_search_indexes()
+        self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def after_fork(self) -> None:
+        """
+        Opens this process's own connection in a worker forked after the store was opened.
+
+        SQLite connections must not be used across fork, so the inherited one is set aside
+        unused; it is never closed, since closing it would release the parent's file locks. Writes still pending in the
+        parent are the parent's to flush. Scoped stores switch over with their own `after_fork`.
+        A ":memory:" database starts empty in the child.
+        """
+        self._lock = threading.RLock()
+        self._pending = []
+        self._timer = None
+        self._scoped = []
+        _inherited_connections.append(self._conn)
+        self._conn = self._connect()
+
+    def _migrate(self) -> None:
+        """
+        Adds and backfills columns missing from tables created by an older schema.
+        """
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(affirmations)")}
+        for column, (definition, backfill) in self.MIGRATIONS.items():
+            if column not in columns:
+                logger.info("Adding column %s to affirmations", column)
+                self._conn.execute(f"ALTER TABLE affirmations ADD COLUMN {column} {definition}")
+                if backfill:
+                    self._conn.execute(backfill)
+
+    def _create_search_indexes(self) -> None:
+        """
+        Creates the full-text indexes missing from the database and indexes the live rows already stored.
+        """
+        existing = {row[0] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for name, (create, backfill) in self.SEARCH_INDEXES.items():
+            if name not in existing:
+                logger.info("Creating search index %s", name)
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute(create)
+                self._conn.execute(backfill)
+                self._conn.execute("COMMIT")
+
+    def scoped(self, user_id: int) -> "SQLiteUserAffirmationStore":
+        """
+        Returns a store for one user's collection, sharing this store's connection.
+
+        Args:
+            user_id (int): The `Users.id` owning the collection.
+        """
+        store = SQLiteUserAffirmationStore(self, user_id)
+        with self._lock:
+            self._scoped.append(store)
+        return store
+
+    def add(self, affirmation: str) -> None:
+        """
+        Queues a single affirmation to be written with the next batch.
+
+        Args:
+            affirmation (str): The affirmation to store.
+        """
+        self.add_many([affirmation])
+
+    def add_many(self, affirmations: Iterable[str]) -> None:
+        """
+        Queues several affirmations to be written with the next batch.
+
+        Args:
+            affirmations (iterable): The affirmations to store, in order.
+        """
+        with self._lock:
+            self._pending.extend(affirmations)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+            elif self._pending and self._timer is None:
+                self._schedule_flush_locked()
+
+    def _schedule_flush_locked(self) -> None:
+        self._timer = threading.Timer(self.flush_interval, self._background_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_flush(self) -> None:
+        with self._lock:
+            self._flush_locked(reraise=False)
+
+    def flush(self) -> None:
+        """
+        Writes all pending affirmations in a single transaction.
+        """
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self, reraise: bool = True) -> None:
+        """
+        Writes the pending affirmations in one transaction.
+
+        If the write fails they stay pending and another flush is scheduled. The error is
+        raised only with `reraise`: readers flushing before a query pass False, so a failed
+        write is logged rather than reported as a failed read.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                self.INSERT_SQL, ({"affirmation": affirmation, "owner": self.owner} for affirmation in self._pending))
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self._conn.in_transaction:
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error as rollback_error:
+                    # Keep the original error; SQLite may already have rolled back on its own
+                    logger.error("Rollback failed: %s", str(rollback_error))
+            logger.error("Failed to write %d affirmations, keeping them pending: %s", len(self._pending), str(e))
+            self._schedule_flush_locked()
+            if reraise:
+                raise
+            return
+        logger.debug("Flushed %d affirmations", len(self._pending))
+        self._pending = []
+
+    def _query(self, sql: str, **params) -> list:
+        """
+        Flushes pending writes, then runs a query against this store's rows.
+
+        `{table}` and `{scope}` in the SQL are replaced by the store's table and the
+        condition selecting its rows, and `:owner` is bound to the store's owner.
+        """
+        with self._lock:
+            self._flush_locked(reraise=False)
+            return self._execute(sql, **params)
+
+    def _execute(self, sql: str, **params) -> list:
+        """
+        Runs a query like `_query` without flushing first, e.g. inside a transaction.
+        """
+        return self._conn.execute(
+            sql.format(table=self.TABLE, scope=self.SCOPE), dict(params, owner=self.owner)).fetchall()
+
+    def hits(self, affirmation: str) -> int:
+        """
+        Returns how many times an affirmation has been stored since the last clear.
+
+        Args:
+            affirmation (str): The affirmation to look up.
+
+        Returns:
+            int: The hit count, or 0 if the affirmation is not stored.
+        """
+        rows = self._query(
+            "SELECT hits FROM {table} WHERE {scope}affirmation = :affirmation AND deleted = 0",
+            affirmation=affirmation)
+        return rows[0][0] if rows else 0
+
+    def version(self) -> int:
+        """
+        Returns a number that increases whenever an affirmation becomes live or is cleared.
+
+        Pending writes are flushed first, so the version covers every affirmation added so far.
+        """
+        rows = self._query("SELECT version FROM affirmation_counts WHERE owner = :owner")
+        return rows[0][0] if rows else 0
+
+    def get_all(self) -> List[str]:
+        """
+        Returns all live affirmations in insertion order.
+        """
+        rows = self._query("SELECT affirmation FROM {table} WHERE {scope}deleted = 0 ORDER BY position")
+        return [row[0] for row in rows]
+
+    def count(self) -> int:
+        """
+        Returns the number of live affirmations from the maintained counter.
+        """
+        rows = self._query("SELECT live_count FROM affirmation_counts WHERE owner = :owner")
+        return rows[0][0] if rows else 0
+
+    def sample(self, k: int = 1) -> List[str]:
+        """
+        Picks up to `k` distinct live affirmations at random.
+
+        Positions are drawn from the live counter and looked up through the position
+        index inside one read transaction, so the cost depends on `k` only.
+
+        Args:
+            k (int): Number of affirmations to pick.
+
+        Returns:
+            list: `min(k, count)` affirmations drawn without replacement.
+        """
+        with self._lock:
+            self._flush_locked(reraise=False)
+            self._conn.execute("BEGIN")
+            try:
+                # Already flushed: flushing again inside the transaction could roll it back on a failed write
+                counts = self._execute("SELECT live_count FROM affirmation_counts WHERE owner = :owner")
+                live_count = counts[0][0] if counts else 0
+                positions = random.sample(range(live_count), min(k, live_count))
+                if not positions:
+                    return []
+                names = {f"p{i}": position for i, position in enumerate(positions)}
+                rows = self._execute(
+                    "SELECT position, affirmation FROM {table} WHERE {scope}deleted = 0 "
+                    f"AND position IN ({', '.join(':' + name for name in names)})",
+                    **names)
+            finally:
+                if self._conn.in_transaction:
+                    self._conn.execute("COMMIT")
+        by_position = dict(rows)
+        return [by_position[position] for position in positions if position in by_position]
+
+    def page(self, after: Optional[int] = None, limit: int = 50) -> Tuple[List[str], Optional[int]]:
+        """
+        Returns the live affirmations stored after a cursor.
+
+        The cursor is the position of the last affirmation returned, so every page is a
+        range scan of the position index regardless of how deep it is.
+
+        Args:
+            after (int): Cursor returned by the previous page, or `None` for the first page.
+            limit (int): Maximum number of affirmations to return.
+
+        Returns:
+            tuple: The affirmations and the cursor for the next page, which is `None` on the last page.
+        """
+        rows = self._query(
+            "SELECT position, affirmation FROM {table} WHERE {scope}deleted = 0 AND position > :after "
+            "ORDER BY position LIMIT :limit",
+            after=-1 if after is None else after, limit=limit + 1)
+        if len(rows) > limit:
+            return [row[1] for row in rows[:limit]], rows[limit - 1][0]
+        return [row[1] for row in rows], None
+
+    def search(self, query: str, after: Optional[int] = None, limit: int = 20) -> Tuple[List[str], Optional[int]]:
+        """
+        Returns the live affirmations containing every word of a query, best match first.
+
+        Runs as one FTS5 MATCH ordered by bm25, ties in insertion order. The cursor is the
+        rank of the last affirmation returned.
+
+        Args:
+            query (str): Words to look for; see `search_terms`.
+            after (int): Cursor returned by the previous page, or `None` for the first page.
+            limit (int): Maximum number of affirmations to return.
+
+        Returns:
+            tuple: The affirmations and the cursor for the next page, which is `None` on the last page.
+
+        Raises:
+            ValueError: If the query contains no words.
+        """
+        terms = search_terms(query)
+        if not terms:
+            raise ValueError("The search query must contain at least one word")
+        # Every word quoted, so punctuation in the query can never be read as FTS5 syntax
+        match = " ".join(f'"{word}"' + ("*" if is_prefix else "") for word, is_prefix in terms)
+        start = 0 if after is None else after + 1
+        rows = self._query(
+            "SELECT affirmation FROM {table}_fts WHERE {scope}{table}_fts MATCH :match "
+            "ORDER BY rank, rowid LIMIT :limit OFFSET :offset",
+            match=match, limit=limit + 1, offset=start)
+        if len(rows) > limit:
+            return [row[0] for row in rows[:limit]], start + limit - 1
+        return [row[0] for row in rows], None
+
+    def clear(self) -> None:
+        """
+        Soft-deletes every live affirmation, including any still pending.
+        """
+        with self._lock:
+            # Pending rows that cannot be written must not be written after the clear either
+            self._flush_locked()
+            self._query("UPDATE {table} SET deleted = 1 WHERE {scope}deleted = 0")
+
+    def close(self) -> None:
+        """
+        Flushes pending writes, including those of scoped stores, and closes the database connection.
+        """
+        with self._lock:
+            for store in self._scoped:
+                store._flush_locked()
+            self._flush_locked()
+            self._conn.close()
+
+
+class SQLiteUserAffirmationStore(SQLiteAffirmationStore):
+    """
+    One user's affirmation collection in the `user_affirmations` table.
+
+    Behaves like the shared collection, with every query scoped to `user_id`. Rows are
+    found through the (user_id, position) index and the user's live count is kept in
+    `affirmation_counts`, so per-user count, sampling and paging stay independent of
+    the total number of rows.
+    """
+
+    TABLE = "user_affirmations"
+    SCOPE = "user_id = :owner AND "
+
+    INSERT_SQL = """
+        INSERT INTO user_affirmations (user_id, affirmation, deleted, position, hits)
+        VALUES (:owner, :affirmation, 0,
+                COALESCE((SELECT live_count FROM affirmation_counts WHERE owner = :owner), 0), 1)
+        ON CONFLICT (user_id, affirmation) DO UPDATE SET
+            hits = CASE WHEN deleted THEN 1 ELSE hits + 1 END,
+            position = CASE WHEN deleted
+                THEN (SELECT live_count FROM affirmation_counts WHERE owner = :owner) ELSE position END,
+            created_at = CASE WHEN deleted THEN CURRENT_TIMESTAMP ELSE created_at END,
+            deleted = 0
+    """
+
+    def __init__(self, parent: SQLiteAffirmationStore, user_id: int):
+        """
+        Args:
+            parent (SQLiteAffirmationStore): Store whose connection and lock are shared.
+            user_id (int): The `Users.id` owning the collection.
+        """
+        self.path = parent.path
+        self.owner = user_id
+        self.batch_size = parent.batch_size
+        self.flush_interval = parent.flush_interval
+        self._lock = parent._lock
+        self._conn = parent._conn
+        self._pending = []
+        self._timer = None
+        self._parent = parent
+
+    def scoped(self, user_id: int) -> "SQLiteUserAffirmationStore":
+        return self._parent.scoped(user_id)
+
+    def after_fork(self) -> None:
+        """
+        Switches to the parent's new connection; call after the parent's `after_fork`.
+        """
+        self._lock = self._parent._lock
+        self._conn = self._parent._conn
+        self._pending = []
+        self._timer = None
+        with self._lock:
+            self._parent._scoped.append(self)
+
+    def close(self) -> None:
+        """
+        Flushes pending writes; the shared connection is closed by the parent store.
+        """
+        self.flush()
@@ -1,33 +1,184 @@
 
 import requests
 import logging
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+from models.affirmation_store import InMemoryAffirmationStore
+from utils.async_http_client import AsyncUpstreamClient
+from utils.http_client import UpstreamClient
 from utils.logger import configure_logger
+from utils.metrics import UPSTREAM_COALESCED, UPSTREAM_ERRORS, UPSTREAM_LATENCY, timed
+from utils.prefetch import AffirmationPrefetcher
+from utils.singleflight import SingleFlight
 
 
 logger = logging.getLogger(__name__)
 configure_logger(logger)
 
+# Overridable so load tests can point the app at a local stand-in
+AFFIRMATIONS_URL = os.getenv('AFFIRMATIONS_URL', 'https://www.affirmations.dev/')
+
+# Shared across model instances so every caller reuses the same connection pool
+upstream_client = UpstreamClient()
+async_upstream_client = AsyncUpstreamClient(pool_size=int(os.getenv('ASYNC_UPSTREAM_POOL_SIZE', '100')))
+
+
 class AffirmationModel:
-    def __init__(self):
+    def __init__(self, prefetcher=None, client=None, store=None, fetch_workers=8, async_client=None):
        """
-        Initializes the AffirmationManager instance with an empty list for affirmations.
+        Initializes the AffirmationManager instance with an empty affirmation store.
 
         Args:
+            prefetcher (AffirmationPrefetcher): Optional buffer of ready affirmations
+                consulted before calling the external API.
+            client (UpstreamClient): HTTP client for the external API, the shared
+                module-level client if omitted.
+            store: Storage backend for the shared collection, an in-memory list if omitted.
+                Per-user collections are created from it with `store.scoped(user_id)`.
+            fetch_workers (int): Maximum number of concurrent upstream calls made by `fetch_many`.
+            async_client (AsyncUpstreamClient): HTTP client used by the `*_async` methods, the
+                shared module-level async client if omitted.
+
+        Returns:
             None
+        """
+       self.store = store if store is not None else InMemoryAffirmationStore()
+       self._user_stores = OrderedDict()
+       self._user_stores_lock = threading.Lock()
+       self.prefetcher = prefetcher
+       self.client = client or upstream_client
+       self.async_client = async_client or async_upstream_client
+       self.single_flight = None
+       self.fetch_workers = fetch_workers
+       self._fetch_pool = None
+       self._fetch_pool_lock = threading.Lock()
+
+    def enable_prefetch(self, buffer_size=32, low_water=8, workers=2, backoff_base=0.5, backoff_max=30.0):
+        """
+        Starts a background prefetcher that keeps affirmations ready for `fetch_affirmation`.
+
+        Args:
+            buffer_size (int): Maximum number of affirmations kept ready.
+            low_water (int): Refilling starts once the buffer holds fewer than this many.
+            workers (int): Number of concurrent refill threads.
+            backoff_base (float): Initial delay in seconds after a failed upstream call.
+            backoff_max (float): Maximum delay in seconds between failed upstream calls.
+
+        Returns:
+            The started AffirmationPrefetcher.
+        """
+        if self.prefetcher is None:
+            self.prefetcher = AffirmationPrefetcher(
+                self._request_affirmation, buffer_size=buffer_size, low_water=low_water,
+                workers=workers, backoff_base=backoff_base, backoff_max=backoff_max)
+        self.prefetcher.start()
+        return self.prefetcher
+
+    def enable_coalescing(self, window=0.0):
+        """
+        Makes concurrent `fetch_affirmation` calls share upstream requests.
+
+        While an upstream request is in flight, further callers wait for it instead of
+        sending their own, and each stores and returns the affirmation it brought back.
+
+        Args:
+            window (float): Seconds after a successful upstream request during which
+                callers still reuse its affirmation; 0 only shares in-flight requests.
+
+        Returns:
+            The SingleFlight wrapping the upstream call; its `calls` and `coalesced`
+            count upstream requests made and avoided.
+        """
+        coalesced = UPSTREAM_COALESCED.labels('affirmations.dev')
+        self.single_flight = SingleFlight(self._request_affirmation, window=window, on_coalesced=coalesced.inc)
+        return self.single_flight
+
+    def after_fork(self):
+        """
+        Re-creates per-process state in a server worker forked after the model was built.
+
+        The stores switch to a database connection of their own, upstream clients and the fetch pool start with no inherited connections
+        or threads, and a configured prefetcher or coalescer starts over.
 
         Returns:
             None
         """
-       self.affirmations = []
+        self.store.after_fork()
+        for store in self._user_stores.values():
+            store.after_fork()
+        self._user_stores_lock = threading.Lock()
+        self._fetch_pool = None
+        self._fetch_pool_lock = threading.Lock()
+        self.client.after_fork()
+        self.async_client.after_fork()
+        if self.single_flight is not None:
+            self.enable_coalescing(window=self.single_flight.window)
+        if self.prefetcher is not None:
+            self.prefetcher.after_fork()
+            self.prefetcher.start()
 
-    def fetch_affirmation(self):
+    def _store_for(self, user_id):
+        """
+        Returns the store holding a user's collection, or the shared one if `user_id` is None.
         """
-        Fetches a random affirmation from the external API and stores it in memory.
+        if user_id is None:
+            return self.store
+        store = self._user_stores.get(user_id)
+        # Stores whose collections live outside the process cap how many are kept open
+        limit = getattr(self.store, 'scoped_limit', None)
+        if store is None or limit is not None:
+            with self._user_stores_lock:
+                store = self._user_stores.get(user_id)
+                if store is None:
+                    store = self._user_stores[user_id] = self.store.scoped(user_id)
+                if limit is not None:
+                    self._user_stores.move_to_end(user_id)
+                    while len(self._user_stores) > limit:
+                        self._user_stores.popitem(last=False)
+        return store
+
+    @property
+    def affirmations(self):
+        """
+        A snapshot list of the stored affirmations.
+        """
+        return self.store.get_all()
+
+    @timed('affirmations.dev', UPSTREAM_LATENCY, UPSTREAM_ERRORS)
+    def _request_affirmation(self):
+        """
+        Calls the external API for a single affirmation without storing it.
 
         Args:
             None
 
+        Returns:
+            The affirmation text, or `None` if the API returned none.
+
+        Raises:
+            requests.exceptions.RequestException: If the HTTP request fails.
+        """
+        response = self.client.get(AFFIRMATIONS_URL)
+        if response.status_code == 200:
+            return response.json().get('affirmation')
+        return None
+
+    def fetch_affirmation(self, user_id=None):
+        """
+        Fetches a random affirmation from the external API and stores it.
+
+        When a prefetcher is configured, a buffered affirmation is used if one is
+        ready and the external API is only called on a buffer miss. With coalescing
+        enabled, concurrent callers share one upstream request and its affirmation. An affirmation
+        that is already stored is not stored twice; its hit count is incremented.
+
+        Args:
+            user_id (int): Owner of the collection to store into, the shared collection if None.
+
         Returns: 
             The fetched affirmation as a string if the API call is successful,
             or `None` if no affirmation is retrieved.
@@ -36,48 +187,302 @@ class AffirmationModel:
             A string describing the exception if an HTTP request error occurs.
         """
         try:
-            response = requests.get('https://www.affirmations.dev/')
-            if response.status_code == 200:
-                affirmation = response.json().get('affirmation')
-                if affirmation:
-                    self.affirmations.append(affirmation)
-                    return affirmation
+            affirmation = self.prefetcher.get() if self.prefetcher else None
+            if affirmation is None:
+                affirmation = self.single_flight() if self.single_flight else self._request_affirmation()
+            if affirmation:
+                self._store_for(user_id).add(affirmation)
+                return affirmation
             return None
         except requests.exceptions.RequestException as e:
             return str(e)
 
-    def get_all_affirmations(self):
+    def _get_fetch_pool(self):
+        if self._fetch_pool is None:
+            with self._fetch_pool_lock:
+                if self._fetch_pool is None:
+                    self._fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_workers,
+                                                          thread_name_prefix="affirmation-fetch")
+        return self._fetch_pool
+
+    def fetch_many(self, n, user_id=None):
+        """
+        Fetches up to `n` affirmations with concurrent upstream calls and stores them in one write.
+
+        Buffered affirmations from the prefetcher are used first. The remaining upstream
+        calls run on a pool of at most `fetch_workers` threads shared by all callers, so
+        wall time grows with `n / fetch_workers` rather than with `n`. Affirmations fetched
+        more than once are returned once and stored with one hit per fetch.
+
+        Args:
+            n (int): The number of affirmations to fetch.
+            user_id (int): Owner of the collection to store into, the shared collection if None.
+
+        Returns:
+            A dict with the distinct fetched affirmations under 'affirmations', in fetch
+            order, and one {'index', 'error'} entry per failed fetch under 'errors'.
+        """
+        fetched = []
+        while self.prefetcher is not None and len(fetched) < n:
+            affirmation = self.prefetcher.get()
+            if affirmation is None:
+                break
+            fetched.append(affirmation)
+
+        errors = []
+        pool = self._get_fetch_pool()
+        futures = [pool.submit(self._request_affirmation) for _ in range(n - len(fetched))]
+        for index, future in enumerate(futures, start=len(fetched)):
+            try:
+                affirmation = future.result()
+            except requests.exceptions.RequestException as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            if affirmation:
+                fetched.append(affirmation)
+            else:
+                errors.append({'index': index, 'error': 'No affirmation returned'})
+
+        if fetched:
+            self._store_for(user_id).add_many(fetched)
+        return {'affirmations': list(dict.fromkeys(fetched)), 'errors': errors}
+
+    @timed('affirmations.dev', UPSTREAM_LATENCY, UPSTREAM_ERRORS)
+    async def _request_affirmation_async(self):
+        """
+        Awaits a single affirmation from the external API without storing it.
+
+        Returns:
+            The affirmation text, or `None` if the API returned none.
+
+        Raises:
+            requests.exceptions.RequestException: If the HTTP request fails.
+        """
+        response = await self.async_client.get(AFFIRMATIONS_URL)
+        if response.status_code == 200:
+            return response.json().get('affirmation')
+        return None
+
+    async def fetch_affirmation_async(self, user_id=None):
+        """
+        Async version of `fetch_affirmation`: waiting on the external API holds no thread,
+        and the affirmation is stored on a worker thread so the event loop never blocks.
+
+        Args:
+            user_id (int): Owner of the collection to store into, the shared collection if None.
+
+        Returns:
+            The fetched affirmation as a string, `None` if no affirmation is retrieved,
+            or a string describing the exception if an HTTP request error occurs.
+        """
+        try:
+            affirmation = self.prefetcher.get() if self.prefetcher else None
+            if affirmation is None:
+                affirmation = await self._request_affirmation_async()
+            if affirmation:
+                # Stores may block on disk or locks, so they write off the event loop
+                await asyncio.to_thread(self._store_for(user_id).add, affirmation)
+                return affirmation
+            return None
+        except requests.exceptions.RequestException as e:
+            return str(e)
+
+    async def fetch_many_async(self, n, user_id=None):
+        """
+        Async version of `fetch_many`: all upstream calls run as tasks on the event loop,
+        limited by the async client's pool size instead of a thread pool, and the results
+        are stored on a worker thread.
+
+        Args:
+            n (int): The number of affirmations to fetch.
+            user_id (int): Owner of the collection to store into, the shared collection if None.
+
+        Returns:
+            A dict with the distinct fetched affirmations under 'affirmations' and one
+            {'index', 'error'} entry per failed fetch under 'errors'.
+        """
+        fetched = []
+        while self.prefetcher is not None and len(fetched) < n:
+            affirmation = self.prefetcher.get()
+            if affirmation is None:
+                break
+            fetched.append(affirmation)
+
+        errors = []
+        results = await asyncio.gather(*(self._request_affirmation_async() for _ in range(n - len(fetched))),
+                                       return_exceptions=True)
+        for index, result in enumerate(results, start=len(fetched)):
+            if isinstance(result, requests.exceptions.RequestException):
+                errors.append({'index': index, 'error': str(result)})
+            elif isinstance(result, BaseException):
+                raise result
+            elif result:
+                fetched.append(result)
+            else:
+                errors.append({'index': index, 'error': 'No affirmation returned'})
+
+        if fetched:
+            await asyncio.to_thread(self._store_for(user_id).add_many, fetched)
+        return {'affirmations': list(dict.fromkeys(fetched)), 'errors': errors}
+
+    def get_all_affirmations(self, user_id=None):
         """
         Returns all stored affirmations.
 
         Args:
-            None
+            user_id (int): Owner of the collection, the shared collection if None.
 
         Returns:
             A list of all stored affirmations.
         """
-        return self.affirmations
+        return self._store_for(user_id).get_all()
 
-    def clear_affirmations(self):
+    def clear_affirmations(self, user_id=None):
         """
         Clears all stored affirmations.
 
         Args:
-            None
+            user_id (int): Owner of the collection, the shared collection if None.
 
         Returns:
             None
         """
-        self.affirmations = []
+        self._store_for(user_id).clear()
 
-    def get_affirmation_count(self):
+    def drop_affirmations(self, user_id):
         """
-        Returns the count of affirmations stored in memory.
+        Clears a user's collection and forgets its store, e.g. when the user is deleted.
 
         Args:
+            user_id (int): Owner of the collection.
+
+        Returns:
             None
+        """
+        with self._user_stores_lock:
+            store = self._user_stores.pop(user_id, None)
+        (store or self.store.scoped(user_id)).clear()
+
+    def get_affirmations_page(self, after=None, limit=50, user_id=None):
+        """
+        Returns one page of stored affirmations.
+
+        Args:
+            after (int): Cursor returned with the previous page, or `None` for the first page.
+            limit (int): The maximum number of affirmations in the page.
+            user_id (int): Owner of the collection, the shared collection if None.
+
+        Returns:
+            A tuple of the affirmations in the page and the cursor for the next page,
+            or `None` as the cursor if this is the last page.
+        """
+        return self._store_for(user_id).page(after, limit)
+
+    def iter_affirmation_pages(self, page_size=1000, user_id=None):
+        """
+        Yields every stored affirmation one page at a time.
+
+        Only a single page is held in memory, so callers can stream very large stores.
+
+        Args:
+            page_size (int): The number of affirmations fetched per page.
+            user_id (int): Owner of the collection, the shared collection if None.
+
+        Returns:
+            A generator of lists of affirmations.
+        """
+        store = self._store_for(user_id)
+        after = None
+        while True:
+            affirmations, after = store.page(after, page_size)
+            if affirmations:
+                yield affirmations
+            if after is None:
+                return
+
+    def search_affirmations(self, query, after=None, limit=20, user_id=None):
+        """
+        Returns one page of the stored affirmations matching a search query, best match first.
+
+        Args:
+            query (str): Words that must all appear; a word ending in `*` matches as a prefix.
+            after (int): Cursor returned with the previous page, or `None` for the first page.
+            limit (int): The maximum number of affirmations in the page.
+            user_id (int): Owner of the collection, the shared collection if None.
+
+        Returns:
+            A tuple of the matching affirmations and the cursor for the next page,
+            or `None` as the cursor if this is the last page.
+
+        Raises:
+            ValueError: If the query contains no words.
+        """
+        return self._store_for(user_id).search(query, after, limit)
+
+    def get_affirmation_hits(self, affirmation, user_id=None):
+        """
+        Returns how many times an affirmation has been fetched since the last clear.
+
+        Args:
+            affirmation (str): The affirmation to look up.
+            user_id (int): Owner of the collection, the shared collection if None.
+
+        Returns:
+            An integer hit count, 0 if the affirmation is not stored.
+        """
+        return self._store_for(user_id).hits(affirmation)
+
+    def get_affirmation_count(self, user_id=None):
+        """
+        Returns the count of stored affirmations.
+
+        Args:
+            user_id (int): Owner of the collection, the shared collection if None.
 
         Returns:
             An integer representing the number of affirmations stored.
         """
-        return len(self.affirmations)
+        return self._store_for(user_id).count()
+
+    def get_affirmations_version(self, user_id=None):
+        """
+        Returns an identifier of the current contents of a collection, e.g. for ETags.
+
+        It changes whenever `fetch_affirmation` stores a new affirmation or
+        `clear_affirmations` runs, and embeds the owner and the store's version scope,
+        so identifiers of different collections or process-local copies never match.
+
+        Args:
+            user_id (int): Owner of the collection, the shared collection if None.
+
+        Returns:
+            str: "<scope>-<owner>-<version>".
+        """
+        store = self._store_for(user_id)
+        return f"{store.version_scope}-{user_id or 0}-{store.version()}"
+
+    def get_random_affirmation(self, user_id=None):
+        """
+        Returns one stored affirmation chosen at random.
+
+        Args:
+            user_id (int): Owner of the collection, the shared collection if None.
+
+        Returns:
+            A random affirmation, or `None` if no affirmations are stored.
+        """
+        sample = self._store_for(user_id).sample(1)
+        return sample[0] if sample else None
+
+    def sample_affirmations(self, k, user_id=None):
+        """
+        Returns up to `k` distinct stored affirmations chosen at random.
+
+        Args:
+            k (int): The number of affirmations to return.
+            user_id (int): Owner of the collection, the shared collection if None.
+
+        Returns:
+            A list of at most `k` affirmations, without repeats.
+        """
+        return self._store_for(user_id).sample(k)
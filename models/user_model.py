@@ -1,24 +1,70 @@
-import hashlib
 import logging
-import os
+from collections import namedtuple
+from itertools import islice
+from typing import Iterable, Mapping
 
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 from sqlalchemy.exc import IntegrityError
 
 from db import db
+from utils.cache import TTLCache
 from utils.logger import configure_logger
+from utils.metrics import timed
+from utils.password_hashing import PasswordHashingService
 
 
 logger = logging.getLogger(__name__)
 configure_logger(logger)
 
 
+# What authentication needs from a user row, loaded in one query and cached by username
+UserRecord = namedtuple('UserRecord', ['id', 'salt', 'password', 'token_version'])
+
+# Separates access tokens from anything else signed with the app's SECRET_KEY
+TOKEN_SALT = 'access-token'
+
+
 class Users(db.Model):
     __tablename__ = 'users'
+    # Never reuse the id of a deleted user: affirmation collections are keyed by it
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    # Used for token checks only; other worker processes see a password change or revocation once
+    # their entry expires, so the time to live is kept short (USER_RECORD_CACHE_TTL)
+    _record_cache = TTLCache(maxsize=1024, ttl=5.0)
+
+    # Replaced at startup with the configured algorithm, cost and pool size
+    _hashing = PasswordHashingService()
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    salt = db.Column(db.String(32), nullable=False)  # 16-byte salt in hex
-    password = db.Column(db.String(64), nullable=False)  # SHA-256 hash in hex
+    salt = db.Column(db.String(32), nullable=False)  # 16-byte salt in hex for legacy SHA-256 rows, empty otherwise
+    password = db.Column(db.String(255), nullable=False)  # self-describing KDF hash, or legacy SHA-256 hex
+    token_version = db.Column(db.Integer, nullable=False, default=0)  # bumped to revoke issued tokens
+
+    @classmethod
+    def configure_password_hashing(cls, service: PasswordHashingService) -> None:
+        """
+        Set the hashing service used for new hashes and verification.
+
+        Args:
+            service (PasswordHashingService): The service to use from now on.
+        """
+        previous, cls._hashing = cls._hashing, service
+        previous.shutdown()
+
+    @classmethod
+    def configure_record_cache(cls, ttl: float, maxsize: int = 1024) -> None:
+        """
+        Set how long user records are cached for token checks.
+
+        Args:
+            ttl (float): Seconds a cached record is trusted; also the longest a revoked token
+                keeps working on other worker processes. 0 disables the cache.
+            maxsize (int): Maximum number of cached users.
+        """
+        cls._record_cache = TTLCache(maxsize=maxsize, ttl=ttl)
 
     @classmethod
     def _generate_hashed_password(cls, password: str) -> tuple[str, str]:
@@ -29,13 +75,13 @@ class Users(db.Model):
             password (str): The password to hash.
 
         Returns:
-            tuple: A tuple containing the salt and hashed password.
+            tuple: The legacy salt column value (always empty) and the self-describing hash,
+                which embeds its own salt.
         """
-        salt = os.urandom(16).hex()
-        hashed_password = hashlib.sha256((password + salt).encode()).hexdigest()
-        return salt, hashed_password
+        return "", cls._hashing.hash(password)
 
     @classmethod
+    @timed('Users.create_user')
     def create_user(cls, username: str, password: str) -> None:
         """
         Create a new user with a salted, hashed password.
@@ -52,6 +98,7 @@ class Users(db.Model):
         try:
             db.session.add(new_user)
             db.session.commit()
+            cls._record_cache.invalidate(username)
             logger.info("User successfully added to the database: %s", username)
         except IntegrityError:
             db.session.rollback()
@@ -62,6 +109,247 @@ class Users(db.Model):
             logger.error("Database error: %s", str(e))
             raise
 
+    @classmethod
+    @timed('Users.create_users')
+    def create_users(cls, users: Iterable[Mapping], batch_size: int = 500) -> list[dict]:
+        """
+        Create many users, hashing their passwords in parallel and inserting them in batches.
+
+        The input is consumed one batch at a time, so it can be a lazily parsed stream.
+        Each batch checks for existing usernames with a single query and is inserted
+        with one executemany statement in its own transaction.
+
+        Args:
+            users (Iterable[Mapping]): Users to create, each with a 'username' and a 'password'.
+            batch_size (int): The number of users hashed and inserted together.
+
+        Returns:
+            list[dict]: One result per input row, in input order, with the 'username' and a
+                'status' of 'created', 'duplicate' or 'invalid'; rows that were not created
+                also carry an 'error'.
+        """
+        results = []
+        users = iter(users)
+        while True:
+            batch = list(islice(users, batch_size))
+            if not batch:
+                break
+            results.extend(cls._create_user_batch(batch))
+        created = sum(result['status'] == 'created' for result in results)
+        logger.info("Bulk created %d of %d users", created, len(results))
+        return results
+
+    @classmethod
+    def _create_user_batch(cls, batch: list) -> list[dict]:
+        """
+        Validate, hash and insert one batch for `create_users`.
+        """
+        results = []
+        pending = {}  # username -> (result, password)
+        for row in batch:
+            username = row.get('username') if isinstance(row, Mapping) else None
+            password = row.get('password') if isinstance(row, Mapping) else None
+            if not (isinstance(username, str) and isinstance(password, str)) or not username or not password:
+                results.append({'username': username, 'status': 'invalid',
+                                'error': 'Both username and password are required, as strings'})
+            elif username in pending:
+                results.append({'username': username, 'status': 'duplicate',
+                                'error': f"User with username '{username}' already exists"})
+            else:
+                result = {'username': username, 'status': 'created'}
+                pending[username] = (result, password)
+                results.append(result)
+
+        if pending:
+            existing = {name for (name,) in
+                        db.session.query(cls.username).filter(cls.username.in_(list(pending)))}
+            for username in existing:
+                result, _ = pending.pop(username)
+                result.update(status='duplicate', error=f"User with username '{username}' already exists")
+
+        if pending:
+            usernames = list(pending)
+            hashed_passwords = cls._hashing.hash_many([pending[username][1] for username in usernames])
+            rows = [{'username': username, 'salt': '', 'password': hashed_password}
+                    for username, hashed_password in zip(usernames, hashed_passwords)]
+            try:
+                db.session.execute(cls.__table__.insert(), rows)
+                db.session.commit()
+            except IntegrityError:
+                # Another writer created some of these usernames after the check; insert one by one
+                db.session.rollback()
+                cls._insert_rows_individually(rows, pending)
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Database error: %s", str(e))
+                raise
+            for username in usernames:
+                cls._record_cache.invalidate(username)
+        return results
+
+    @classmethod
+    def _insert_rows_individually(cls, rows: list, pending: dict) -> None:
+        """
+        Insert rows one transaction at a time, marking usernames that already exist as duplicates.
+        """
+        for row in rows:
+            try:
+                db.session.execute(cls.__table__.insert(), row)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                pending[row['username']][0].update(
+                    status='duplicate', error=f"User with username '{row['username']}' already exists")
+
+    @classmethod
+    def _get_record(cls, username: str) -> UserRecord:
+        """
+        Returns the id, salt, password hash and token version of a user, from the cache when possible.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            UserRecord: The user's id, salt, hashed password and token version.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        record = cls._record_cache.get(username)
+        if record is not None:
+            return record
+        return cls._load_record(username)
+
+    @classmethod
+    def _load_record(cls, username: str) -> UserRecord:
+        """
+        Loads a user's record with one query, bypassing and then refreshing the cache.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            UserRecord: The user's id, salt, hashed password and token version.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        row = db.session.query(cls.id, cls.salt, cls.password, cls.token_version).filter_by(username=username).first()
+        if not row:
+            logger.info("User %s not found", username)
+            raise ValueError(f"User {username} not found")
+        record = UserRecord(*row)
+        cls._record_cache.set(username, record)
+        return record
+
+    @classmethod
+    @timed('Users.authenticate')
+    def authenticate(cls, username: str, password: str):
+        """
+        Check a user's password and return their ID, using a single credential lookup.
+
+        The credentials are always read from the database, never from the record cache,
+        so a password changed on another worker process takes effect immediately.
+
+        Args:
+            username (str): The username of the user.
+            password (str): The password to check.
+
+        Returns:
+            int: The user's ID if the password is correct, None otherwise.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        record = cls._load_record(username)
+        if not cls._hashing.verify(password, record.password, record.salt):
+            return None
+        if cls._hashing.needs_rehash(record.password):
+            cls._rehash_password(username, record, password)
+        return record.id
+
+    @classmethod
+    def _rehash_password(cls, username: str, record: UserRecord, password: str) -> None:
+        """
+        Re-hash a verified password with the configured algorithm and cost.
+
+        Used to upgrade legacy SHA-256 rows and rows hashed with an older cost. The
+        update only applies if the stored hash is unchanged, so a concurrent password
+        change is never overwritten, and existing tokens stay valid.
+
+        Args:
+            username (str): The username of the user.
+            record (UserRecord): The record the password was verified against.
+            password (str): The verified plain-text password.
+        """
+        salt, hashed_password = cls._generate_hashed_password(password)
+        try:
+            cls.query.filter_by(id=record.id, password=record.password).update(
+                {'salt': salt, 'password': hashed_password})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Failed to upgrade password hash for user %s: %s", username, str(e))
+            return
+        cls._record_cache.invalidate(username)
+        logger.info("Upgraded password hash for user %s", username)
+
+    @classmethod
+    def _token_serializer(cls) -> URLSafeTimedSerializer:
+        return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+    @classmethod
+    def generate_token(cls, username: str) -> str:
+        """
+        Issue a signed access token for a user.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            str: A URL-safe token carrying the user's ID, username and current token version.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        record = cls._get_record(username)
+        return cls._token_serializer().dumps({'uid': record.id, 'usr': username, 'ver': record.token_version})
+
+    @classmethod
+    @timed('Users.verify_token')
+    def verify_token(cls, token: str, max_age: int = None) -> int:
+        """
+        Verify an access token and return the user ID it was issued for.
+
+        The signature and expiry are checked in memory. The token version is compared
+        against the cached user record, so the database is only queried when the
+        record is not cached; a token revoked on another worker process is accepted
+        here until this process's entry expires (USER_RECORD_CACHE_TTL).
+
+        Args:
+            token (str): The token returned by `generate_token`.
+            max_age (int): Maximum token age in seconds, `TOKEN_MAX_AGE` from the app config if omitted.
+
+        Returns:
+            int: The ID of the user the token belongs to.
+
+        Raises:
+            ValueError: If the token is invalid, expired or revoked, or the user no longer exists.
+        """
+        if max_age is None:
+            max_age = current_app.config.get('TOKEN_MAX_AGE', 3600)
+        try:
+            payload = cls._token_serializer().loads(token, max_age=max_age)
+        except SignatureExpired:
+            raise ValueError("Token expired")
+        except BadSignature:
+            raise ValueError("Invalid token")
+
+        record = cls._get_record(payload['usr'])
+        if record.id != payload['uid'] or record.token_version != payload['ver']:
+            raise ValueError("Token revoked")
+        return record.id
+
     @classmethod
     def check_password(cls, username: str, password: str) -> bool:
         """
@@ -77,17 +365,13 @@ class Users(db.Model):
         Raises:
             ValueError: If the user does not exist.
         """
-        user = cls.query.filter_by(username=username).first()
-        if not user:
-            logger.info("User %s not found", username)
-            raise ValueError(f"User {username} not found")
-        hashed_password = hashlib.sha256((password + user.salt).encode()).hexdigest()
-        return hashed_password == user.password
+        return cls.authenticate(username, password) is not None
 
     @classmethod
+    @timed('Users.delete_user')
     def delete_user(cls, username: str) -> None:
         """
-        Delete a user from the database.
+        Delete a user from the database, along with their affirmation collection.
 
         Args:
             username (str): The username of the user to delete.
@@ -99,11 +383,18 @@ class Users(db.Model):
         if not user:
             logger.info("User %s not found", username)
             raise ValueError(f"User {username} not found")
+        user_id = user.id
         db.session.delete(user)
         db.session.commit()
+        cls._record_cache.invalidate(username)
+        # Foreign keys are not enforced, so the user's affirmations are removed here
+        affirmation_model = current_app.extensions.get('affirmation_model')
+        if affirmation_model is not None:
+            affirmation_model.drop_affirmations(user_id)
         logger.info("User %s deleted successfully", username)
 
     @classmethod
+    @timed('Users.get_id_by_username')
     def get_id_by_username(cls, username: str) -> int:
         """
         Retrieve the ID of a user by username.
@@ -117,16 +408,13 @@ class Users(db.Model):
         Raises:
             ValueError: If the user does not exist.
         """
-        user = cls.query.filter_by(username=username).first()
-        if not user:
-            logger.info("User %s not found", username)
-            raise ValueError(f"User {username} not found")
-        return user.id
+        return cls._get_record(username).id
 
     @classmethod
+    @timed('Users.update_password')
     def update_password(cls, username: str, new_password: str) -> None:
         """
-        Update the password for a user.
+        Update the password for a user and revoke their existing tokens.
 
         Args:
             username (str): The username of the user.
@@ -135,13 +423,13 @@ class Users(db.Model):
         Raises:
             ValueError: If the user does not exist.
         """
-        user = cls.query.filter_by(username=username).first()
-        if not user:
+        salt, hashed_password = cls._generate_hashed_password(new_password)
+        updated = cls.query.filter_by(username=username).update(
+            {'salt': salt, 'password': hashed_password, 'token_version': cls.token_version + 1})
+        if not updated:
+            db.session.rollback()
             logger.info("User %s not found", username)
             raise ValueError(f"User {username} not found")
-
-        salt, hashed_password = cls._generate_hashed_password(new_password)
-        user.salt = salt
-        user.password = hashed_password
         db.session.commit()
+        cls._record_cache.invalidate(username)
         logger.info("Password updated successfully for user: %s", username)
\ No newline at end of file
@@ -1,6 +1,117 @@
 DROP TABLE IF EXISTS affirmations;
+DROP TABLE IF EXISTS user_affirmations;
+DROP TABLE IF EXISTS affirmation_counts;
+DROP TABLE IF EXISTS affirmations_fts;
+DROP TABLE IF EXISTS user_affirmations_fts;
 CREATE TABLE affirmations (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     affirmation TEXT NOT NULL UNIQUE,
-    deleted BOOLEAN DEFAULT FALSE
-);
\ No newline at end of file
+    deleted BOOLEAN DEFAULT FALSE,
+    position INTEGER,
+    hits INTEGER NOT NULL DEFAULT 1
+);
+-- Live rows have dense positions in [0, live_count) so a random row is a single index lookup
+CREATE UNIQUE INDEX idx_affirmations_position ON affirmations(position) WHERE deleted = 0;
+
+-- Per-user collections, scoped by Users.id (never reused). Foreign keys are not enforced on these connections,
+-- so Users.delete_user clears the collection itself
+CREATE TABLE user_affirmations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    affirmation TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    deleted BOOLEAN DEFAULT FALSE,
+    position INTEGER,
+    hits INTEGER NOT NULL DEFAULT 1,
+    UNIQUE (user_id, affirmation)
+);
+CREATE UNIQUE INDEX idx_user_affirmations_position ON user_affirmations(user_id, position) WHERE deleted = 0;
+
+-- Live row count and version per collection, maintained by the triggers below (owner 0 is the shared collection,
+-- otherwise a user ID); the version changes whenever a row becomes live or is cleared and backs the routes' ETags
+CREATE TABLE affirmation_counts (
+    owner INTEGER PRIMARY KEY,
+    live_count INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT INTO affirmation_counts (owner, live_count) VALUES (0, 0);
+
+CREATE TRIGGER affirmations_counts_insert
+AFTER INSERT ON affirmations WHEN NEW.deleted = 0
+BEGIN
+    UPDATE affirmation_counts SET live_count = live_count + 1, version = version + 1 WHERE owner = 0;
+END;
+
+CREATE TRIGGER affirmations_counts_update
+AFTER UPDATE OF deleted ON affirmations WHEN OLD.deleted <> NEW.deleted
+BEGIN
+    UPDATE affirmation_counts
+    SET live_count = live_count + CASE WHEN NEW.deleted THEN -1 ELSE 1 END, version = version + 1
+    WHERE owner = 0;
+END;
+
+CREATE TRIGGER user_affirmations_counts_insert
+AFTER INSERT ON user_affirmations WHEN NEW.deleted = 0
+BEGIN
+    INSERT OR IGNORE INTO affirmation_counts (owner, live_count) VALUES (NEW.user_id, 0);
+    UPDATE affirmation_counts SET live_count = live_count + 1, version = version + 1
+    WHERE owner = NEW.user_id;
+END;
+
+CREATE TRIGGER user_affirmations_counts_update
+AFTER UPDATE OF deleted ON user_affirmations WHEN OLD.deleted <> NEW.deleted
+BEGIN
+    UPDATE affirmation_counts
+    SET live_count = live_count + CASE WHEN NEW.deleted THEN -1 ELSE 1 END, version = version + 1
+    WHERE owner = NEW.user_id;
+END;
+
+-- Full-text indexes of the live rows for /search-affirmations, kept in step by the triggers below
+CREATE VIRTUAL TABLE affirmations_fts USING fts5(
+    affirmation, content='affirmations', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 0', prefix='2 3');
+CREATE VIRTUAL TABLE user_affirmations_fts USING fts5(
+    affirmation, user_id UNINDEXED, content='user_affirmations', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 0', prefix='2 3');
+
+CREATE TRIGGER affirmations_fts_insert
+AFTER INSERT ON affirmations WHEN NEW.deleted = 0
+BEGIN
+    INSERT INTO affirmations_fts (rowid, affirmation) VALUES (NEW.id, NEW.affirmation);
+END;
+
+CREATE TRIGGER affirmations_fts_update
+AFTER UPDATE OF deleted ON affirmations WHEN OLD.deleted <> NEW.deleted
+BEGIN
+    INSERT INTO affirmations_fts (affirmations_fts, rowid, affirmation)
+    SELECT 'delete', OLD.id, OLD.affirmation WHERE NEW.deleted;
+    INSERT INTO affirmations_fts (rowid, affirmation) SELECT NEW.id, NEW.affirmation WHERE NOT NEW.deleted;
+END;
+
+CREATE TRIGGER affirmations_fts_delete
+AFTER DELETE ON affirmations WHEN OLD.deleted = 0
+BEGIN
+    INSERT INTO affirmations_fts (affirmations_fts, rowid, affirmation) VALUES ('delete', OLD.id, OLD.affirmation);
+END;
+
+CREATE TRIGGER user_affirmations_fts_insert
+AFTER INSERT ON user_affirmations WHEN NEW.deleted = 0
+BEGIN
+    INSERT INTO user_affirmations_fts (rowid, affirmation, user_id) VALUES (NEW.id, NEW.affirmation, NEW.user_id);
+END;
+
+CREATE TRIGGER user_affirmations_fts_update
+AFTER UPDATE OF deleted ON user_affirmations WHEN OLD.deleted <> NEW.deleted
+BEGIN
+    INSERT INTO user_affirmations_fts (user_affirmations_fts, rowid, affirmation, user_id)
+    SELECT 'delete', OLD.id, OLD.affirmation, OLD.user_id WHERE NEW.deleted;
+    INSERT INTO user_affirmations_fts (rowid, affirmation, user_id)
+    SELECT NEW.id, NEW.affirmation, NEW.user_id WHERE NOT NEW.deleted;
+END;
+
+CREATE TRIGGER user_affirmations_fts_delete
+AFTER DELETE ON user_affirmations WHEN OLD.deleted = 0
+BEGIN
+    INSERT INTO user_affirmations_fts (user_affirmations_fts, rowid, affirmation, user_id)
+    VALUES ('delete', OLD.id, OLD.affirmation, OLD.user_id);
+END;
@@ -0,0 +1,684 @@
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from models.affirmation_store import (CompactAffirmationStore, InMemoryAffirmationStore, MappedAffirmationStore,
+                                      SQLiteAffirmationStore, _Arena)
+
+
+class TestInMemoryAffirmationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = InMemoryAffirmationStore()
+
+    def test_add_and_get_all(self):
+        self.store.add("Stay positive")
+        self.store.add_many(["You got this", "Keep going"])
+
+        self.assertEqual(self.store.get_all(), ["Stay positive", "You got this", "Keep going"])
+        self.assertEqual(self.store.count(), 3)
+
+    def test_clear(self):
+        self.store.add_many(["Stay positive", "You got this"])
+        self.store.clear()
+
+        self.assertEqual(self.store.get_all(), [])
+        self.assertEqual(self.store.count(), 0)
+
+    def test_duplicates_stored_once(self):
+        self.store.add_many(["Stay positive", "You got this", "Stay positive", "Stay positive"])
+
+        self.assertEqual(self.store.get_all(), ["Stay positive", "You got this"])
+        self.assertEqual(self.store.count(), 2)
+        self.assertEqual(self.store.hits("Stay positive"), 3)
+        self.assertEqual(self.store.hits("Keep going"), 0)
+
+    def test_clear_resets_hits(self):
+        self.store.add_many(["Stay positive", "Stay positive"])
+        self.store.clear()
+        self.store.add("Stay positive")
+
+        self.assertEqual(self.store.hits("Stay positive"), 1)
+
+    def test_sample(self):
+        self.store.add_many(["Stay positive", "You got this", "Keep going"])
+
+        sample = self.store.sample(2)
+        self.assertEqual(len(sample), 2)
+        self.assertEqual(len(set(sample)), 2)
+        self.assertEqual(len(self.store.sample(10)), 3)
+
+    def test_sample_empty(self):
+        self.assertEqual(self.store.sample(1), [])
+
+    def test_scoped_store_is_separate(self):
+        scoped = self.store.scoped(1)
+        scoped.add("Stay positive")
+
+        self.assertEqual(scoped.get_all(), ["Stay positive"])
+        self.assertEqual(self.store.count(), 0)
+
+    def test_version_changes_with_contents(self):
+        #new affirmations and clears bump the version, repeats do not
+        start = self.store.version()
+        self.store.add("Stay positive")
+        added = self.store.version()
+        self.store.add("Stay positive")
+
+        self.assertGreater(added, start)
+        self.assertEqual(self.store.version(), added)
+        self.store.clear()
+        self.assertGreater(self.store.version(), added)
+
+    def test_page(self):
+        self.store.add_many(["Stay positive", "You got this", "Keep going"])
+
+        first, cursor = self.store.page(limit=2)
+        second, last_cursor = self.store.page(after=cursor, limit=2)
+
+        self.assertEqual(first, ["Stay positive", "You got this"])
+        self.assertEqual(second, ["Keep going"])
+        self.assertIsNone(last_cursor)
+
+    def test_search_ranks_matches(self):
+        #every word must match, and more occurrences in a shorter text rank higher
+        self.store.add_many(["You are strong and brave", "Be brave today, be brave", "Stay positive"])
+
+        self.assertEqual(self.store.search("brave"), (["Be brave today, be brave", "You are strong and brave"], None))
+        self.assertEqual(self.store.search("BRAVE strong!"), (["You are strong and brave"], None))
+        self.assertEqual(self.store.search("brave calm"), ([], None))
+
+    def test_search_prefix_and_pages(self):
+        self.store.add_many(["Strength comes from within", "You are strong", "Stay positive"])
+
+        first, cursor = self.store.search("str*", limit=1)
+        second, last_cursor = self.store.search("str*", after=cursor, limit=1)
+
+        self.assertEqual(sorted(first + second), ["Strength comes from within", "You are strong"])
+        self.assertIsNone(last_cursor)
+
+    def test_search_after_clear(self):
+        self.store.add("Be brave")
+        self.store.clear()
+        self.store.add("Stay brave")
+
+        self.assertEqual(self.store.search("brave"), (["Stay brave"], None))
+
+    def test_search_without_words(self):
+        with self.assertRaises(ValueError):
+            self.store.search("*?!")
+
+
+class TestCompactAffirmationStore(TestInMemoryAffirmationStore):
+    #runs every in-memory store test against the compact store too
+
+    def setUp(self):
+        self.store = CompactAffirmationStore()
+
+    def test_scoped_store_is_compact(self):
+        self.assertIsInstance(self.store.scoped(1), CompactAffirmationStore)
+
+    def test_non_ascii_round_trip(self):
+        self.store.add_many(["Café ☕ time", "Ünïcödé 🌞", ""])
+
+        self.assertEqual(self.store.get_all(), ["Café ☕ time", "Ünïcödé 🌞", ""])
+        self.assertEqual(self.store.hits("Ünïcödé 🌞"), 1)
+        self.assertEqual(self.store.search("café"), (["Café ☕ time"], None))
+
+    def test_many_affirmations_across_chunks(self):
+        #texts spread over several small chunks, and the dedup table grows, without losing any
+        texts = [f"affirmation number {i}" for i in range(500)] + ["x" * 100]
+        with patch.object(_Arena, 'CHUNK_SIZE', 64):
+            self.store.add_many(texts + texts[:10])
+
+        self.assertEqual(self.store.get_all(), texts)
+        self.assertEqual(self.store.hits("affirmation number 3"), 2)
+        self.assertEqual(self.store.hits("affirmation number 499"), 1)
+        self.assertEqual(self.store.page(after=497, limit=5), (texts[498:], None))
+        self.assertGreater(len(self.store._segment.affirmations._chunks), 10)
+
+    def test_views_are_zero_copy(self):
+        self.store.add_many(["Stay positive", "You got this", "Keep going"])
+
+        views, cursor = self.store.views(limit=2)
+
+        self.assertEqual([bytes(view) for view in views], [b"Stay positive", b"You got this"])
+        self.assertEqual(cursor, 1)
+        self.assertIs(views[0].obj, views[1].obj)
+
+    def test_reads_survive_concurrent_appends(self):
+        #readers holding views never block a writer filling the same chunk
+        self.store.add("Stay positive")
+        views, _ = self.store.views()
+        self.store.add_many(f"affirmation {i}" for i in range(100))
+
+        self.assertEqual(bytes(views[0]), b"Stay positive")
+        self.assertEqual(self.store.count(), 101)
+
+
+class TestSQLiteAffirmationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = SQLiteAffirmationStore(":memory:", batch_size=3)
+
+    def tearDown(self):
+        self.store.close()
+
+    def stored_rows(self):
+        return self.store._conn.execute("SELECT COUNT(*) FROM affirmations").fetchone()[0]
+
+    def test_add_and_get_all(self):
+        self.store.add("Stay positive")
+        self.store.add_many(["You got this", "Keep going"])
+
+        self.assertEqual(self.store.get_all(), ["Stay positive", "You got this", "Keep going"])
+        self.assertEqual(self.store.count(), 3)
+
+    def test_writes_are_batched(self):
+        #writes stay pending until the batch is full
+        self.store.add("Stay positive")
+        self.store.add("You got this")
+        self.assertEqual(self.stored_rows(), 0)
+
+        self.store.add("Keep going")
+        self.assertEqual(self.stored_rows(), 3)
+
+    def test_read_flushes_pending(self):
+        self.store.add("Stay positive")
+
+        self.assertEqual(self.store.count(), 1)
+
+    def test_failed_flush_keeps_pending(self):
+        #rows that fail to write stay pending and are written by the next flush
+        self.store.INSERT_SQL = "INSERT INTO missing_table VALUES (:affirmation)"
+        self.store.add_many(["Stay positive", "You got this"])
+
+        self.assertEqual(self.store.count(), 0)
+        with self.assertRaises(sqlite3.Error):
+            self.store.flush()
+
+        del self.store.INSERT_SQL
+        self.store.flush()
+        self.assertEqual(self.stored_rows(), 2)
+
+    def test_sample_with_failing_flush(self):
+        #a pending write that keeps failing does not break sampling the stored rows
+        self.store.add_many(["Stay positive", "You got this", "Keep going"])
+        self.store.INSERT_SQL = "INSERT INTO missing_table VALUES (:affirmation)"
+        self.store.add("Believe in yourself")
+
+        self.assertEqual(len(self.store.sample(2)), 2)
+        self.assertFalse(self.store._conn.in_transaction)
+        del self.store.INSERT_SQL
+
+    def test_clear_soft_deletes(self):
+        #cleared rows are kept with the deleted flag set
+        self.store.add_many(["Stay positive", "You got this"])
+        self.store.clear()
+
+        self.assertEqual(self.store.get_all(), [])
+        self.assertEqual(self.store.count(), 0)
+        deleted = self.store._conn.execute("SELECT COUNT(*) FROM affirmations WHERE deleted = 1").fetchone()[0]
+        self.assertEqual(deleted, 2)
+
+    def test_readding_cleared_affirmation(self):
+        #a cleared affirmation stored again is revived instead of violating UNIQUE
+        self.store.add("Stay positive")
+        self.store.clear()
+        self.store.add("Stay positive")
+
+        self.assertEqual(self.store.get_all(), ["Stay positive"])
+        self.assertEqual(self.store.count(), 1)
+        self.assertEqual(self.stored_rows(), 1)
+
+    def test_duplicates_stored_once(self):
+        #repeats in the same batch and across batches only add hits
+        self.store.add_many(["Stay positive", "You got this", "Stay positive"])
+        self.store.flush()
+        self.store.add("Stay positive")
+
+        self.assertEqual(self.store.get_all(), ["Stay positive", "You got this"])
+        self.assertEqual(self.store.count(), 2)
+        self.assertEqual(self.store.hits("Stay positive"), 3)
+        self.assertEqual(self.stored_rows(), 2)
+
+    def test_clear_resets_hits(self):
+        self.store.add_many(["Stay positive", "Stay positive"])
+        self.store.clear()
+        self.store.add("Stay positive")
+
+        self.assertEqual(self.store.hits("Stay positive"), 1)
+        self.assertEqual(self.store.count(), 1)
+
+    def test_count_uses_counter_table(self):
+        self.store.add_many(["Stay positive", "You got this", "Keep going"])
+        self.store.flush()
+
+        row = self.store._conn.execute("SELECT live_count FROM affirmation_counts WHERE owner = 0").fetchone()
+        self.assertEqual(row[0], 3)
+
+    def test_page(self):
+        self.store.add_many([f"affirmation {i}" for i in range(5)])
+
+        first, cursor = self.store.page(limit=2)
+        second, cursor = self.store.page(after=cursor, limit=2)
+        third, cursor = self.store.page(after=cursor, limit=2)
+
+        self.assertEqual(first + second + third, [f"affirmation {i}" for i in range(5)])
+        self.assertIsNone(cursor)
+
+    def test_page_exact_fit(self):
+        #a page that ends exactly on the last affirmation has no next cursor
+        self.store.add_many(["Stay positive", "You got this"])
+
+        affirmations, cursor = self.store.page(limit=2)
+
+        self.assertEqual(len(affirmations), 2)
+        self.assertIsNone(cursor)
+
+    def test_page_skips_cleared(self):
+        self.store.add_many(["Stay positive", "You got this"])
+        self.store.clear()
+        self.store.add("Keep going")
+
+        self.assertEqual(self.store.page(limit=10), (["Keep going"], None))
+
+    def test_page_uses_position_index(self):
+        plan = self.store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT position, affirmation FROM affirmations "
+            "WHERE deleted = 0 AND position > 10 ORDER BY position LIMIT 50").fetchall()
+        self.assertIn("idx_affirmations_position", plan[0][-1])
+
+    def test_search_ranks_matches(self):
+        #the FTS5 index ranks like the in-memory store
+        self.store.add_many(["You are strong and brave", "Be brave today, be brave", "Stay positive"])
+
+        self.assertEqual(self.store.search("brave"), (["Be brave today, be brave", "You are strong and brave"], None))
+        self.assertEqual(self.store.search("BRAVE strong!"), (["You are strong and brave"], None))
+        self.assertEqual(self.store.search("str*"), (["You are strong and brave"], None))
+
+    def test_search_pages(self):
+        self.store.add_many([f"Keep going {i}" for i in range(5)])
+
+        first, cursor = self.store.search("keep", limit=3)
+        second, last_cursor = self.store.search("keep", after=cursor, limit=3)
+
+        self.assertEqual(sorted(first + second), sorted(f"Keep going {i}" for i in range(5)))
+        self.assertIsNone(last_cursor)
+
+    def test_search_follows_clear_and_revive(self):
+        #cleared rows leave the index and come back when stored again
+        self.store.add_many(["Be brave", "Stay calm"])
+        self.store.clear()
+        self.assertEqual(self.store.search("brave"), ([], None))
+
+        self.store.add("Be brave")
+        self.assertEqual(self.store.search("brave"), (["Be brave"], None))
+
+    def test_search_quotes_query_syntax(self):
+        #FTS5 operators in the query are treated as plain words
+        self.store.add("Stay positive OR negative")
+
+        self.assertEqual(self.store.search('positive OR "negative('), (["Stay positive OR negative"], None))
+        self.assertEqual(self.store.search("positive -calm"), ([], None))
+
+    def test_indexes_existing_rows_on_upgrade(self):
+        #a database created before the search index gets its live rows indexed on open
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "affirmations.db")
+            conn = sqlite3.connect(path)
+            conn.executescript("""
+                CREATE TABLE affirmations (id INTEGER PRIMARY KEY AUTOINCREMENT, affirmation TEXT NOT NULL UNIQUE,
+                                           deleted BOOLEAN DEFAULT FALSE);
+                INSERT INTO affirmations (affirmation, deleted) VALUES ('Be brave', 0), ('Stay brave', 1);
+            """)
+            conn.close()
+
+            store = SQLiteAffirmationStore(path)
+            self.assertEqual(store.search("brave"), (["Be brave"], None))
+            store.close()
+
+    def test_sample_without_replacement(self):
+        self.store.add_many(["Stay positive", "You got this", "Keep going"])
+
+        sample = self.store.sample(3)
+        self.assertEqual(sorted(sample), ["Keep going", "Stay positive", "You got this"])
+        self.assertEqual(len(self.store.sample(10)), 3)
+
+    def test_sample_skips_cleared(self):
+        #only affirmations stored after a clear can be sampled
+        self.store.add_many(["Stay positive", "You got this"])
+        self.store.clear()
+        self.assertEqual(self.store.sample(1), [])
+
+        self.store.add_many(["Keep going", "Stay positive"])
+        self.assertEqual(sorted(self.store.sample(5)), ["Keep going", "Stay positive"])
+
+    def test_sample_uses_position_index(self):
+        plan = self.store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT affirmation FROM affirmations WHERE deleted = 0 AND position = 1").fetchall()
+        self.assertIn("idx_affirmations_position", plan[0][-1])
+
+    def test_sample_during_concurrent_writes(self):
+        #sampling never fails or returns a cleared affirmation while others insert and clear
+        errors = []
+        stop = threading.Event()
+
+        def writer():
+            i = 0
+            while not stop.is_set():
+                self.store.add(f"affirmation {i}")
+                i += 1
+                if i % 50 == 0:
+                    self.store.clear()
+
+        def reader():
+            try:
+                for _ in range(300):
+                    live = set(self.store.get_all())
+                    for affirmation in self.store.sample(3):
+                        self.assertTrue(affirmation.startswith("affirmation"))
+                    self.assertLessEqual(len(live), 50)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads[1:]:
+            thread.join()
+        stop.set()
+        threads[0].join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(self.store.sample(100)), sorted(self.store.get_all()))
+
+    def test_version_changes_with_contents(self):
+        #the version covers pending writes and only moves when the live set changes
+        start = self.store.version()
+        self.store.add("Stay positive")
+        added = self.store.version()
+        self.store.add("Stay positive")
+
+        self.assertGreater(added, start)
+        self.assertEqual(self.store.version(), added)
+        self.store.clear()
+        self.assertGreater(self.store.version(), added)
+
+    def test_version_shared_between_connections(self):
+        #every connection to the file sees the same version
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "affirmations.db")
+            writer, reader = SQLiteAffirmationStore(path), SQLiteAffirmationStore(path)
+            before = reader.version()
+            writer.add("Stay positive")
+            writer.flush()
+
+            self.assertEqual(reader.version(), writer.version())
+            self.assertGreater(reader.version(), before)
+            writer.close()
+            reader.close()
+
+    def test_migrates_original_schema(self):
+        #tables created from the original SQL script get positions backfilled
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "affirmations.db")
+            conn = sqlite3.connect(path)
+            conn.executescript("""
+                CREATE TABLE affirmations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    affirmation TEXT NOT NULL UNIQUE,
+                    deleted BOOLEAN DEFAULT FALSE
+                );
+                INSERT INTO affirmations (affirmation, deleted) VALUES ('Stay positive', 0), ('Old', 1), ('Keep going', 0);
+            """)
+            conn.close()
+
+            store = SQLiteAffirmationStore(path)
+            self.assertEqual(store.count(), 2)
+            self.assertEqual(sorted(store.sample(2)), ["Keep going", "Stay positive"])
+            version = store.version()
+            store.add("You got this")
+            self.assertEqual(store.get_all(), ["Stay positive", "Keep going", "You got this"])
+            self.assertGreater(store.version(), version)
+            store.close()
+
+    def test_persists_across_connections(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "affirmations.db")
+            store = SQLiteAffirmationStore(path)
+            store.add_many(["Stay positive", "You got this"])
+            store.close()
+
+            reopened = SQLiteAffirmationStore(path)
+            self.assertEqual(reopened.get_all(), ["Stay positive", "You got this"])
+            self.assertEqual(reopened.count(), 2)
+            reopened.close()
+
+class TestSQLiteUserAffirmationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = SQLiteAffirmationStore(":memory:", batch_size=3)
+        self.alice = self.store.scoped(1)
+        self.bob = self.store.scoped(2)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_collections_are_separate(self):
+        self.alice.add_many(["Stay positive", "You got this"])
+        self.bob.add("Keep going")
+        self.store.add("Believe in yourself.")
+
+        self.assertEqual(self.alice.get_all(), ["Stay positive", "You got this"])
+        self.assertEqual(self.bob.get_all(), ["Keep going"])
+        self.assertEqual(self.store.get_all(), ["Believe in yourself."])
+        self.assertEqual(self.alice.count(), 2)
+        self.assertEqual(self.bob.count(), 1)
+
+    def test_same_affirmation_for_two_users(self):
+        #the same text can be owned by several users, each with their own hits
+        self.alice.add_many(["Stay positive", "Stay positive"])
+        self.bob.add("Stay positive")
+
+        self.assertEqual(self.alice.hits("Stay positive"), 2)
+        self.assertEqual(self.bob.hits("Stay positive"), 1)
+
+    def test_clear_only_affects_owner(self):
+        self.alice.add("Stay positive")
+        self.bob.add("Keep going")
+        self.alice.clear()
+
+        self.assertEqual(self.alice.count(), 0)
+        self.assertEqual(self.alice.sample(1), [])
+        self.assertEqual(self.bob.get_all(), ["Keep going"])
+
+    def test_page_and_sample(self):
+        self.alice.add_many([f"affirmation {i}" for i in range(5)])
+        self.bob.add("Keep going")
+
+        first, cursor = self.alice.page(limit=3)
+        second, cursor = self.alice.page(after=cursor, limit=3)
+
+        self.assertEqual(first + second, [f"affirmation {i}" for i in range(5)])
+        self.assertIsNone(cursor)
+        self.assertEqual(sorted(self.alice.sample(10)), [f"affirmation {i}" for i in range(5)])
+
+    def test_search_only_owner(self):
+        self.alice.add("Stay brave")
+        self.bob.add("Be brave")
+        self.store.add("Brave shared")
+
+        self.assertEqual(self.alice.search("brave"), (["Stay brave"], None))
+        self.assertEqual(self.store.search("brave"), (["Brave shared"], None))
+
+    def test_queries_use_owner_index(self):
+        for sql in ("SELECT affirmation FROM user_affirmations WHERE user_id = 1 AND deleted = 0 AND position = 3",
+                    "SELECT position, affirmation FROM user_affirmations WHERE user_id = 1 AND deleted = 0 "
+                    "AND position > 10 ORDER BY position LIMIT 50"):
+            plan = self.store._conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            self.assertIn("idx_user_affirmations_position", plan[0][-1])
+
+
+class TestSQLiteAffirmationStoreFork(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteAffirmationStore(os.path.join(self.tmp.name, "affirmations.db"), batch_size=1)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_after_fork_uses_own_connection(self):
+        #a forked child writes through its own connection and the parent sees the rows
+        self.store.add("Before fork")
+        inherited = self.store._conn
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                self.store.after_fork()
+                self.store.add("From child")
+                self.store.flush()
+                code = 0 if self.store._conn is not inherited and self.store.count() == 2 else 1
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(self.store.get_all(), ["Before fork", "From child"])
+
+
+class TestMappedAffirmationStore(TestInMemoryAffirmationStore):
+    #runs every in-memory store test against the mapped store too
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "affirmations.log")
+        self.store = MappedAffirmationStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_reads_from_new_store(self):
+        #a store nothing was written to yet reads as empty instead of mapping its empty files
+        user_store = self.store.scoped(3)
+        for store in (self.store, user_store):
+            self.assertEqual(store.get_all(), [])
+            self.assertEqual(store.page(limit=10), ([], None))
+            self.assertEqual(store.sample(2), [])
+            self.assertEqual(store.search("positive"), ([], None))
+        user_store.close()
+        user_store.close()
+
+    def test_stores_on_one_file_share_data(self):
+        #another handle on the same file, as another worker would have, sees every write
+        other = MappedAffirmationStore(self.path)
+        self.store.add_many(["Stay positive", "Keep going"])
+        other.add_many(["Keep going", "You got this"])
+
+        self.assertEqual(self.store.get_all(), ["Stay positive", "Keep going", "You got this"])
+        self.assertEqual(self.store.hits("Keep going"), 2)
+        self.assertEqual(other.version(), self.store.version())
+
+        other.clear()
+        self.assertEqual(self.store.count(), 0)
+        other.close()
+
+    def test_persists_across_opens(self):
+        self.store.add_many(["Stay positive", "Keep going"])
+        self.store.close()
+
+        self.store = MappedAffirmationStore(self.path)
+        self.assertEqual(self.store.get_all(), ["Stay positive", "Keep going"])
+        self.assertEqual(self.store.hits("Stay positive"), 1)
+
+    def test_grows_past_initial_sizes(self):
+        texts = [f"affirmation number {i}" for i in range(3000)]
+        self.store.add_many(texts)
+        self.store.add_many(texts[:10])
+
+        self.assertEqual(self.store.count(), 3000)
+        self.assertEqual(self.store.page(after=2996, limit=5), (texts[2997:], None))
+        self.assertEqual(self.store.hits("affirmation number 5"), 2)
+
+    def test_torn_tail_dropped(self):
+        #a record whose bytes never fully reached the file is dropped when the store is next opened
+        self.store.add_many(["Stay positive", "Keep going"])
+        self.store.close()
+        with open(self.path + ".idx", "rb") as index:
+            offset = struct.unpack_from("<Q", index.read(), 16)[0]
+        with open(self.path, "r+b") as data:
+            data.seek(offset + 8)
+            data.write(b"XX")
+
+        self.store = MappedAffirmationStore(self.path)
+        self.assertEqual(self.store.get_all(), ["Stay positive"])
+        self.store.add("Keep going")
+        self.assertEqual(self.store.get_all(), ["Stay positive", "Keep going"])
+
+    def test_unpublished_append_ignored(self):
+        #a writer that died mid-batch leaves its records unpublished, and the next writer overwrites them
+        self.store.add("Stay positive")
+        with open(self.path, "r+b") as data:
+            end = struct.unpack_from("<Q", data.read(64), 40)[0]
+            data.seek(12)
+            data.write(struct.pack("<I", 1))
+            data.seek(end)
+            data.write(struct.pack("<II", 50, 0) + b"torn")
+
+        self.assertEqual(self.store.count(), 1)
+        self.store.add("Keep going")
+        self.assertEqual(MappedAffirmationStore(self.path).get_all(), ["Stay positive", "Keep going"])
+
+    def test_missing_hash_table_rebuilt(self):
+        self.store.add_many(["Stay positive", "Keep going"])
+        self.store.close()
+        os.remove(self.path + ".hash")
+
+        self.store = MappedAffirmationStore(self.path)
+        self.store.add("Stay positive")
+        self.assertEqual(self.store.get_all(), ["Stay positive", "Keep going"])
+        self.assertEqual(self.store.hits("Stay positive"), 2)
+
+    def test_rejects_other_files(self):
+        with open(self.path + ".other", "wb") as other:
+            other.write(b"not an affirmation store")
+        with self.assertRaises(ValueError):
+            MappedAffirmationStore(self.path + ".other")
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_concurrent_writers_in_forked_workers(self):
+        #appends from several processes are serialized by the file lock and deduplicated across them
+        self.store.add("Before fork")
+        pids = []
+        for worker in range(3):
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    self.store.after_fork()
+                    for i in range(100):
+                        self.store.add_many([f"shared {i}", f"worker {worker} item {i}"])
+                    code = 0
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+        for pid in pids:
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+        affirmations = self.store.get_all()
+        self.assertEqual(len(affirmations), 401)
+        self.assertEqual(len(set(affirmations)), 401)
+        self.assertEqual(self.store.hits("shared 42"), 3)
+
+if __name__ == '__main__':
+    unittest.main()
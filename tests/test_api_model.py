@@ -1,14 +1,22 @@
+import asyncio
+import os
+import random
+import tempfile
+import threading
 import unittest
-from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, patch, MagicMock
 import requests
+from models.affirmation_store import MappedAffirmationStore, SQLiteAffirmationStore
 from models.api_model import AffirmationModel
+from utils.async_http_client import AsyncResponse
 
 class TestAffirmationModel(unittest.TestCase):
 
     def setUp(self):
         self.model = AffirmationModel()
 
-    @patch('models.api_model.requests.get')
+    @patch('models.api_model.upstream_client.get')
     def test_fetch_affirmation_success(self, mock_get):
         #mock an accomplished API response
         mock_response = MagicMock()
@@ -21,7 +29,7 @@ class TestAffirmationModel(unittest.TestCase):
         self.assertEqual(result, "You are amazing!")
         self.assertIn("You are amazing!", self.model.affirmations)
 
-    @patch('models.api_model.requests.get')
+    @patch('models.api_model.upstream_client.get')
     def test_fetch_affirmation_no_affirmation(self, mock_get):
         #mock API response with no affirmation
         mock_response = MagicMock()
@@ -34,7 +42,7 @@ class TestAffirmationModel(unittest.TestCase):
         self.assertIsNone(result)
         self.assertEqual(len(self.model.affirmations), 0)
 
-    @patch('models.api_model.requests.get')
+    @patch('models.api_model.upstream_client.get')
     def test_fetch_affirmation_api_error(self, mock_get):
         #mock a failed API call
         mock_get.side_effect = requests.exceptions.RequestException("API error")
@@ -44,9 +52,24 @@ class TestAffirmationModel(unittest.TestCase):
         self.assertEqual(result, "API error")
         self.assertEqual(len(self.model.affirmations), 0)
 
+    @patch('models.api_model.upstream_client.get')
+    def test_fetch_duplicate_affirmation(self, mock_get):
+        #fetching the same affirmation twice stores it once with two hits
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"affirmation": "You are amazing!"}
+        mock_get.return_value = mock_response
+
+        self.model.fetch_affirmation()
+        result = self.model.fetch_affirmation()
+
+        self.assertEqual(result, "You are amazing!")
+        self.assertEqual(self.model.get_all_affirmations(), ["You are amazing!"])
+        self.assertEqual(self.model.get_affirmation_hits("You are amazing!"), 2)
+
     def test_get_all_affirmations(self):
         #add affirmations manually
-        self.model.affirmations = ["Stay positive", "You got this"]
+        self.model.store.add_many(["Stay positive", "You got this"])
 
         result = self.model.get_all_affirmations()
 
@@ -54,14 +77,14 @@ class TestAffirmationModel(unittest.TestCase):
 
     def test_clear_affirmations(self):
         #add affirmations manually and then clear them
-        self.model.affirmations = ["Stay positive", "You got this"]
+        self.model.store.add_many(["Stay positive", "You got this"])
         self.model.clear_affirmations()
 
         self.assertEqual(len(self.model.affirmations), 0)
 
     def test_get_affirmation_count(self):
         #add affirmations manually and check the count
-        self.model.affirmations = ["Stay positive", "You got this"]
+        self.model.store.add_many(["Stay positive", "You got this"])
 
         result = self.model.get_affirmation_count()
 
@@ -69,8 +92,8 @@ class TestAffirmationModel(unittest.TestCase):
 
     def test_fetch_multiple_affirmations(self):
         #mock fetching multiple affirmations
-        self.model.affirmations = ["You are strong", "Keep going"]
-        self.model.affirmations.append("You are amazing!")
+        self.model.store.add_many(["You are strong", "Keep going"])
+        self.model.store.add("You are amazing!")
 
         result = self.model.get_all_affirmations()
         self.assertEqual(len(result), 3)
@@ -85,5 +108,345 @@ class TestAffirmationModel(unittest.TestCase):
         #check affirmation count immediately after initialization
         self.assertEqual(self.model.get_affirmation_count(), 0)
 
+    def test_get_random_affirmation(self):
+        self.model.store.add_many(["Stay positive", "You got this"])
+
+        result = self.model.get_random_affirmation()
+
+        self.assertIn(result, ["Stay positive", "You got this"])
+
+    def test_get_random_affirmation_empty(self):
+        self.assertIsNone(self.model.get_random_affirmation())
+
+    def test_get_affirmations_page(self):
+        self.model.store.add_many(["Stay positive", "You got this", "Keep going"])
+
+        affirmations, cursor = self.model.get_affirmations_page(limit=2)
+
+        self.assertEqual(affirmations, ["Stay positive", "You got this"])
+        self.assertEqual(self.model.get_affirmations_page(after=cursor, limit=2), (["Keep going"], None))
+
+    def test_search_affirmations(self):
+        self.model.store.add_many(["Stay positive", "Be brave", "You are brave and strong"])
+
+        self.assertEqual(self.model.search_affirmations("brave", limit=1), (["Be brave"], 0))
+        self.assertEqual(self.model.search_affirmations("brave", user_id=1), ([], None))
+
+    def test_iter_affirmation_pages(self):
+        self.model.store.add_many([f"affirmation {i}" for i in range(5)])
+
+        pages = list(self.model.iter_affirmation_pages(page_size=2))
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+
+    @patch('models.api_model.upstream_client.get')
+    def test_fetch_affirmation_for_user(self, mock_get):
+        #affirmations fetched for a user only show up in that user's collection
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"affirmation": "You are amazing!"}
+        mock_get.return_value = mock_response
+
+        self.model.fetch_affirmation(user_id=1)
+
+        self.assertEqual(self.model.get_all_affirmations(user_id=1), ["You are amazing!"])
+        self.assertEqual(self.model.get_affirmation_count(user_id=1), 1)
+        self.assertEqual(self.model.get_affirmation_count(user_id=2), 0)
+        self.assertEqual(self.model.get_affirmation_count(), 0)
+
+    def test_clear_affirmations_for_user(self):
+        self.model.store.add("Stay positive")
+        self.model._store_for(1).add("You got this")
+
+        self.model.clear_affirmations(user_id=1)
+
+        self.assertEqual(self.model.get_affirmation_count(user_id=1), 0)
+        self.assertEqual(self.model.get_all_affirmations(), ["Stay positive"])
+
+    def test_open_user_stores_capped(self):
+        #file-backed user stores beyond the limit are dropped least recently used first and reopened on demand
+        with tempfile.TemporaryDirectory() as tmp:
+            store = MappedAffirmationStore(os.path.join(tmp, "affirmations.log"))
+            store.scoped_limit = 2
+            model = AffirmationModel(store=store)
+            model._store_for(1).add("Stay positive")
+            model._store_for(2)
+            model._store_for(1)
+            model._store_for(3)
+
+            self.assertEqual(list(model._user_stores), [1, 3])
+            self.assertEqual(model.get_all_affirmations(user_id=1), ["Stay positive"])
+            self.assertEqual(model.get_affirmation_count(user_id=2), 0)
+            for user_store in list(model._user_stores.values()) + [store]:
+                user_store.close()
+
+    def test_after_fork_resets_per_process_state(self):
+        #connections and pools are recreated after fork; per-user stores move to the new connection
+        client = MagicMock()
+        model = AffirmationModel(client=client, async_client=MagicMock(),
+                                 store=SQLiteAffirmationStore(":memory:"))
+        model.enable_coalescing(window=1.5)
+        user_store = model._store_for(7)
+        model._get_fetch_pool()
+
+        model.after_fork()
+
+        client.after_fork.assert_called_once()
+        model.async_client.after_fork.assert_called_once()
+        self.assertIsNone(model._fetch_pool)
+        self.assertIs(model._store_for(7), user_store)
+        self.assertIs(user_store._conn, model.store._conn)
+        self.assertEqual(model.single_flight.window, 1.5)
+
+    def test_sample_affirmations(self):
+        self.model.store.add_many(["Stay positive", "You got this", "Keep going"])
+
+        result = self.model.sample_affirmations(2)
+
+        self.assertEqual(len(set(result)), 2)
+
+
+CORPUS = [f"Affirmation {i}" for i in range(20)]
+
+
+def random_response(*args, **kwargs):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {"affirmation": random.choice(CORPUS)}
+    return response
+
+
+@patch('models.api_model.upstream_client.get', side_effect=random_response)
+class TestAffirmationModelConcurrency(unittest.TestCase):
+
+    def make_models(self):
+        return [AffirmationModel(), AffirmationModel(store=SQLiteAffirmationStore(":memory:", batch_size=8))]
+
+    def test_concurrent_fetches_lose_nothing(self, mock_get):
+        #every fetch is either stored or counted as a hit, never lost or duplicated
+        for model in self.make_models():
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                results = list(pool.map(lambda _: model.fetch_affirmation(), range(400)))
+
+            stored = model.get_all_affirmations()
+            self.assertEqual(len(stored), len(set(results)))
+            self.assertEqual(sorted(stored), sorted(set(results)))
+            self.assertEqual(sum(model.get_affirmation_hits(a) for a in stored), 400)
+            self.assertEqual(model.get_affirmation_count(), len(stored))
+
+    def test_concurrent_fetch_view_clear(self, mock_get):
+        #readers always see a consistent snapshot while others fetch and clear
+        def operation(i):
+            kind = i % 10
+            if kind == 0:
+                model.clear_affirmations()
+            elif kind < 6:
+                model.fetch_affirmation()
+            elif kind < 8:
+                snapshot = model.get_all_affirmations()
+                self.assertEqual(len(snapshot), len(set(snapshot)))
+                self.assertTrue(set(snapshot) <= set(CORPUS))
+            elif kind == 8:
+                self.assertLessEqual(model.get_affirmation_count(), len(CORPUS))
+            else:
+                affirmation = model.get_random_affirmation()
+                self.assertTrue(affirmation is None or affirmation in CORPUS)
+
+        for model in self.make_models():
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                for future in [pool.submit(operation, i) for i in range(600)]:
+                    future.result()
+
+            snapshot = model.get_all_affirmations()
+            self.assertEqual(model.get_affirmation_count(), len(snapshot))
+
+    def test_snapshot_not_affected_by_later_writes(self, mock_get):
+        model = AffirmationModel()
+        model.store.add_many(["Stay positive", "You got this"])
+
+        snapshot = model.get_all_affirmations()
+        model.fetch_affirmation()
+        model.clear_affirmations()
+
+        self.assertEqual(snapshot, ["Stay positive", "You got this"])
+
+class TestAffirmationModelFetchMany(unittest.TestCase):
+
+    @patch('models.api_model.upstream_client.get')
+    def test_fetch_many_dedupes_and_stores_once(self, mock_get):
+        responses = iter(["Stay positive", "You got this", "Stay positive", "Keep going"])
+
+        def response(url):
+            mock_response = MagicMock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = {"affirmation": next(responses)}
+            return mock_response
+        mock_get.side_effect = response
+        model = AffirmationModel(fetch_workers=1)
+
+        with patch.object(model.store, 'add_many', wraps=model.store.add_many) as add_many:
+            result = model.fetch_many(4)
+
+        self.assertEqual(result, {"affirmations": ["Stay positive", "You got this", "Keep going"], "errors": []})
+        add_many.assert_called_once()
+        self.assertEqual(model.get_affirmation_hits("Stay positive"), 2)
+        self.assertEqual(model.get_affirmation_count(), 3)
+
+    @patch('models.api_model.upstream_client.get')
+    def test_fetch_many_partial_failure(self, mock_get):
+        calls = iter([True, False, True])
+
+        def response(url):
+            if not next(calls):
+                raise requests.exceptions.RequestException("API error")
+            return random_response(url)
+        mock_get.side_effect = response
+        model = AffirmationModel(fetch_workers=1)
+
+        result = model.fetch_many(3, user_id=1)
+
+        self.assertEqual(result["errors"], [{"index": 1, "error": "API error"}])
+        self.assertGreaterEqual(len(result["affirmations"]), 1)
+        self.assertEqual(model.get_affirmation_count(user_id=1), len(result["affirmations"]))
+        self.assertEqual(model.get_affirmation_count(), 0)
+
+    @patch('models.api_model.upstream_client.get')
+    def test_fetch_many_runs_concurrently(self, mock_get):
+        #all four calls must be in flight at once for any of them to finish
+        barrier = threading.Barrier(4, timeout=5)
+
+        def response(url):
+            barrier.wait()
+            return random_response(url)
+        mock_get.side_effect = response
+        model = AffirmationModel(fetch_workers=4)
+
+        result = model.fetch_many(4)
+
+        self.assertEqual(result["errors"], [])
+
+    def test_fetch_many_uses_prefetched(self):
+        prefetcher = MagicMock()
+        prefetcher.get.side_effect = ["Stay positive", "You got this"]
+        model = AffirmationModel(prefetcher=prefetcher)
+
+        result = model.fetch_many(2)
+
+        self.assertEqual(result["affirmations"], ["Stay positive", "You got this"])
+
+class TestAffirmationModelAsync(unittest.TestCase):
+
+    def make_model(self, side_effect):
+        client = MagicMock()
+        client.get = AsyncMock(side_effect=side_effect)
+        return AffirmationModel(async_client=client), client
+
+    def test_fetch_affirmation_async(self):
+        model, _ = self.make_model(random_response)
+
+        result = asyncio.run(model.fetch_affirmation_async(user_id=1))
+
+        self.assertIn(result, CORPUS)
+        self.assertEqual(model.get_all_affirmations(user_id=1), [result])
+
+    def test_fetch_affirmation_async_api_error(self):
+        model, _ = self.make_model(requests.exceptions.RequestException("API error"))
+
+        self.assertEqual(asyncio.run(model.fetch_affirmation_async()), "API error")
+        self.assertEqual(model.get_affirmation_count(), 0)
+
+    def test_fetch_many_async_runs_concurrently(self):
+        in_flight = []
+
+        async def response(url):
+            in_flight.append(1)
+            #every call must be waiting at once before any completes
+            while len(in_flight) < 5:
+                await asyncio.sleep(0)
+            return random_response(url)
+        model, client = self.make_model(response)
+
+        result = asyncio.run(model.fetch_many_async(5))
+
+        self.assertEqual(client.get.await_count, 5)
+        self.assertEqual(result["errors"], [])
+        self.assertEqual(sorted(result["affirmations"]), sorted(model.get_all_affirmations()))
+
+    def test_fetch_many_async_partial_failure(self):
+        calls = iter([True, False])
+
+        def response(url):
+            if not next(calls):
+                raise requests.exceptions.RequestException("API error")
+            return random_response(url)
+        model, _ = self.make_model(response)
+
+        result = asyncio.run(model.fetch_many_async(2))
+
+        self.assertEqual(result["errors"], [{"index": 1, "error": "API error"}])
+        self.assertEqual(len(result["affirmations"]), 1)
+
+    def test_fetch_many_async_bad_body(self):
+        #an unparseable upstream body is one failed item, as on the sync path
+        calls = iter([True, False])
+
+        def response(url):
+            if next(calls):
+                return random_response(url)
+            return AsyncResponse(200, {}, b"<html>busy</html>")
+        model, _ = self.make_model(response)
+
+        result = asyncio.run(model.fetch_many_async(2))
+
+        self.assertEqual(len(result["affirmations"]), 1)
+        self.assertEqual([error["index"] for error in result["errors"]], [1])
+        self.assertEqual(model.get_affirmation_count(), 1)
+
+    def test_async_store_writes_leave_the_event_loop(self):
+        model, _ = self.make_model(random_response)
+        threads = []
+        add = model.store.add
+        model.store.add = lambda affirmation: threads.append(threading.current_thread()) or add(affirmation)
+
+        asyncio.run(model.fetch_affirmation_async())
+
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+class TestAffirmationModelCoalescing(unittest.TestCase):
+
+    @patch('models.api_model.upstream_client.get')
+    def test_concurrent_fetches_share_upstream_calls(self, mock_get):
+        release = threading.Event()
+
+        def slow_response(url):
+            release.wait(5)
+            return random_response(url)
+        mock_get.side_effect = slow_response
+
+        model = AffirmationModel()
+        flight = model.enable_coalescing()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            futures = [pool.submit(model.fetch_affirmation) for _ in range(16)]
+            #every caller but the first joins the in-flight request
+            while flight.coalesced < 15:
+                pass
+            release.set()
+            results = [f.result() for f in futures]
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(len(set(results)), 1)
+        #each caller still stores and returns the affirmation
+        self.assertEqual(model.get_affirmation_hits(results[0]), 16)
+
+    @patch('models.api_model.upstream_client.get')
+    def test_coalesced_error_returned_to_every_caller(self, mock_get):
+        mock_get.side_effect = requests.exceptions.RequestException("API error")
+        model = AffirmationModel()
+        model.enable_coalescing()
+
+        self.assertEqual(model.fetch_affirmation(), "API error")
+        self.assertEqual(model.get_affirmation_count(), 0)
+
 if __name__ == '__main__':
     unittest.main()
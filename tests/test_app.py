@@ -0,0 +1,260 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import create_app, init_worker
+from models.affirmation_store import CompactAffirmationStore
+from models.user_model import Users
+
+
+class TestCreateApp(unittest.TestCase):
+
+    def test_apps_are_independent(self):
+        #every app gets its own model and config
+        first = create_app({'FETCH_MANY_MAX': 5})
+        second = create_app()
+
+        self.assertIsNot(first.extensions['affirmation_model'], second.extensions['affirmation_model'])
+        self.assertEqual(first.config['FETCH_MANY_MAX'], 5)
+        self.assertEqual(second.config['FETCH_MANY_MAX'], 100)
+
+    def test_routes_use_the_apps_model(self):
+        #routes read from the model of the app serving the request
+        app = create_app({'SECRET_KEY': 'test-secret'})
+        app.extensions['affirmation_model'].store.add_many(["Stay positive", "Keep going"])
+
+        response = app.test_client().get('/affirmation-count')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"count": 2})
+        self.assertEqual(create_app().test_client().get('/affirmation-count').get_json(), {"count": 0})
+
+    def test_config_override(self):
+        #values passed to create_app win over the environment
+        app = create_app({'FETCH_MANY_MAX': 3})
+
+        response = app.test_client().get('/fetch-affirmations?n=4')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("between 1 and 3", response.get_json()["error"])
+
+    def test_login_without_secret_key(self):
+        #an unset SECRET_KEY falls back to a random development key instead of failing logins
+        app = create_app({'SECRET_KEY': None})
+        client = app.test_client()
+        client.post('/api/create-user', json={"username": "nokey", "password": "password123"})
+
+        response = client.post('/api/login', json={"username": "nokey", "password": "password123"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("token", response.get_json())
+        self.assertNotEqual(create_app({'SECRET_KEY': None}).config['SECRET_KEY'], app.config['SECRET_KEY'])
+
+    def test_password_change_ends_session(self):
+        #the session cookie from a login is revoked with the login's token
+        app = create_app({'SECRET_KEY': 'test-secret'})
+        client = app.test_client()
+        client.post('/api/create-user', json={"username": "carol", "password": "password123"})
+        token = client.post('/api/login', json={"username": "carol", "password": "password123"}).get_json()["token"]
+        self.assertEqual(client.get('/affirmation-count').status_code, 200)
+
+        client.put('/api/update-password', json={"username": "carol", "new_password": "newpassword456"})
+
+        self.assertEqual(app.test_client().get('/affirmation-count',
+                                               headers={'Authorization': f'Bearer {token}'}).status_code, 401)
+        self.assertEqual(client.get('/affirmation-count').status_code, 401)
+        self.assertEqual(client.get('/affirmation-count').status_code, 200)
+
+    def test_deleted_users_affirmations_not_inherited(self):
+        #a user created after another is deleted neither reuses the id nor sees the old affirmations
+        with tempfile.TemporaryDirectory() as tmp:
+            for config in ({}, {'DB_PATH': os.path.join(tmp, 'app.db')}):
+                app = create_app({'SECRET_KEY': 'test-secret', **config})
+                model = app.extensions['affirmation_model']
+                client = app.test_client()
+                client.post('/api/create-user', json={"username": "alice", "password": "password123"})
+                client.post('/api/login', json={"username": "alice", "password": "password123"})
+                with app.app_context():
+                    alice_id = Users.get_id_by_username("alice")
+                    model._store_for(alice_id).add("alice secret")
+                    Users.delete_user("alice")
+
+                client.post('/api/create-user', json={"username": "bob", "password": "password123"})
+                client.post('/api/login', json={"username": "bob", "password": "password123"})
+                with app.app_context():
+                    self.assertNotEqual(Users.get_id_by_username("bob"), alice_id)
+                self.assertEqual(client.get('/view-affirmations').get_json()["affirmations"], [])
+                self.assertEqual(model.get_all_affirmations(user_id=alice_id), [])
+
+    def test_compact_store(self):
+        #AFFIRMATION_STORE selects the in-memory store when no database is configured
+        app = create_app({'AFFIRMATION_STORE': 'compact'})
+        self.assertIsInstance(app.extensions['affirmation_model'].store, CompactAffirmationStore)
+
+        with self.assertRaises(ValueError):
+            create_app({'AFFIRMATION_STORE': 'shelve'})
+
+    def test_db_path_uri(self):
+        #a SQLite URI in DB_PATH opens the same file for users and affirmations
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'app.db')
+            app = create_app({'SECRET_KEY': 'test-secret', 'DB_PATH': f'sqlite:///{path}'})
+            app.extensions['affirmation_model'].store.add_many(["Stay positive", "Keep going"])
+
+            self.assertEqual(app.test_client().get('/affirmation-count').get_json(), {"count": 2})
+            self.assertEqual(create_app({'DB_PATH': path}).test_client().get('/affirmation-count').get_json(),
+                             {"count": 2})
+
+    def test_mapped_store_shared_between_apps(self):
+        #apps on the same file, like workers on one host, see the same affirmations
+        with tempfile.TemporaryDirectory() as tmp:
+            config = {'AFFIRMATION_STORE': 'mmap', 'AFFIRMATION_MMAP_PATH': os.path.join(tmp, 'affirmations.log')}
+            first, second = create_app(config), create_app(config)
+            first.extensions['affirmation_model'].store.add("Stay positive")
+
+            self.assertEqual(second.test_client().get('/affirmation-count').get_json(), {"count": 1})
+            for app in (first, second):
+                app.extensions['affirmation_model'].store.close()
+
+    def test_init_worker_resets_model(self):
+        #a forked worker re-creates the model's per-process state
+        app = create_app()
+        with patch.object(app.extensions['affirmation_model'], 'after_fork') as after_fork:
+            init_worker(app)
+        after_fork.assert_called_once()
+
+
+class TestConditionalRequests(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({'SECRET_KEY': 'test-secret'})
+        self.model = self.app.extensions['affirmation_model']
+        self.model.store.add_many(["Stay positive", "Keep going"])
+        self.client = self.app.test_client()
+
+    def test_matching_etag_gets_304(self):
+        #a poll with the current ETag gets an empty 304 without rebuilding the list
+        first = self.client.get('/view-affirmations')
+        etag = first.headers['ETag']
+
+        with patch.object(self.model, 'get_all_affirmations') as get_all:
+            second = self.client.get('/view-affirmations', headers={'If-None-Match': etag})
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.data, b"")
+        self.assertEqual(second.headers['ETag'], etag)
+        get_all.assert_not_called()
+
+    def test_repeat_200_reuses_serialized_body(self):
+        #without If-None-Match the cached body for the current version is sent again
+        first = self.client.get('/view-affirmations')
+        with patch.object(self.model, 'get_all_affirmations') as get_all:
+            second = self.client.get('/view-affirmations')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        get_all.assert_not_called()
+
+    def test_writes_change_the_etag(self):
+        #storing or clearing affirmations invalidates earlier ETags and cached bodies
+        etag = self.client.get('/affirmation-count').headers['ETag']
+        self.model.store.add("You got this")
+
+        response = self.client.get('/affirmation-count', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"count": 3})
+
+        self.model.clear_affirmations()
+        response = self.client.get('/affirmation-count', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.get_json(), {"count": 0})
+
+    def test_pages_cached_separately(self):
+        #each page has its own cached body
+        first = self.client.get('/view-affirmations?limit=1').get_json()
+        second = self.client.get('/view-affirmations?limit=1&after=0').get_json()
+
+        self.assertEqual(first["affirmations"], ["Stay positive"])
+        self.assertEqual(second["affirmations"], ["Keep going"])
+
+    def test_page_validation(self):
+        #a negative cursor would slice from the end of the collection
+        for query in ('?limit=0', '?limit=3&after=-5', '?after=-1', '?after=x'):
+            self.assertEqual(self.client.get(f'/view-affirmations{query}').status_code, 400, query)
+
+    def test_search(self):
+        #search results are paged and revalidated like the other reads
+        self.model.store.add_many(["Stay strong", "Be strong and kind"])
+
+        first = self.client.get('/search-affirmations?q=strong&limit=1')
+        second = self.client.get(f"/search-affirmations?q=strong&limit=1&after={first.get_json()['next_cursor']}")
+        again = self.client.get('/search-affirmations?q=strong&limit=1', headers={'If-None-Match': first.headers['ETag']})
+
+        self.assertEqual(first.get_json()["affirmations"] + second.get_json()["affirmations"],
+                         ["Stay strong", "Be strong and kind"])
+        self.assertIsNone(second.get_json()["next_cursor"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_search_validation(self):
+        for query in ('', '?q=!!', '?q=stay&limit=0', '?q=stay&after=-1', '?q=stay&after=x'):
+            self.assertEqual(self.client.get(f'/search-affirmations{query}').status_code, 400, query)
+
+    def test_etag_differs_per_user(self):
+        #collections of different callers never share an ETag
+        self.assertNotEqual(self.model.get_affirmations_version(), self.model.get_affirmations_version(user_id=1))
+
+
+
+class TestResponseCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({'SECRET_KEY': 'test-secret', 'COMPRESS_MIN_SIZE': 1024})
+        self.model = self.app.extensions['affirmation_model']
+        self.model.store.add_many(f"You are doing great, reminder {i}." for i in range(200))
+        self.client = self.app.test_client()
+
+    def test_large_list_compressed(self):
+        #clients accepting gzip get the same body gzip encoded under its own ETag
+        identity = self.client.get('/view-affirmations')
+        compressed = self.client.get('/view-affirmations', headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), identity.data)
+        self.assertEqual(compressed.headers['ETag'], identity.headers['ETag'][:-1] + '-gzip"')
+        for response in (identity, compressed):
+            self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+    def test_compressed_body_reused_until_write(self):
+        #the encoded body is cached with the serialized one and dropped when the version changes
+        headers = {'Accept-Encoding': 'gzip'}
+        first = self.client.get('/view-affirmations', headers=headers)
+        with patch('utils.encoding.compress') as compress, patch.object(self.model, 'get_all_affirmations') as get_all:
+            second = self.client.get('/view-affirmations', headers=headers)
+        compress.assert_not_called()
+        get_all.assert_not_called()
+        self.assertEqual(second.data, first.data)
+
+        self.model.store.add("You got this")
+        third = self.client.get('/view-affirmations', headers=headers)
+        self.assertEqual(len(json.loads(gzip.decompress(third.data))["affirmations"]), 201)
+
+    def test_compressed_etag_revalidates(self):
+        #either ETag of the current version gets a 304
+        etag = self.client.get('/view-affirmations', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+        response = self.client.get('/view-affirmations', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_small_body_not_compressed(self):
+        response = self.client.get('/affirmation-count', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_json(), {"count": 200})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import asgi
+
+
+def call(path, query_string=b"", method="GET", headers=(), body=b""):
+    """
+    Sends one request through the ASGI application and returns (status, headers, body).
+    """
+    scope = {"type": "http", "method": method, "path": path, "query_string": query_string,
+             "headers": [(k.encode(), v.encode()) for k, v in headers], "http_version": "1.1",
+             "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 1234), "root_path": ""}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi.application(scope, receive, send))
+    start = messages[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+class TestASGIApplication(unittest.TestCase):
+
+    def setUp(self):
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {"affirmation": "You are amazing!"}
+        patcher = patch.object(asgi.affirmation_model, "async_client")
+        self.client = patcher.start()
+        self.client.get = AsyncMock(return_value=response)
+        self.addCleanup(patcher.stop)
+        asgi.affirmation_model.clear_affirmations()
+
+    def test_fetch_affirmation_async_route(self):
+        status, headers, body = call("/fetch-affirmation")
+
+        self.assertEqual(status, 201)
+        self.assertEqual(json.loads(body)["affirmation"], "You are amazing!")
+        self.assertEqual(asgi.affirmation_model.get_all_affirmations(), ["You are amazing!"])
+        self.client.get.assert_awaited_once()
+
+    def test_fetch_affirmations_async_route(self):
+        status, _, body = call("/fetch-affirmations", b"n=3")
+
+        self.assertEqual(status, 201)
+        self.assertEqual(json.loads(body)["affirmations"], ["You are amazing!"])
+        self.assertEqual(self.client.get.await_count, 3)
+
+    def test_fetch_affirmations_invalid_n(self):
+        status, _, body = call("/fetch-affirmations", b"n=0")
+
+        self.assertEqual(status, 400)
+        self.assertIn("error", json.loads(body))
+
+    def test_caller_resolved_off_the_event_loop(self):
+        #token checks may query the database, which must not block the event loop
+        threads = []
+        with patch.object(asgi, "current_user_id", side_effect=lambda: threads.append(threading.current_thread())):
+            status, _, _ = call("/fetch-affirmation")
+
+        self.assertEqual(status, 201)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_other_routes_served_by_flask(self):
+        status, headers, body = call("/health")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b"content-type"], b"application/json")
+        self.assertEqual(json.loads(body), {"status": "App is running"})
+
+    def test_flask_route_receives_body(self):
+        status, _, body = call("/api/create-users", method="POST", headers=[("Content-Type", "application/json")],
+                               body=b'{"not": "a list"}')
+
+        self.assertEqual(status, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from utils.async_http_client import AsyncUpstreamClient
+
+
+class TestAsyncUpstreamClient(unittest.TestCase):
+
+    def serve(self, responses):
+        """
+        Runs a keep-alive server that answers each request with the next raw response.
+        """
+        responses = iter(responses)
+        self.connections = 0
+        self.request_lines = []
+
+        async def handle(reader, writer):
+            self.connections += 1
+            try:
+                while True:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    self.request_lines.append(head.split(b"\r\n", 1)[0].decode())
+                    writer.write(next(responses))
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        return asyncio.start_server(handle, "127.0.0.1", 0)
+
+    def run_client(self, responses, calls, url="http://127.0.0.1:{port}/", env=None, **kwargs):
+        async def main():
+            server = await self.serve(responses)
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncUpstreamClient(backoff_base=0, **kwargs)
+            try:
+                with patch.dict(os.environ, {name: value.format(port=port) for name, value in (env or {}).items()}):
+                    return client, [await client.get(url.format(port=port)) for _ in range(calls)]
+            finally:
+                await client.aclose()
+                server.close()
+        return asyncio.run(main())
+
+    def test_content_length_and_keep_alive(self):
+        body = b'{"affirmation": "You are amazing!"}'
+        response = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+        client, responses = self.run_client([response] * 3, 3)
+
+        self.assertEqual([r.json()["affirmation"] for r in responses], ["You are amazing!"] * 3)
+        #all three calls reuse one connection
+        self.assertEqual((client.connections_opened, self.connections), (1, 1))
+
+    def test_chunked(self):
+        response = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\n{\"a\":\r\n4\r\n \"b\"\r\n1\r\n}\r\n0\r\n\r\n"
+        _, responses = self.run_client([response], 1)
+
+        self.assertEqual(responses[0].json(), {"a": "b"})
+
+    def test_chunked_trailers_consumed(self):
+        #trailers after the last chunk do not leak into the next response on the same connection
+        chunked = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n2\r\n{}\r\n0\r\nX-Checksum: abc\r\n\r\n"
+        ok = b"HTTP/1.1 200 OK\r\nContent-Length: 8\r\n\r\n{\"a\": 1}"
+        _, responses = self.run_client([chunked, ok], 2)
+
+        self.assertEqual([r.json() for r in responses], [{}, {"a": 1}])
+        self.assertEqual(self.connections, 1)
+
+    def test_follows_redirects(self):
+        redirect = b"HTTP/1.1 302 Found\r\nLocation: /moved\r\nContent-Length: 0\r\n\r\n"
+        ok = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}"
+        _, responses = self.run_client([redirect, ok], 1)
+
+        self.assertEqual(responses[0].status_code, 200)
+        self.assertEqual(self.request_lines, ["GET / HTTP/1.1", "GET /moved HTTP/1.1"])
+
+    def test_uses_proxy_from_environment(self):
+        #like requests, HTTP_PROXY routes the call through the proxy
+        ok = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}"
+        _, responses = self.run_client([ok], 1, url="http://upstream.invalid/",
+                                       env={"HTTP_PROXY": "http://127.0.0.1:{port}", "NO_PROXY": ""})
+
+        self.assertEqual(responses[0].status_code, 200)
+        self.assertEqual(self.request_lines, ["GET http://upstream.invalid/ HTTP/1.1"])
+
+    def test_invalid_json_is_a_request_exception(self):
+        response = b"HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\noops"
+        _, responses = self.run_client([response], 1)
+
+        with self.assertRaises(requests.exceptions.RequestException):
+            responses[0].json()
+
+    def test_retries_server_errors(self):
+        ok = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}"
+        error = b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n"
+        client, responses = self.run_client([error, ok], 1)
+
+        self.assertEqual(responses[0].status_code, 200)
+        self.assertEqual((client.retries, client.failures), (1, 1))
+
+    def test_connection_error(self):
+        async def main():
+            server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            server.close()
+            await server.wait_closed()
+            client = AsyncUpstreamClient(max_retries=0)
+            await client.get(f"http://127.0.0.1:{port}/")
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            asyncio.run(main())
+
+    def test_read_timeout(self):
+        async def main():
+            server = await asyncio.start_server(lambda r, w: asyncio.sleep(1), "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncUpstreamClient(read_timeout=0.05, max_retries=0)
+            try:
+                await client.get(f"http://127.0.0.1:{port}/")
+            finally:
+                server.close()
+
+        with self.assertRaises(requests.exceptions.Timeout):
+            asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import patch
+
+from utils.cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = TTLCache()
+        cache.set("testuser", 1)
+
+        self.assertEqual(cache.get("testuser"), 1)
+        self.assertIsNone(cache.get("unknownuser"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    @patch('utils.cache.time.monotonic')
+    def test_entries_expire(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        cache = TTLCache(ttl=10)
+        cache.set("testuser", 1)
+
+        mock_monotonic.return_value = 111.0
+        self.assertIsNone(cache.get("testuser"))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = TTLCache()
+        cache.set("testuser", 1)
+        cache.invalidate("testuser")
+        cache.invalidate("unknownuser")
+
+        self.assertIsNone(cache.get("testuser"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+from db import InstrumentedQueuePool, database_uri, db, init_db, pool_stats, sqlite_path
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    init_db(app)
+    return app
+
+
+class TestDatabaseURI(unittest.TestCase):
+
+    def test_paths_become_absolute_sqlite_uris(self):
+        self.assertEqual(database_uri("/app/db/app.db"), "sqlite:////app/db/app.db")
+        self.assertEqual(database_uri("app.db"), f"sqlite:///{os.path.abspath('app.db')}")
+
+    def test_uris_and_empty_paths(self):
+        #full URIs pass through, no path means an in-memory database
+        self.assertEqual(database_uri("postgresql://db/app"), "postgresql://db/app")
+        self.assertEqual(database_uri(None), "sqlite:///:memory:")
+
+    def test_sqlite_path(self):
+        #the affirmation store opens the same file whether DB_PATH is a path or a URI
+        self.assertEqual(sqlite_path("/app/db/app.db"), "/app/db/app.db")
+        self.assertEqual(sqlite_path("sqlite:////app/db/app.db"), "/app/db/app.db")
+        self.assertEqual(sqlite_path(None), ":memory:")
+        with self.assertRaises(ValueError):
+            sqlite_path("postgresql://db/app")
+
+
+class TestInitDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "app.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def pragma(self, app, name):
+        with app.app_context():
+            return db.session.execute(text(f"PRAGMA {name}")).scalar()
+
+    def test_file_database_gets_pragmas(self):
+        #every new connection runs WAL, synchronous, busy timeout, mmap and cache pragmas
+        app = make_app(DB_PATH=self.path, SQLITE_BUSY_TIMEOUT_MS=1234, SQLITE_CACHE_SIZE_KB=2048)
+
+        self.assertEqual(self.pragma(app, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(app, "synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma(app, "busy_timeout"), 1234)
+        self.assertEqual(self.pragma(app, "cache_size"), -2048)
+        self.assertGreater(self.pragma(app, "mmap_size"), 0)
+
+    def test_pool_sized_from_config(self):
+        app = make_app(DB_PATH=self.path, DB_POOL_SIZE=3, DB_MAX_OVERFLOW=1)
+        with app.app_context():
+            pool = db.engine.pool
+            self.assertIsInstance(pool, InstrumentedQueuePool)
+            self.assertEqual(pool.size(), 3)
+            self.assertEqual(pool._max_overflow, 1)
+
+    def test_explicit_engine_options_win(self):
+        app = make_app(DB_PATH=self.path, SQLALCHEMY_ENGINE_OPTIONS={"pool_size": 2})
+        with app.app_context():
+            self.assertEqual(db.engine.pool.size(), 2)
+
+    def test_in_memory_keeps_static_pool(self):
+        #an in-memory database must stay on its single shared connection
+        app = make_app()
+        with app.app_context():
+            self.assertIsInstance(db.engine.pool, StaticPool)
+            self.assertEqual(db.session.execute(text("PRAGMA busy_timeout")).scalar(), 5000)
+
+    def test_pool_stats_count_checkouts(self):
+        app = make_app(DB_PATH=self.path, DB_POOL_SIZE=2)
+        with app.app_context():
+            for _ in range(3):
+                with db.engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+            stats = pool_stats()[None]
+
+        self.assertEqual(stats["pool"], "InstrumentedQueuePool")
+        self.assertEqual(stats["checkouts"], 3)
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertEqual(stats["timeouts"], 0)
+        self.assertGreaterEqual(stats["max_wait_ms"], stats["mean_wait_ms"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import gzip
+import json
+import unittest
+import zlib
+
+from flask import Flask, Response
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from utils import encoding
+from utils.encoding import JSONProvider, compress, compress_response, negotiate
+
+
+def make_app(config: dict = None) -> Flask:
+    app = Flask(__name__)
+    app.config.update(config or {})
+    app.json = JSONProvider(app)
+    encoding.init_app(app)
+
+    @app.route('/items/<int:count>')
+    def items(count):
+        return app.json.response({"items": [f"item {i}" for i in range(count)]})
+
+    @app.route('/text')
+    def text():
+        return Response("x" * 5000, mimetype='text/html')
+
+    return app
+
+
+class TestJSONProvider(unittest.TestCase):
+
+    def test_encoders_agree(self):
+        #both encoders write the same compact, key-sorted document
+        value = {"b": [1, 2.5, None, True], "a": "Stay positive"}
+        for encoder in ('auto', 'stdlib'):
+            app = make_app({'JSON_ENCODER': encoder})
+            self.assertEqual(app.json.dump_bytes(value), b'{"a":"Stay positive","b":[1,2.5,null,true]}')
+            self.assertEqual(json.loads(app.json.response(value).get_data()), value)
+
+    def test_orjson_used_when_installed(self):
+        expected = 'stdlib' if encoding.orjson is None else 'orjson'
+        self.assertEqual(make_app().json.encoder, expected)
+        self.assertEqual(make_app({'JSON_ENCODER': 'stdlib'}).json.encoder, 'stdlib')
+
+    def test_falls_back_to_stdlib(self):
+        #values orjson rejects are still encoded
+        app = make_app()
+        self.assertEqual(app.json.dump_bytes({"big": 2 ** 70}), b'{"big":%d}' % 2 ** 70)
+        self.assertEqual(app.json.dump_bytes({1: "one"}), b'{"1":"one"}')
+
+    def test_unknown_encoder(self):
+        with self.assertRaises(ValueError):
+            make_app({'JSON_ENCODER': 'yaml'})
+
+    def test_indent(self):
+        app = make_app()
+        self.assertEqual(app.json.dump_bytes({"a": 1}, indent=True), b'{\n  "a": 1\n}')
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.client = make_app({'COMPRESS_MIN_SIZE': 1024}).test_client()
+
+    def test_negotiate(self):
+        def accept(header):
+            return parse_accept_header(header, Accept)
+
+        self.assertEqual(negotiate(accept("gzip, deflate, br")), "gzip")
+        self.assertEqual(negotiate(accept("deflate")), "deflate")
+        self.assertEqual(negotiate(accept("gzip;q=0.5, deflate")), "deflate")
+        self.assertEqual(negotiate(accept("*")), "gzip")
+        self.assertIsNone(negotiate(accept("gzip;q=0, br")))
+        self.assertIsNone(negotiate(accept("")))
+
+    def test_round_trip(self):
+        body = b'{"affirmations":["Stay positive"]}' * 100
+        self.assertEqual(gzip.decompress(compress(body, "gzip")), body)
+        self.assertEqual(zlib.decompress(compress(body, "deflate")), body)
+
+    def test_large_response_compressed(self):
+        identity = self.client.get('/items/500')
+        response = self.client.get('/items/500', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertLess(int(response.headers['Content-Length']), len(identity.data) // 4)
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))["items"]), 500)
+
+    def test_identity_when_not_accepted(self):
+        #large responses still vary on Accept-Encoding even when sent uncompressed
+        response = self.client.get('/items/500')
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(len(response.get_json()["items"]), 500)
+
+    def test_small_and_non_json_responses_untouched(self):
+        for path in ('/items/2', '/text'):
+            response = self.client.get(path, headers={'Accept-Encoding': 'gzip'})
+            self.assertNotIn('Content-Encoding', response.headers, path)
+            self.assertNotIn('Vary', response.headers, path)
+
+    def test_disabled(self):
+        client = make_app({'COMPRESS_MIN_SIZE': -1}).test_client()
+        self.assertNotIn('Content-Encoding', client.get('/items/500', headers={'Accept-Encoding': 'gzip'}).headers)
+
+    def test_reuses_encoded_bodies(self):
+        #a strong ETag is suffixed with the coding and cached encodings are reused
+        app = make_app()
+        encoded = {}
+        with app.test_request_context(headers={'Accept-Encoding': 'deflate'}):
+            first = app.json.response({"items": list(range(1000))})
+            first.set_etag("v1")
+            compress_response(first, 0, encoded=encoded)
+            second = app.json.response({"items": []})
+            second.set_etag("v1")
+            compress_response(second, 0, encoded=encoded)
+
+        self.assertEqual(first.get_etag(), ("v1-deflate", False))
+        self.assertEqual(list(encoded), ["deflate"])
+        self.assertEqual(second.get_data(), first.get_data())
+
+
+if __name__ == '__main__':
+    unittest.main()
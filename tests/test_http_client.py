@@ -0,0 +1,123 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from utils.http_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+class AffirmationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"affirmation": "You are amazing!"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.state, "open")
+        self.assertEqual(breaker.trips, 1)
+
+    def test_half_open_probe(self):
+        #after the reset timeout a single probe goes through and closes the circuit on success
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        breaker.allow()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.trips, 2)
+
+
+class TestUpstreamClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = UpstreamClient(backoff_base=0, backoff_max=0)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_reuses_connections(self):
+        #keep-alive connections are reused across calls
+        server = ThreadingHTTPServer(("127.0.0.1", 0), AffirmationHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/"
+            for _ in range(5):
+                response = self.client.get(url)
+                self.assertEqual(response.json()["affirmation"], "You are amazing!")
+            stats = self.client.stats()
+        finally:
+            self.client.close()
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["handshakes_saved"], 4)
+
+    def test_passes_timeout(self):
+        with patch.object(self.client.session, 'get') as mock_get:
+            mock_get.return_value = MagicMock(status_code=200)
+            self.client.get("https://example.com/")
+
+        self.assertEqual(mock_get.call_args.kwargs["timeout"], self.client.timeout)
+
+    def test_retries_connection_errors(self):
+        with patch.object(self.client.session, 'get') as mock_get:
+            mock_get.side_effect = [requests.exceptions.ConnectionError("reset"), MagicMock(status_code=200)]
+            response = self.client.get("https://example.com/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.stats()["retries"], 1)
+
+    def test_retry_budget_exhausted(self):
+        #no retries are made once the shared budget is spent
+        client = UpstreamClient(retry_budget=0, retry_ratio=0)
+        with patch.object(client.session, 'get') as mock_get:
+            mock_get.side_effect = requests.exceptions.Timeout("timed out")
+            with self.assertRaises(requests.exceptions.Timeout):
+                client.get("https://example.com/")
+
+        self.assertEqual(mock_get.call_count, 1)
+
+    def test_breaker_fails_fast(self):
+        client = UpstreamClient(max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        with patch.object(client.session, 'get') as mock_get:
+            mock_get.side_effect = requests.exceptions.ConnectionError("refused")
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                client.get("https://example.com/")
+            with self.assertRaises(CircuitOpenError):
+                client.get("https://example.com/")
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(client.stats()["breaker_trips"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import io
+import json
+import logging
+import sys
+import unittest
+from unittest.mock import patch
+
+from utils import logger as log_utils
+from utils.logger import AccessLogFilter, JsonFormatter, configure_logger
+
+
+class TestConfigureLogger(unittest.TestCase):
+
+    def tearDown(self):
+        #restore the default writer for the rest of the suite
+        log_utils.start_logging()
+
+    def test_handler_attached_once(self):
+        logger = logging.getLogger("test_logger.once")
+        configure_logger(logger)
+        configure_logger(logger)
+
+        self.assertEqual(logger.handlers, [log_utils._queue_handler])
+
+    def test_log_level_any_case(self):
+        #gunicorn takes LOG_LEVEL in lower case, unknown names fall back to DEBUG
+        for value, expected in (("info", logging.INFO), ("WARNING", logging.WARNING), ("loud", logging.DEBUG)):
+            with patch.dict('os.environ', {'LOG_LEVEL': value}):
+                logger = logging.getLogger("test_logger.level")
+                configure_logger(logger)
+                self.assertEqual(logger.level, expected, value)
+
+    def test_records_written_by_listener(self):
+        stream = io.StringIO()
+        log_utils.start_logging(stream=stream, json_lines=False)
+        logger = logging.getLogger("test_logger.queued")
+        configure_logger(logger)
+
+        logger.info("hello %s", "world")
+        log_utils.stop_logging()
+
+        self.assertEqual(stream.getvalue().count("hello world"), 1)
+        self.assertIn("test_logger.queued - INFO", stream.getvalue())
+
+    def test_json_lines(self):
+        stream = io.StringIO()
+        log_utils.start_logging(stream=stream, json_lines=True)
+        logger = logging.getLogger("test_logger.json")
+        configure_logger(logger)
+
+        logger.info("request done", extra={"status": 200, "path": "/health"})
+        log_utils.stop_logging()
+
+        entry = json.loads(stream.getvalue().splitlines()[0])
+        self.assertEqual(entry["message"], "request done")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual((entry["status"], entry["path"]), (200, "/health"))
+
+
+class TestJsonFormatter(unittest.TestCase):
+
+    def test_format_exception(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.getLogger("test").makeRecord(
+                "test", logging.ERROR, __file__, 1, "failed", None, exc_info=sys.exc_info())
+
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "failed")
+        self.assertIn("ValueError: boom", entry["exc_info"])
+
+
+class TestAccessLogFilter(unittest.TestCase):
+
+    def _record(self, level=logging.INFO):
+        return logging.makeLogRecord({"levelno": level, "msg": "GET /health 200"})
+
+    @patch('utils.logger.random.random')
+    def test_sampling(self, mock_random):
+        log_filter = AccessLogFilter(sample_rate=0.25)
+        mock_random.return_value = 0.1
+        self.assertTrue(log_filter.filter(self._record()))
+        mock_random.return_value = 0.5
+        self.assertFalse(log_filter.filter(self._record()))
+        self.assertEqual(log_filter.dropped, 1)
+
+    @patch('utils.logger.time.monotonic')
+    def test_rate_limit(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        log_filter = AccessLogFilter(rate_limit=2)
+
+        self.assertEqual([log_filter.filter(self._record()) for _ in range(3)], [True, True, False])
+        mock_monotonic.return_value = 100.5
+        self.assertTrue(log_filter.filter(self._record()))
+        self.assertFalse(log_filter.filter(self._record()))
+
+    def test_errors_always_pass(self):
+        log_filter = AccessLogFilter(sample_rate=0.0)
+
+        self.assertFalse(log_filter.filter(self._record()))
+        self.assertTrue(log_filter.filter(self._record(logging.WARNING)))
+
+
+if __name__ == '__main__':
+    unittest.main()
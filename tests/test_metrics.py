@@ -0,0 +1,108 @@
+import unittest
+
+from flask import Flask, jsonify
+
+from utils import metrics
+from utils.metrics import Counter, Gauge, Histogram, MetricsRegistry, timed
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_render(self):
+        histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+        child = histogram.labels("/health")
+        for value in (0.05, 0.1, 0.5, 2.0):
+            child.observe(value)
+
+        lines = histogram.render()
+        self.assertIn('latency_seconds_bucket{route="/health",le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/health",le="1.0"} 3', lines)
+        self.assertIn('latency_seconds_bucket{route="/health",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum{route="/health"} 2.65', lines)
+        self.assertIn('latency_seconds_count{route="/health"} 4', lines)
+
+    def test_histogram_buckets_preallocated(self):
+        histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        counts = histogram.labels().counts
+        histogram.observe(5.0)
+
+        self.assertIs(histogram.labels().counts, counts)
+        self.assertEqual(counts, [0, 0, 1])
+
+    def test_counter_and_gauge(self):
+        registry = MetricsRegistry()
+        counter = registry.register(Counter("errors_total", "Errors.", ("route",)))
+        gauge = registry.register(Gauge("in_flight", "In flight."))
+        counter.labels('/say "hi"').inc()
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        text = registry.render()
+        self.assertIn('# TYPE errors_total counter', text)
+        self.assertIn('errors_total{route="/say \\"hi\\""} 1', text)
+        self.assertIn('in_flight 1', text)
+
+    def test_register_returns_existing(self):
+        registry = MetricsRegistry()
+        first = registry.register(Counter("errors_total", "Errors."))
+
+        self.assertIs(registry.register(Counter("errors_total", "Errors.")), first)
+
+    def test_timed(self):
+        latency = Histogram("calls_seconds", "Calls.", ("method",))
+        errors = Counter("call_errors_total", "Call errors.", ("method",))
+
+        @timed("fail", latency, errors)
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            fail()
+        self.assertEqual(sum(latency.labels("fail").counts), 1)
+        self.assertEqual(errors.labels("fail").value, 1)
+
+
+class TestInstrumentApp(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        metrics.instrument_app(self.app)
+
+        @self.app.route('/items/<int:item_id>')
+        def item(item_id):
+            return jsonify({"id": item_id})
+
+        @self.app.route('/broken')
+        def broken():
+            raise RuntimeError("boom")
+
+        self.client = self.app.test_client()
+
+    def test_records_route_latency(self):
+        child = metrics.REQUEST_LATENCY.labels('/items/<int:item_id>', 'GET')
+        before = sum(child.counts)
+        self.client.get('/items/1')
+        self.client.get('/items/2')
+
+        #labelled by rule, not by concrete path
+        self.assertEqual(sum(child.counts), before + 2)
+        self.assertEqual(metrics.REQUESTS_IN_FLIGHT.labels().value, 0)
+
+    def test_counts_errors(self):
+        errors = metrics.REQUEST_ERRORS.labels('/broken', 'GET')
+        before = errors.value
+        self.assertEqual(self.client.get('/broken').status_code, 500)
+
+        self.assertEqual(errors.value, before + 1)
+        self.assertEqual(metrics.REQUESTS_IN_FLIGHT.labels().value, 0)
+
+    def test_json_serialization_timed(self):
+        before = sum(metrics.JSON_SERIALIZATION.labels().counts)
+        self.client.get('/items/1')
+
+        self.assertGreater(sum(metrics.JSON_SERIALIZATION.labels().counts), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
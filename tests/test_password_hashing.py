@@ -0,0 +1,85 @@
+import hashlib
+import unittest
+
+from utils.password_hashing import (POOL_START_METHOD, PBKDF2Hasher, PasswordHashingService, ScryptHasher,
+                                    hash_password, is_legacy, verify_password)
+
+
+class TestPasswordHashing(unittest.TestCase):
+
+    def test_scrypt_round_trip(self):
+        encoded = hash_password("password123", "scrypt", (2 ** 8, 8, 1))
+
+        self.assertTrue(encoded.startswith("scrypt$256$8$1$"))
+        self.assertTrue(verify_password("password123", encoded))
+        self.assertFalse(verify_password("wrongpassword", encoded))
+
+    def test_pbkdf2_round_trip(self):
+        encoded = hash_password("password123", "pbkdf2_sha256", (1000,))
+
+        self.assertTrue(encoded.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(verify_password("password123", encoded))
+        self.assertFalse(verify_password("wrongpassword", encoded))
+
+    def test_salts_differ(self):
+        self.assertNotEqual(hash_password("password123", "pbkdf2_sha256", (1000,)),
+                            hash_password("password123", "pbkdf2_sha256", (1000,)))
+
+    def test_legacy_sha256(self):
+        legacy = hashlib.sha256(("password123" + "abcd").encode()).hexdigest()
+
+        self.assertTrue(is_legacy(legacy))
+        self.assertTrue(verify_password("password123", legacy, "abcd"))
+        self.assertFalse(verify_password("password123", legacy, "other"))
+
+
+class TestPasswordHashingService(unittest.TestCase):
+
+    def test_needs_rehash(self):
+        service = PasswordHashingService(ScryptHasher(n=2 ** 8))
+        current = service.hash("password123")
+
+        self.assertFalse(service.needs_rehash(current))
+        self.assertTrue(service.needs_rehash(hashlib.sha256(b"password123").hexdigest()))
+        self.assertTrue(service.needs_rehash(hash_password("password123", "scrypt", (2 ** 9, 8, 1))))
+        self.assertTrue(service.needs_rehash(hash_password("password123", "pbkdf2_sha256", (1000,))))
+
+    def test_hash_many_inline(self):
+        service = PasswordHashingService(ScryptHasher(n=2 ** 8))
+        hashes = service.hash_many(["a", "b"])
+
+        self.assertTrue(service.verify("a", hashes[0]))
+        self.assertTrue(service.verify("b", hashes[1]))
+        self.assertNotEqual(hashes[0], hashes[1])
+
+    def test_verifies_any_algorithm(self):
+        service = PasswordHashingService(PBKDF2Hasher(iterations=1000))
+
+        self.assertTrue(service.verify("password123", hash_password("password123", "scrypt", (2 ** 8, 8, 1))))
+
+    def test_process_pool(self):
+        service = PasswordHashingService(ScryptHasher(n=2 ** 8), workers=2)
+        try:
+            encoded = service.hash("password123")
+            self.assertTrue(service.verify("password123", encoded))
+            self.assertFalse(service.verify("wrongpassword", encoded))
+            hashes = service.hash_many(["a", "b", "c"])
+            self.assertEqual([service.verify(p, h) for p, h in zip("abc", hashes)], [True] * 3)
+            self.assertIsNotNone(service._pool)
+            self.assertEqual(service._pool._mp_context.get_start_method(), POOL_START_METHOD)
+        finally:
+            service.shutdown()
+        self.assertIsNone(service._pool)
+
+    def test_legacy_verified_inline(self):
+        #a legacy SHA-256 check never starts or uses the process pool
+        service = PasswordHashingService(ScryptHasher(n=2 ** 8), workers=2)
+        legacy = hashlib.sha256(("password123" + "abcd").encode()).hexdigest()
+
+        self.assertTrue(service.verify("password123", legacy, "abcd"))
+        self.assertFalse(service.verify("wrongpassword", legacy, "abcd"))
+        self.assertIsNone(service._pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
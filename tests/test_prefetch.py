@@ -0,0 +1,123 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from models.api_model import AffirmationModel
+from utils.prefetch import AffirmationPrefetcher
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestAffirmationPrefetcher(unittest.TestCase):
+
+    def test_fills_buffer_on_start(self):
+        #workers should fill the buffer up to its size
+        prefetcher = AffirmationPrefetcher(lambda: "You are amazing!", buffer_size=5, low_water=2)
+        prefetcher.start()
+        try:
+            self.assertTrue(wait_for(lambda: prefetcher.stats()["buffered"] == 5))
+        finally:
+            prefetcher.stop(timeout=1)
+
+    def test_after_fork_resets_buffer(self):
+        #a forked copy starts with an empty buffer and no threads, and refills once started
+        prefetcher = AffirmationPrefetcher(lambda: "Fresh start", buffer_size=3, low_water=1)
+        prefetcher.start()
+        try:
+            self.assertTrue(wait_for(lambda: prefetcher.stats()["buffered"] == 3))
+            prefetcher.stop(timeout=1)
+            prefetcher.after_fork()
+            self.assertEqual(prefetcher.stats()["buffered"], 0)
+
+            prefetcher.start()
+            self.assertTrue(wait_for(lambda: prefetcher.stats()["buffered"] == 3))
+        finally:
+            prefetcher.stop(timeout=1)
+
+    def test_get_counts_hits_and_misses(self):
+        #an empty buffer is a miss, a buffered affirmation is a hit
+        prefetcher = AffirmationPrefetcher(lambda: "Keep going", buffer_size=2, low_water=1)
+        self.assertIsNone(prefetcher.get())
+
+        prefetcher.start()
+        try:
+            self.assertTrue(wait_for(lambda: prefetcher.stats()["buffered"] == 2))
+            self.assertEqual(prefetcher.get(), "Keep going")
+        finally:
+            prefetcher.stop(timeout=1)
+
+        stats = prefetcher.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_refills_below_low_water(self):
+        #draining below the low-water mark triggers a refill
+        prefetcher = AffirmationPrefetcher(lambda: "Stay positive", buffer_size=4, low_water=2)
+        prefetcher.start()
+        try:
+            self.assertTrue(wait_for(lambda: prefetcher.stats()["buffered"] == 4))
+            for _ in range(3):
+                prefetcher.get()
+            self.assertTrue(wait_for(lambda: prefetcher.stats()["buffered"] == 4))
+            self.assertEqual(prefetcher.stats()["fetched"], 7)
+        finally:
+            prefetcher.stop(timeout=1)
+
+    def test_backs_off_on_failure(self):
+        #failing fetches are counted and retried after a backoff
+        fetch = MagicMock(side_effect=Exception("API error"))
+        prefetcher = AffirmationPrefetcher(fetch, buffer_size=2, low_water=1, workers=1,
+                                           backoff_base=10, backoff_max=10)
+        prefetcher.start()
+        try:
+            self.assertTrue(wait_for(lambda: prefetcher.stats()["failures"] == 1))
+            time.sleep(0.1)
+            self.assertEqual(fetch.call_count, 1)
+        finally:
+            prefetcher.stop(timeout=1)
+
+    def test_invalid_sizes(self):
+        with self.assertRaises(ValueError):
+            AffirmationPrefetcher(lambda: "x", buffer_size=2, low_water=3)
+
+
+class TestAffirmationModelPrefetch(unittest.TestCase):
+
+    @patch('models.api_model.upstream_client.get')
+    def test_fetch_uses_buffered_affirmation(self, mock_get):
+        #a buffer hit skips the external API call
+        prefetcher = MagicMock()
+        prefetcher.get.return_value = "You are amazing!"
+        model = AffirmationModel(prefetcher=prefetcher)
+
+        result = model.fetch_affirmation()
+
+        self.assertEqual(result, "You are amazing!")
+        self.assertIn("You are amazing!", model.affirmations)
+        mock_get.assert_not_called()
+
+    @patch('models.api_model.upstream_client.get')
+    def test_fetch_falls_back_on_miss(self, mock_get):
+        #a buffer miss calls the external API inline
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"affirmation": "Believe in yourself."}
+        mock_get.return_value = mock_response
+        prefetcher = MagicMock()
+        prefetcher.get.return_value = None
+        model = AffirmationModel(prefetcher=prefetcher)
+
+        result = model.fetch_affirmation()
+
+        self.assertEqual(result, "Believe in yourself.")
+        mock_get.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
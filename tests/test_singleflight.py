@@ -0,0 +1,81 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from utils.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def _blocking_fn(self, result="You are amazing!"):
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return result
+        return fn, release, calls
+
+    def test_concurrent_calls_share_one_call(self):
+        fn, release, calls = self._blocking_fn()
+        coalesced = []
+        flight = SingleFlight(fn, on_coalesced=lambda: coalesced.append(1))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(flight) for _ in range(8)]
+            #wait until every follower has joined the flight
+            while flight.coalesced < 7:
+                pass
+            release.set()
+            results = [f.result() for f in futures]
+
+        self.assertEqual(results, ["You are amazing!"] * 8)
+        self.assertEqual((len(calls), flight.calls, flight.coalesced, len(coalesced)), (1, 1, 7, 7))
+
+    def test_sequential_calls_not_shared_without_window(self):
+        flight = SingleFlight(lambda: "x")
+        flight()
+        flight()
+
+        self.assertEqual((flight.calls, flight.coalesced), (2, 0))
+
+    @patch('utils.singleflight.time.monotonic')
+    def test_window_reuses_recent_result(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        flight = SingleFlight(lambda: "x", window=0.5)
+        flight()
+        mock_monotonic.return_value = 100.4
+        flight()
+        mock_monotonic.return_value = 100.6
+        flight()
+
+        self.assertEqual((flight.calls, flight.coalesced), (2, 1))
+
+    def test_errors_shared_with_waiters_but_not_reused(self):
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("upstream down")
+
+        flight = SingleFlight(fail, window=60)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(flight) for _ in range(2)]
+            while flight.coalesced < 1:
+                pass
+            release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+        #a failed call is retried rather than served from the window
+        release.set()
+        with self.assertRaises(ValueError):
+            flight()
+        self.assertEqual(flight.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
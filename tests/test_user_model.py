@@ -1,11 +1,17 @@
+import hashlib
+import time
 import unittest
+import unittest.mock
 from flask import Flask
-from models.user_model import Users, db  # Import db from your app module
+from models.user_model import UserRecord, Users, db  # Import db from your app module
+from utils.password_hashing import PasswordHashingService, ScryptHasher
+from utils.sql_utils import count_queries
 
 # Set up the Flask app for testing
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'  # In-memory SQLite database
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SECRET_KEY'] = 'test-secret-key'
 
 class TestUsersModel(unittest.TestCase):
 
@@ -16,6 +22,8 @@ class TestUsersModel(unittest.TestCase):
         cls.app_context.push()
         db.init_app(app)  # Initialize `db` with the Flask app
         db.create_all()  # Create the necessary tables
+        #cheap hashing cost keeps the suite fast
+        Users.configure_password_hashing(PasswordHashingService(ScryptHasher(n=2 ** 8)))
 
     @classmethod
     def tearDownClass(cls):
@@ -29,6 +37,7 @@ class TestUsersModel(unittest.TestCase):
         db.session.remove()
         db.drop_all()
         db.create_all()
+        Users._record_cache.clear()
 
     def test_create_user_success(self):
         Users.create_user("testuser", "password123")
@@ -71,5 +80,210 @@ class TestUsersModel(unittest.TestCase):
         result = Users.check_password("testuser", "newpassword456")
         self.assertTrue(result)
 
+    def test_update_password_user_not_found(self):
+        with self.assertRaises(ValueError):
+            Users.update_password("unknownuser", "newpassword456")
+
+    def test_authenticate_success(self):
+        Users.create_user("testuser", "password123")
+        user_id = Users.authenticate("testuser", "password123")
+        self.assertEqual(user_id, Users.query.filter_by(username="testuser").first().id)
+
+    def test_authenticate_wrong_password(self):
+        Users.create_user("testuser", "password123")
+        self.assertIsNone(Users.authenticate("testuser", "wrongpassword"))
+
+    def test_authenticate_user_not_found(self):
+        with self.assertRaises(ValueError):
+            Users.authenticate("unknownuser", "password123")
+
+    def test_login_queries(self):
+        #every login runs one query, and lookups right after it none
+        Users.create_user("testuser", "password123")
+        for _ in range(2):
+            with count_queries() as login:
+                Users.authenticate("testuser", "password123")
+            with count_queries() as lookup:
+                Users.get_id_by_username("testuser")
+            self.assertEqual(login.count, 1)
+            self.assertEqual(lookup.count, 0)
+
+    def test_login_ignores_cached_password(self):
+        #a password changed by another process takes effect at the next login
+        Users.create_user("testuser", "password123")
+        Users.authenticate("testuser", "password123")
+        Users.query.filter_by(username="testuser").update(
+            {'password': Users._generate_hashed_password("newpassword456")[1]})
+        db.session.commit()
+
+        self.assertIsNone(Users.authenticate("testuser", "password123"))
+        self.assertIsNotNone(Users.authenticate("testuser", "newpassword456"))
+
+    def test_revocation_seen_after_cache_ttl(self):
+        #a token revoked by another process stops working once the cached record expires
+        Users.configure_record_cache(ttl=0.05)
+        self.addCleanup(Users.configure_record_cache, ttl=5.0)
+        Users.create_user("testuser", "password123")
+        token = Users.generate_token("testuser")
+        Users.query.filter_by(username="testuser").update({'token_version': Users.token_version + 1})
+        db.session.commit()
+
+        self.assertIsNotNone(Users.verify_token(token))
+        time.sleep(0.1)
+        with self.assertRaises(ValueError):
+            Users.verify_token(token)
+
+    def test_update_password_invalidates_cache(self):
+        Users.create_user("testuser", "password123")
+        Users.check_password("testuser", "password123")
+        Users.update_password("testuser", "newpassword456")
+        self.assertFalse(Users.check_password("testuser", "password123"))
+        self.assertTrue(Users.check_password("testuser", "newpassword456"))
+
+    def test_delete_user_invalidates_cache(self):
+        Users.create_user("testuser", "password123")
+        Users.check_password("testuser", "password123")
+        Users.delete_user("testuser")
+        with self.assertRaises(ValueError):
+            Users.check_password("testuser", "password123")
+
+    def test_create_user_invalidates_cache(self):
+        #a stale entry left for the username does not outlive the new user
+        Users._record_cache.set("testuser", UserRecord(-1, "stale", "stale", 0))
+        Users.create_user("testuser", "password123")
+        self.assertNotEqual(Users.get_id_by_username("testuser"), -1)
+        self.assertTrue(Users.check_password("testuser", "password123"))
+
+    def test_verify_token_success(self):
+        Users.create_user("testuser", "password123")
+        token = Users.generate_token("testuser")
+        self.assertEqual(Users.verify_token(token), Users.get_id_by_username("testuser"))
+
+    def test_verify_token_without_queries(self):
+        #a token for a cached user is verified without touching the database
+        Users.create_user("testuser", "password123")
+        token = Users.generate_token("testuser")
+        with count_queries() as counter:
+            Users.verify_token(token)
+        self.assertEqual(counter.count, 0)
+
+    def test_verify_token_tampered(self):
+        Users.create_user("testuser", "password123")
+        token = Users.generate_token("testuser")
+        with self.assertRaises(ValueError):
+            Users.verify_token(token[:-2] + ("AA" if token[-2:] != "AA" else "BB"))
+
+    def test_verify_token_expired(self):
+        Users.create_user("testuser", "password123")
+        token = Users.generate_token("testuser")
+        with self.assertRaises(ValueError):
+            Users.verify_token(token, max_age=-1)
+
+    def test_update_password_revokes_tokens(self):
+        Users.create_user("testuser", "password123")
+        token = Users.generate_token("testuser")
+        Users.update_password("testuser", "newpassword456")
+        with self.assertRaises(ValueError):
+            Users.verify_token(token)
+        self.assertIsNotNone(Users.verify_token(Users.generate_token("testuser")))
+
+    def test_delete_user_invalidates_tokens(self):
+        Users.create_user("testuser", "password123")
+        token = Users.generate_token("testuser")
+        Users.delete_user("testuser")
+        with self.assertRaises(ValueError):
+            Users.verify_token(token)
+
+    def test_create_user_stores_self_describing_hash(self):
+        Users.create_user("testuser", "password123")
+        user = Users.query.filter_by(username="testuser").first()
+        self.assertTrue(user.password.startswith("scrypt$256$8$1$"))
+        self.assertEqual(user.salt, "")
+
+    def _create_legacy_user(self, username, password):
+        salt = "00" * 16
+        legacy = hashlib.sha256((password + salt).encode()).hexdigest()
+        db.session.add(Users(username=username, salt=salt, password=legacy))
+        db.session.commit()
+        return legacy
+
+    def test_legacy_hash_upgraded_on_login(self):
+        legacy = self._create_legacy_user("testuser", "password123")
+
+        self.assertIsNotNone(Users.authenticate("testuser", "password123"))
+        user = Users.query.filter_by(username="testuser").first()
+        self.assertNotEqual(user.password, legacy)
+        self.assertTrue(user.password.startswith("scrypt$"))
+        #upgraded hash still verifies and does not revoke tokens
+        self.assertEqual(user.token_version, 0)
+        self.assertIsNotNone(Users.authenticate("testuser", "password123"))
+        self.assertIsNone(Users.authenticate("testuser", "wrongpassword"))
+
+    def test_legacy_hash_kept_on_failed_login(self):
+        legacy = self._create_legacy_user("testuser", "password123")
+
+        self.assertIsNone(Users.authenticate("testuser", "wrongpassword"))
+        self.assertEqual(Users.query.filter_by(username="testuser").first().password, legacy)
+
+    def test_hash_upgraded_when_cost_changes(self):
+        Users.create_user("testuser", "password123")
+        previous = Users._hashing
+        Users.configure_password_hashing(PasswordHashingService(ScryptHasher(n=2 ** 9)))
+        try:
+            self.assertIsNotNone(Users.authenticate("testuser", "password123"))
+            user = Users.query.filter_by(username="testuser").first()
+            self.assertTrue(user.password.startswith("scrypt$512$"))
+        finally:
+            Users.configure_password_hashing(previous)
+
+    def test_create_users_success(self):
+        results = Users.create_users([{"username": f"user{i}", "password": "password123"} for i in range(5)],
+                                     batch_size=2)
+        self.assertEqual([r["status"] for r in results], ["created"] * 5)
+        self.assertEqual(Users.query.count(), 5)
+        self.assertIsNotNone(Users.authenticate("user3", "password123"))
+
+    def test_create_users_per_row_results(self):
+        Users.create_user("existing", "password123")
+        results = Users.create_users([
+            {"username": "newuser", "password": "password123"},
+            {"username": "existing", "password": "password123"},
+            {"username": "newuser", "password": "otherpassword"},
+            {"username": "nopassword"},
+            None,
+        ])
+        self.assertEqual([r["status"] for r in results], ["created", "duplicate", "duplicate", "invalid", "invalid"])
+        self.assertIn("error", results[1])
+        self.assertEqual(Users.query.count(), 2)
+        self.assertIsNotNone(Users.authenticate("newuser", "password123"))
+
+    def test_create_users_non_string_fields(self):
+        #rows with other types are reported as invalid instead of failing the request
+        results = Users.create_users([
+            {"username": ["list"], "password": "password123"},
+            {"username": "intpassword", "password": 12345},
+            {"username": "valid", "password": "password123"},
+        ], batch_size=1)
+        self.assertEqual([r["status"] for r in results], ["invalid", "invalid", "created"])
+        self.assertEqual(Users.query.count(), 1)
+
+    def test_create_users_batched_queries(self):
+        users = ({"username": f"user{i}", "password": "password123"} for i in range(10))
+        with count_queries() as counter:
+            Users.create_users(users, batch_size=5)
+        #one duplicate check and one insert per batch
+        self.assertEqual(counter.count, 4)
+
+    def test_create_users_falls_back_on_race(self):
+        Users.create_user("raced", "password123")
+
+        #simulate another writer inserting after the duplicate check
+        with unittest.mock.patch.object(db.session, "query") as mock_query:
+            mock_query.return_value.filter.return_value = []
+            results = Users.create_users([{"username": "raced", "password": "x"},
+                                          {"username": "fresh", "password": "x"}])
+        self.assertEqual([r["status"] for r in results], ["duplicate", "created"])
+        self.assertEqual(Users.query.count(), 2)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+import random
+from typing import Optional
+
+import httpx
+import requests
+
+from utils.http_client import CircuitBreaker, CircuitOpenError
+from utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class AsyncResponse:
+    """
+    Response returned by `AsyncUpstreamClient.get`, shaped like `requests.Response`.
+    """
+
+    def __init__(self, status_code: int, headers, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        """
+        Decodes the body as JSON.
+
+        Raises:
+            requests.exceptions.JSONDecodeError: If the body is not JSON, as `requests.Response.json` does.
+        """
+        try:
+            return json.loads(self.content)
+        except json.JSONDecodeError as e:
+            raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos)
+
+
+class AsyncUpstreamClient:
+    """
+    asyncio HTTP client for upstream APIs, built on httpx.
+
+    Waiting on a response holds no thread, so thousands of calls can be in flight on
+    one event loop. Each loop gets its own `httpx.AsyncClient`, which keeps connections
+    alive per host and runs at most `pool_size` calls at once; further calls wait for
+    a free connection. Like `requests`, it follows redirects and honours the proxy
+    environment variables. Timeouts, the retry budget and the circuit breaker behave
+    like `UpstreamClient`. Failures are raised as `requests` exceptions, so sync and
+    async callers handle errors the same way.
+    """
+
+    def __init__(self, pool_size: int = 100, connect_timeout: float = 3.05, read_timeout: float = 5.0,
+                 max_retries: int = 2, retry_ratio: float = 0.2, retry_budget: float = 10.0,
+                 backoff_base: float = 0.1, backoff_max: float = 2.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            pool_size (int): Maximum number of concurrent calls, and kept-alive connections, per event loop.
+            connect_timeout (float): Seconds to wait for a connection to be established.
+            read_timeout (float): Seconds to wait for each part of the response.
+            max_retries (int): Maximum number of retries for a single call.
+            retry_ratio (float): Retry tokens earned by every call.
+            retry_budget (float): Maximum number of retry tokens that can be saved up.
+            backoff_base (float): Initial delay in seconds between retries.
+            backoff_max (float): Upper bound in seconds for the retry delay.
+            breaker (CircuitBreaker): Circuit breaker to use, a default one if omitted.
+        """
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_ratio = retry_ratio
+        self.retry_budget = retry_budget
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._clients = {}
+        self._retry_tokens = retry_budget
+        self.requests = 0
+        self.connections_opened = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # Drop clients left behind by loops that have since been closed
+            self._clients = {other: c for other, c in self._clients.items() if not other.is_closed()}
+            client = self._clients[loop] = httpx.AsyncClient(
+                # No pool timeout: calls beyond pool_size queue for a connection, as with a semaphore
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout, pool=None),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                headers={'Accept': 'application/json', 'User-Agent': 'affirmations-async'},
+                follow_redirects=True)
+        return client
+
+    async def get(self, url: str) -> AsyncResponse:
+        """
+        Sends a GET request, retrying connection errors, timeouts and 5xx responses
+        while the retry budget allows.
+
+        Args:
+            url (str): The URL to request.
+
+        Returns:
+            AsyncResponse: The last response received.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            requests.exceptions.RequestException: If the request still fails after retrying.
+        """
+        self.requests += 1
+        self._retry_tokens = min(self.retry_budget, self._retry_tokens + self.retry_ratio)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit open, not calling {url}")
+            try:
+                response = await self._send(url)
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(f"{response.status_code} from {url}")
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                response = None
+                error = e
+
+            self.breaker.record_failure()
+            self.failures += 1
+            if attempt >= self.max_retries or self._retry_tokens < 1:
+                if response is not None:
+                    return response
+                raise error
+            self._retry_tokens -= 1
+            self.retries += 1
+            attempt += 1
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+            logger.warning("Upstream call to %s failed (%s), retrying in %.2fs", url, error, delay)
+            await asyncio.sleep(random.uniform(0, delay))
+
+    async def _send(self, url: str) -> AsyncResponse:
+        try:
+            response = await self._client().get(url, extensions={'trace': self._trace})
+        except httpx.ConnectTimeout:
+            raise requests.exceptions.ConnectTimeout(f"Connect timed out after {self.connect_timeout}s: {url}")
+        except httpx.TimeoutException:
+            raise requests.exceptions.ReadTimeout(f"Read timed out after {self.read_timeout}s: {url}")
+        except httpx.TooManyRedirects as e:
+            raise requests.exceptions.TooManyRedirects(f"Too many redirects from {url}: {e}")
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(f"Connection to {url} failed: {e}")
+        return AsyncResponse(response.status_code, response.headers, response.content)
+
+    async def _trace(self, event: str, info: dict) -> None:
+        if event == 'connection.connect_tcp.complete':
+            self.connections_opened += 1
+
+    async def aclose(self) -> None:
+        """
+        Closes the kept-alive connections of the running event loop.
+        """
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def after_fork(self) -> None:
+        """
+        Forgets connections and limits inherited from the parent process's event loops.
+        """
+        self._clients = {}
@@ -0,0 +1,164 @@
+"""
+Response encoding: JSON serialization through orjson when it is installed, and gzip or
+deflate compression negotiated from Accept-Encoding.
+"""
+import zlib
+from typing import Optional
+
+from flask import Flask, Response, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENCODERS = ('auto', 'orjson', 'stdlib')
+
+# zlib window bits per content coding: 16 + 15 writes a gzip wrapper, 15 the zlib
+# wrapper HTTP calls "deflate". Listed in order of preference on equal quality
+CODINGS = {'gzip': 31, 'deflate': 15}
+
+# Media types whose bodies are text and compress well
+COMPRESSIBLE = ('application/json', 'application/x-ndjson')
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that serializes with orjson when it is available and with the
+    stdlib encoder otherwise.
+
+    The app's JSON_ENCODER setting picks the encoder: "auto" (orjson if installed),
+    "orjson" or "stdlib". Response bodies are built as bytes without an intermediate
+    string. Values orjson rejects, such as integers beyond 64 bits or non-string keys,
+    are encoded by the stdlib encoder instead, so both encoders accept the same input;
+    the output differs only in that orjson writes non-ASCII characters as UTF-8.
+    """
+
+    def __init__(self, app: Flask):
+        super().__init__(app)
+        encoder = app.config.get('JSON_ENCODER', 'auto')
+        if encoder not in ENCODERS:
+            raise ValueError(f"Unknown JSON_ENCODER {encoder!r}; use 'auto', 'orjson' or 'stdlib'")
+        if encoder == 'orjson' and orjson is None:
+            raise ValueError("JSON_ENCODER=orjson requires the orjson package")
+        self.encoder = 'stdlib' if encoder == 'stdlib' or orjson is None else 'orjson'
+
+    def dump_bytes(self, obj, indent: bool = False) -> bytes:
+        """
+        Serializes a response body to UTF-8 JSON.
+
+        Args:
+            obj: The value to serialize.
+            indent (bool): Pretty-print with two-space indentation instead of compact separators.
+
+        Returns:
+            bytes: The JSON document, without a trailing newline.
+        """
+        if self.encoder == 'orjson':
+            option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            try:
+                return orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:
+                pass
+        kwargs = {'indent': 2} if indent else {'separators': (',', ':')}
+        return DefaultJSONProvider.dumps(self, obj, **kwargs).encode()
+
+    def response(self, *args, **kwargs) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dump_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def negotiate(accept_encodings) -> Optional[str]:
+    """
+    Picks the content coding the client prefers among gzip and deflate.
+
+    Args:
+        accept_encodings: The request's parsed Accept-Encoding header.
+
+    Returns:
+        str: "gzip" or "deflate", or None if the client accepts neither.
+    """
+    return accept_encodings.best_match(tuple(CODINGS))
+
+
+def compress(body: bytes, coding: str, level: int = 1) -> bytes:
+    """
+    Compresses a body for a Content-Encoding of `coding`.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, CODINGS[coding])
+    return compressor.compress(body) + compressor.flush()
+
+
+def etag_variants(etag: str) -> tuple:
+    """
+    Returns the entity tags of a body and of each of its compressed encodings.
+
+    A compressed body is a different representation, so it gets its own strong ETag:
+    the body's tag suffixed with the coding.
+    """
+    return (etag,) + tuple(f"{etag}-{coding}" for coding in CODINGS)
+
+
+def compress_response(response: Response, min_size: int, level: int = 1, encoded: dict = None) -> Response:
+    """
+    Compresses a JSON response for the current request if the client accepts it.
+
+    Bodies shorter than `min_size` bytes, streamed bodies and bodies that already have
+    a Content-Encoding are left alone. Responses large enough to compress get
+    Vary: Accept-Encoding whichever coding is picked, and a strong ETag gets the
+    coding's suffix.
+
+    Args:
+        response (Response): The response to compress in place.
+        min_size (int): Smallest body, in bytes, worth compressing.
+        level (int): zlib compression level, 1 (fastest) to 9 (smallest).
+        encoded (dict): Compressed bodies by coding, reused and filled in; callers that
+            cache the body keep it alongside, so each coding is compressed once.
+
+    Returns:
+        Response: The same response.
+    """
+    if (response.is_streamed or response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE):
+        return response
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    response.vary.add('Accept-Encoding')
+    coding = negotiate(request.accept_encodings)
+    if coding is None:
+        return response
+
+    data = encoded.get(coding) if encoded is not None else None
+    if data is None:
+        data = compress(body, coding, level)
+        if encoded is not None:
+            encoded[coding] = data
+    response.set_data(data)
+    response.headers['Content-Encoding'] = coding
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(f"{etag}-{coding}")
+    return response
+
+
+def init_app(app: Flask) -> None:
+    """
+    Compresses every sufficiently large JSON response of a Flask app.
+
+    Reads COMPRESS_MIN_SIZE (bytes, 0 compresses everything) and COMPRESS_LEVEL from
+    the app's config; a COMPRESS_MIN_SIZE below 0 disables compression.
+
+    Args:
+        app (Flask): The app to compress responses for.
+    """
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    level = app.config.get('COMPRESS_LEVEL', 1)
+    if min_size < 0:
+        return
+
+    @app.after_request
+    def _compress_response(response):
+        return compress_response(response, min_size, level)
@@ -0,0 +1,235 @@
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of calling upstream while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after a run of consecutive failures and lets a single probe through once
+    the reset timeout has passed.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds the circuit stays open before a probe is allowed.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trips = 0
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """
+        Returns "closed", "open" or "half-open".
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """
+        Returns True if a call may go upstream.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self.trips += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+                logger.warning("Upstream circuit opened after %d consecutive failures", self._failures)
+
+
+class UpstreamClient:
+    """
+    Thread-safe HTTP client for upstream APIs.
+
+    Connections are kept alive in a sized pool, every call is bounded by connect and
+    read timeouts, transient failures are retried with jittered backoff out of a shared
+    retry budget, and a circuit breaker fails fast while upstream is down.
+    """
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 3.05, read_timeout: float = 5.0,
+                 max_retries: int = 2, retry_ratio: float = 0.2, retry_budget: float = 10.0,
+                 backoff_base: float = 0.1, backoff_max: float = 2.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            pool_size (int): Maximum number of kept-alive connections per host.
+            connect_timeout (float): Seconds to wait for a connection to be established.
+            read_timeout (float): Seconds to wait for the server to send data.
+            max_retries (int): Maximum number of retries for a single call.
+            retry_ratio (float): Retry tokens earned by every call.
+            retry_budget (float): Maximum number of retry tokens that can be saved up.
+            backoff_base (float): Initial delay in seconds between retries.
+            backoff_max (float): Upper bound in seconds for the retry delay.
+            breaker (CircuitBreaker): Circuit breaker to use, a default one if omitted.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_ratio = retry_ratio
+        self.retry_budget = retry_budget
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.pool_size = pool_size
+        self._open_session()
+
+        self._lock = threading.Lock()
+        self._retry_tokens = retry_budget
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _open_session(self) -> None:
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a GET request through the pooled session.
+
+        Responses with a 5xx status and connection errors or timeouts are retried while
+        the retry budget allows. Other responses are returned as-is.
+
+        Args:
+            url (str): The URL to request.
+            **kwargs: Extra arguments passed to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The last response received.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            requests.exceptions.RequestException: If the request still fails after retrying.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            self.requests += 1
+            self._retry_tokens = min(self.retry_budget, self._retry_tokens + self.retry_ratio)
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                with self._lock:
+                    self.rejected += 1
+                raise CircuitOpenError(f"Circuit open, not calling {url}")
+            with self._lock:
+                self.attempts += 1
+            try:
+                response = self.session.get(url, **kwargs)
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(f"{response.status_code} from {url}", response=response)
+                retryable = True
+            except requests.exceptions.RequestException as e:
+                response = None
+                error = e
+                retryable = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+            self.breaker.record_failure()
+            with self._lock:
+                self.failures += 1
+                can_retry = retryable and attempt < self.max_retries and self._retry_tokens >= 1
+                if can_retry:
+                    self._retry_tokens -= 1
+                    self.retries += 1
+            if not can_retry:
+                if response is not None:
+                    return response
+                raise error
+
+            attempt += 1
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+            logger.warning("Upstream call to %s failed (%s), retrying in %.2fs", url, error, delay)
+            time.sleep(random.uniform(0, delay))
+
+    def connections_opened(self) -> int:
+        """
+        Returns the number of TCP connections opened by the pool so far.
+        """
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def stats(self) -> dict:
+        """
+        Returns the client counters.
+
+        Returns:
+            dict: Requests sent, connections opened, handshakes saved by connection reuse,
+                retries, failures, calls rejected by the breaker, breaker trips and state.
+        """
+        opened = self.connections_opened()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": opened,
+                "handshakes_saved": max(0, self.attempts - opened),
+                "retries": self.retries,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "breaker_trips": self.breaker.trips,
+                "breaker_state": self.breaker.state,
+            }
+
+    def close(self) -> None:
+        """
+        Closes all pooled connections.
+        """
+        self.session.close()
+
+    def after_fork(self) -> None:
+        """
+        Starts a new connection pool in a forked worker.
+
+        Sockets inherited from the parent are shared with it and must not be reused, so
+        they are dropped without being closed.
+        """
+        self._open_session()
+        self._lock = threading.Lock()
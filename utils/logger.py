@@ -1,26 +1,160 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
 
 from flask import current_app, has_request_context
+from flask.logging import default_handler
 
 
-def configure_logger(logger):
-    logger.setLevel(logging.DEBUG)  # Set the desired logging level here
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed with `extra=` and is written as a JSON field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, including any `extra=` fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class AccessLogFilter(logging.Filter):
+    """
+    Samples and rate limits routine records; warnings and errors always pass.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: float = 0.0):
+        """
+        Args:
+            sample_rate (float): Fraction of records kept, between 0 and 1.
+            rate_limit (float): Maximum records per second after sampling, 0 for no limit.
+                Short bursts of up to one second's worth are allowed.
+        """
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.dropped = 0
+        self._tokens = rate_limit
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+        if self.rate_limit > 0:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+                self._updated = now
+                if self._tokens < 1:
+                    self.dropped += 1
+                    return False
+                self._tokens -= 1
+        return True
+
+
+# Every configured logger hands its records to this queue; one background thread writes them out
+_log_queue = queue.SimpleQueue()
+_queue_handler = QueueHandler(_log_queue)
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def start_logging(stream=None, json_lines=None) -> None:
+    """
+    Starts (or restarts) the background writer that drains the log queue.
 
-    # Create a console handler that logs to stderr
-    handler = logging.StreamHandler(sys.stderr)
-    handler.setLevel(logging.DEBUG)
+    Args:
+        stream: Where records are written, stderr if omitted.
+        json_lines (bool): Write JSON lines instead of text; defaults to LOG_FORMAT=json.
+    """
+    global _listener
+    if json_lines is None:
+        json_lines = os.getenv('LOG_FORMAT', 'text') == 'json'
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+        _listener = QueueListener(_log_queue, handler, respect_handler_level=True)
+        _listener.start()
 
-    # Create a formatter with a timestamp
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-    # Add the formatter to the handler
-    handler.setFormatter(formatter)
+def stop_logging() -> None:
+    """
+    Writes out every queued record and stops the background writer.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _restart_after_fork() -> None:
+    # The writer thread does not survive fork; give the child its own queue and writer
+    global _log_queue, _listener
+    if _listener is None:
+        return
+    handlers = _listener.handlers
+    _log_queue = _queue_handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _add_handler_once(logger, handler) -> None:
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+
+
+def log_level(default: int = logging.DEBUG) -> int:
+    """
+    Returns the level named by LOG_LEVEL in any case (e.g. "info", as gunicorn takes it),
+    or `default` if it is unset or not a level name.
+    """
+    name = os.getenv('LOG_LEVEL', '').strip().upper()
+    level = logging.getLevelName(name) if name else default
+    return level if isinstance(level, int) else default
+
+
+def configure_logger(logger):
+    logger.setLevel(log_level())
+
+    # Records are queued here and written by the background listener, never inline
+    if _listener is None:
+        start_logging()
+    _add_handler_once(logger, _queue_handler)
 
-    # Add the handler to the logger
-    logger.addHandler(handler)
+    # Flask's own handler writes synchronously; the queue replaces it
+    logger.removeHandler(default_handler)
 
     if has_request_context():
         app_logger = current_app.logger
         for handler in app_logger.handlers:
-            logger.addHandler(handler)
\ No newline at end of file
+            _add_handler_once(logger, handler)
@@ -0,0 +1,334 @@
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Flask, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.encoding import JSONProvider
+
+
+# Seconds; covers sub-millisecond cache hits up to slow upstream calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """
+    Base for metrics with an optional set of labels; one child per distinct label value.
+    """
+
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """
+        Returns the child for a label value tuple, creating it on first use.
+
+        Callers on a hot path should keep the returned child rather than look it up each time.
+        """
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1) -> None:
+        with self._lock:
+            self.value -= amount
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count.
+    """
+
+    type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1) -> None:
+        self._children[()].inc(amount)
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{_labels(self.labelnames, values)} {child.value}']
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, such as the number of requests in flight.
+    """
+
+    type = 'gauge'
+
+    def dec(self, amount=1) -> None:
+        self._children[()].dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed bucket bounds.
+
+    Each child holds a count array allocated once, so an observation is a bisect and
+    two additions under a lock; buckets are only made cumulative when rendered.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}')
+        lines.append(f'{self.name}_sum{_labels(self.labelnames, values)} {total}')
+        lines.append(f'{self.name}_count{_labels(self.labelnames, values)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        """
+        Adds a metric, or returns the one already registered under its name.
+        """
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time spent handling requests.', ('route', 'method')))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    'http_requests_in_flight', 'Requests currently being handled.'))
+REQUEST_ERRORS = registry.register(Counter(
+    'http_request_errors_total', 'Requests answered with a 5xx status.', ('route', 'method')))
+CALL_LATENCY = registry.register(Histogram(
+    'model_call_duration_seconds', 'Time spent in instrumented model methods.', ('method',)))
+CALL_ERRORS = registry.register(Counter(
+    'model_call_errors_total', 'Instrumented model method calls that raised.', ('method',)))
+UPSTREAM_LATENCY = registry.register(Histogram(
+    'upstream_request_duration_seconds', 'Time spent calling upstream APIs, including retries.', ('upstream',)))
+UPSTREAM_ERRORS = registry.register(Counter(
+    'upstream_request_errors_total', 'Upstream API calls that raised.', ('upstream',)))
+UPSTREAM_COALESCED = registry.register(Counter(
+    'upstream_requests_coalesced_total', 'Upstream calls avoided by sharing an in-flight or just-finished call.',
+    ('upstream',)))
+JSON_SERIALIZATION = registry.register(Histogram(
+    'json_serialization_duration_seconds', 'Time spent serializing JSON responses.'))
+DB_QUERIES = registry.register(Counter(
+    'db_queries_total', 'SQL statements executed through SQLAlchemy.'))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    'db_query_duration_seconds', 'Time spent executing SQL statements.'))
+DB_POOL_CHECKOUTS = registry.register(Counter(
+    'db_pool_checkouts_total', 'Connections checked out of the SQLAlchemy pool.'))
+DB_POOL_WAIT = registry.register(Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a pooled database connection.'))
+DB_POOL_TIMEOUTS = registry.register(Counter(
+    'db_pool_timeouts_total', 'Checkouts that gave up waiting for a pooled database connection.'))
+
+
+def timed(name: str, latency: Histogram = CALL_LATENCY, errors: Counter = CALL_ERRORS):
+    """
+    Decorator that records a function's latency and exceptions under `name`.
+
+    Coroutine functions are timed until the coroutine finishes, not until it is created.
+
+    Args:
+        name (str): The label value, e.g. "Users.authenticate".
+        latency (Histogram): Histogram with one label to record latency in.
+        errors (Counter): Counter with one label to count exceptions in.
+    """
+    latency = latency.labels(name)
+    errors = errors.labels(name)
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    latency.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class TimedJSONProvider(JSONProvider):
+    """
+    Flask JSON provider that records how long response bodies take to serialize.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            JSON_SERIALIZATION.observe(time.perf_counter() - start)
+
+    def dump_bytes(self, obj, indent: bool = False) -> bytes:
+        start = time.perf_counter()
+        try:
+            return super().dump_bytes(obj, indent)
+        finally:
+            JSON_SERIALIZATION.observe(time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['metrics_query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+    start = conn.info.pop('metrics_query_start', None)
+    if start is not None:
+        DB_QUERY_LATENCY.observe(time.perf_counter() - start)
+
+
+def instrument_sqlalchemy() -> None:
+    """
+    Counts and times SQL statements on every SQLAlchemy engine.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def instrument_app(app: Flask) -> None:
+    """
+    Records per-route latency, errors and in-flight requests, JSON serialization time
+    and database queries for a Flask app.
+
+    Routes are labelled by their URL rule rather than the concrete path, so label
+    cardinality stays bounded; requests that match no route share one label.
+
+    Args:
+        app (Flask): The app to instrument.
+    """
+    app.json = TimedJSONProvider(app)
+    instrument_sqlalchemy()
+
+    @app.before_request
+    def _start_metrics():
+        REQUESTS_IN_FLIGHT.inc()
+        g.metrics_start = time.perf_counter()
+        g.metrics_in_flight = True
+
+    @app.after_request
+    def _record_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        req = request._get_current_object()
+        route = req.url_rule.rule if req.url_rule is not None else 'unmatched'
+        REQUEST_LATENCY.labels(route, req.method).observe(elapsed)
+        if response.status_code >= 500:
+            REQUEST_ERRORS.labels(route, req.method).inc()
+        return response
+
+    @app.teardown_request
+    def _finish_metrics(exc):
+        if g.pop('metrics_in_flight', False):
+            REQUESTS_IN_FLIGHT.dec()
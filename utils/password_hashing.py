@@ -0,0 +1,200 @@
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Optional
+
+from utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class PBKDF2Hasher:
+    """
+    PBKDF2-HMAC-SHA256, stored as `pbkdf2_sha256$<iterations>$<salt>$<hash>`.
+    """
+
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations: int = 600000):
+        self.iterations = iterations
+
+    @property
+    def params(self) -> tuple:
+        return (self.iterations,)
+
+    @staticmethod
+    def derive(password: str, salt: bytes, iterations: int) -> bytes:
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, int(iterations))
+
+
+class ScryptHasher:
+    """
+    scrypt, stored as `scrypt$<n>$<r>$<p>$<salt>$<hash>`.
+    """
+
+    algorithm = "scrypt"
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    @property
+    def params(self) -> tuple:
+        return (self.n, self.r, self.p)
+
+    @staticmethod
+    def derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        n, r, p = int(n), int(r), int(p)
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=128 * n * r * p + 2 ** 20)
+
+
+HASHERS = {hasher.algorithm: hasher for hasher in (PBKDF2Hasher, ScryptHasher)}
+
+# Pool processes start from a clean server process: forking a request worker that already runs
+# threads (logging, prefetch, fetch pool) can copy a lock another thread holds and deadlock
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def hash_password(password: str, algorithm: str, params: tuple) -> str:
+    """
+    Hash a password into the self-describing `<algorithm>$<params...>$<salt>$<hash>` format.
+
+    Args:
+        password (str): The password to hash.
+        algorithm (str): A key of `HASHERS`.
+        params (tuple): The cost parameters of the algorithm.
+
+    Returns:
+        str: The encoded hash.
+    """
+    salt = os.urandom(16)
+    derived = HASHERS[algorithm].derive(password, salt, *params)
+    return "$".join([algorithm, *map(str, params), salt.hex(), derived.hex()])
+
+
+def verify_password(password: str, encoded: str, legacy_salt: Optional[str] = None) -> bool:
+    """
+    Check a password against an encoded hash, or against a legacy salted SHA-256 hex digest.
+
+    Args:
+        password (str): The password to check.
+        encoded (str): The stored hash.
+        legacy_salt (str): The salt stored next to a legacy SHA-256 digest.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    if is_legacy(encoded):
+        digest = hashlib.sha256((password + (legacy_salt or "")).encode()).hexdigest()
+        return hmac.compare_digest(digest, encoded)
+    algorithm, *params, salt, expected = encoded.split("$")
+    derived = HASHERS[algorithm].derive(password, bytes.fromhex(salt), *params)
+    return hmac.compare_digest(derived.hex(), expected)
+
+
+def is_legacy(encoded: str) -> bool:
+    """
+    Returns True for hashes stored before the self-describing format (plain SHA-256 hex).
+    """
+    return "$" not in encoded
+
+
+class PasswordHashingService:
+    """
+    Hashes and verifies passwords with a configurable slow KDF.
+
+    With `workers` > 0 the work runs on a bounded process pool, so request threads wait
+    on the result without holding the interpreter while the KDF runs. The pool is
+    started on first use, so a service created before a server forks its workers gets
+    one pool per worker, and its processes are started with `POOL_START_METHOD` rather
+    than forked from the threaded worker. Legacy SHA-256 hashes are cheap and always
+    verified inline. With 0 workers hashing happens inline, which is what tests and
+    one-off scripts use.
+    """
+
+    def __init__(self, hasher=None, workers: int = 0):
+        """
+        Args:
+            hasher: A `PBKDF2Hasher` or `ScryptHasher` configured with the cost to use
+                for new hashes, scrypt with default cost if omitted.
+            workers (int): Size of the hashing process pool; 0 hashes inline.
+        """
+        self.hasher = hasher or ScryptHasher()
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        _services.add(self)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context(POOL_START_METHOD))
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        return self._get_pool().submit(fn, *args).result()
+
+    def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured algorithm and cost.
+        """
+        return self._run(hash_password, password, self.hasher.algorithm, self.hasher.params)
+
+    def hash_many(self, passwords: list) -> list:
+        """
+        Hash several passwords, spread across the process pool when there is one.
+        """
+        if not self.workers:
+            return [self.hash(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._get_pool().map(partial(hash_password, algorithm=self.hasher.algorithm, params=self.hasher.params),
+                                   passwords, chunksize=chunksize))
+
+    def verify(self, password: str, encoded: str, legacy_salt: Optional[str] = None) -> bool:
+        """
+        Check a password against any supported stored hash.
+        """
+        if is_legacy(encoded):
+            # A single SHA-256 costs far less than the round trip to a pool process
+            return verify_password(password, encoded, legacy_salt)
+        return self._run(verify_password, password, encoded, legacy_salt)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        """
+        Returns True if a stored hash is legacy or uses a different algorithm or cost than configured.
+        """
+        if is_legacy(encoded):
+            return True
+        algorithm, *params = encoded.split("$")[:-2]
+        return algorithm != self.hasher.algorithm or tuple(map(int, params)) != self.hasher.params
+
+    def shutdown(self) -> None:
+        """
+        Stops the process pool, if any.
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _after_fork(self) -> None:
+        # A pool inherited from the parent has no live manager thread; start a new one on first use
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+
+_services = weakref.WeakSet()
+os.register_at_fork(after_in_child=lambda: [service._after_fork() for service in list(_services)])
@@ -0,0 +1,194 @@
+import logging
+import random
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+from utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class AffirmationPrefetcher:
+    """
+    Keeps a bounded buffer of ready affirmations that is refilled in the background.
+
+    Worker threads call `fetch_fn` whenever the buffer drops below the low-water
+    mark and keep going until it is full again, so callers can take an
+    affirmation from memory instead of waiting on the upstream API.
+    """
+
+    def __init__(self, fetch_fn: Callable[[], Optional[str]], buffer_size: int = 32,
+                 low_water: int = 8, workers: int = 2, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0):
+        """
+        Initializes the prefetcher without starting any worker threads.
+
+        Args:
+            fetch_fn (callable): Returns one affirmation, `None` if upstream sent nothing,
+                or raises on failure.
+            buffer_size (int): Maximum number of affirmations kept ready.
+            low_water (int): Refilling starts once the buffer holds fewer than this many.
+            workers (int): Number of background threads refilling the buffer concurrently.
+            backoff_base (float): Initial delay in seconds after a failed fetch.
+            backoff_max (float): Upper bound in seconds for the exponential backoff.
+
+        Raises:
+            ValueError: If the sizes are not consistent.
+        """
+        if buffer_size < 1 or workers < 1:
+            raise ValueError("buffer_size and workers must be at least 1")
+        if not 0 < low_water <= buffer_size:
+            raise ValueError("low_water must be between 1 and buffer_size")
+
+        self.fetch_fn = fetch_fn
+        self.buffer_size = buffer_size
+        self.low_water = low_water
+        self.workers = workers
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._refilling = False
+        self._in_flight = 0
+        self._consecutive_failures = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.fetched = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        """
+        Starts the background workers and schedules the initial fill.
+        """
+        with self._cond:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._refilling = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"affirmation-prefetch-{i}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        logger.info("Started %d prefetch workers (buffer size %d)", self.workers, self.buffer_size)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops the background workers and waits for them to exit.
+
+        Args:
+            timeout (float): Seconds to wait for each worker, or `None` to wait indefinitely.
+        """
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+        logger.info("Stopped prefetch workers")
+
+    def after_fork(self) -> None:
+        """
+        Resets the worker state in a forked process, where the parent's threads do not exist.
+
+        The buffer is emptied too, so processes forked from one parent do not hand out
+        the same affirmations. Call `start` afterwards to refill it.
+        """
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._refilling = False
+        self._in_flight = 0
+        self._consecutive_failures = 0
+
+    def get(self) -> Optional[str]:
+        """
+        Takes one affirmation from the buffer without blocking.
+
+        Returns:
+            An affirmation if the buffer was not empty, otherwise `None`.
+        """
+        with self._cond:
+            try:
+                affirmation = self._buffer.popleft()
+                self.hits += 1
+            except IndexError:
+                affirmation = None
+                self.misses += 1
+            if not self._refilling and len(self._buffer) < self.low_water:
+                self._refilling = True
+                self._cond.notify_all()
+        return affirmation
+
+    def stats(self) -> dict:
+        """
+        Returns the buffer counters.
+
+        Returns:
+            dict: Buffer hits and misses, fetch successes and failures, and the current buffer size.
+        """
+        with self._cond:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetched": self.fetched,
+                "failures": self.failures,
+                "buffered": len(self._buffer),
+            }
+
+    def _reserve(self) -> bool:
+        """
+        Waits until a refill slot is available.
+
+        Returns:
+            bool: True if the caller should fetch one affirmation, False if the prefetcher is stopping.
+        """
+        with self._cond:
+            while not self._stop.is_set():
+                if self._refilling and len(self._buffer) + self._in_flight < self.buffer_size:
+                    self._in_flight += 1
+                    return True
+                if len(self._buffer) + self._in_flight >= self.buffer_size:
+                    self._refilling = False
+                self._cond.wait()
+            return False
+
+    def _backoff_delay(self) -> float:
+        """
+        Computes a jittered exponential backoff from the current failure streak.
+        """
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (self._consecutive_failures - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _run(self) -> None:
+        while self._reserve():
+            try:
+                affirmation = self.fetch_fn()
+                error = None if affirmation else "empty response"
+            except Exception as e:
+                affirmation = None
+                error = str(e)
+
+            with self._cond:
+                self._in_flight -= 1
+                if affirmation:
+                    self._buffer.append(affirmation)
+                    self.fetched += 1
+                    self._consecutive_failures = 0
+                    if len(self._buffer) + self._in_flight >= self.buffer_size:
+                        self._refilling = False
+                    continue
+                self.failures += 1
+                self._consecutive_failures += 1
+                delay = self._backoff_delay()
+                self._cond.notify_all()
+
+            logger.warning("Prefetch failed (%s), backing off %.2fs", error, delay)
+            self._stop.wait(delay)
@@ -0,0 +1,74 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'finished_at')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls to a function into one call whose result they all share.
+
+    The first caller runs `fn`; callers arriving while it is running wait for it and
+    get the same result, or the same exception. With a `window`, callers arriving up to
+    that many seconds after a successful call finished reuse its result as well, so a
+    burst just after a response lands does not start another call.
+    """
+
+    def __init__(self, fn: Callable, window: float = 0.0, on_coalesced: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            fn (Callable): The function to call; takes no arguments.
+            window (float): Seconds a successful result stays shareable after the call finished.
+            on_coalesced (Callable): Called once for every call served without calling `fn`.
+        """
+        self.fn = fn
+        self.window = window
+        self.on_coalesced = on_coalesced
+        self.calls = 0
+        self.coalesced = 0
+        self._flight = None
+        self._lock = threading.Lock()
+
+    def _joinable(self, flight: Optional[_Flight]) -> bool:
+        if flight is None:
+            return False
+        if not flight.done.is_set():
+            return True
+        return flight.error is None and time.monotonic() - flight.finished_at < self.window
+
+    def __call__(self):
+        with self._lock:
+            flight = self._flight
+            leader = not self._joinable(flight)
+            if leader:
+                flight = self._flight = _Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight.result = self.fn()
+                return flight.result
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                flight.finished_at = time.monotonic()
+                flight.done.set()
+
+        if self.on_coalesced is not None:
+            self.on_coalesced()
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
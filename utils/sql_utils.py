@@ -1,5 +1,7 @@
+from contextlib import contextmanager
 from db import db
 import logging
+from sqlalchemy import event
 from utils.logger import configure_logger
 
 logger = logging.getLogger(__name__)
@@ -42,3 +44,35 @@ def check_table_exists(tablename: str):
     except Exception as e:
         logger.error("Table check error: %s", str(e))
         raise
+
+class QueryCounter:
+    """
+    Counts the SQL statements executed on an engine while it is active.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine=None):
+    """
+    Count the SQL statements executed inside a `with` block.
+
+    Args:
+        engine: The SQLAlchemy engine to watch, `db.engine` if omitted.
+
+    Returns:
+        QueryCounter: Yielded to the block; its `count` is final once the block exits.
+    """
+    engine = engine if engine is not None else db.engine
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._before_cursor_execute)